@@ -0,0 +1,122 @@
+"""
+Import time of entry points (cold start of uvicorn workers, Flask app and celery processes):
+every entry point is imported by a new interpreter with -X importtime, the cumulative time of its
+module is compared with the budget and heavy libraries, which the entry point doesn't need,
+must not be imported at all (they are imported lazily by the code which uses them).
+
+    python -m bench.importtime
+    python -m bench.importtime --entry api --repeat 5 --budget 1500
+
+The settings are taken from the environment like in docker-compose (.env), the exit code is 1
+if any entry point is over its budget or imports forbidden modules.
+"""
+import os
+import sys
+import argparse
+import subprocess
+
+
+### budgets (ms) have headroom over the time on the host of development, heavy libraries are
+### imported by tasks of backend (pandas, psycopg2) and by connectors at the first use
+ENTRY_POINTS = {
+    'api': {
+        'module': 'src.main',
+        'budget_ms': 1200,
+        'forbidden': ['pandas', 'numpy', 'psycopg2', 'redis', 'requests', 'pyarrow'],
+    },
+    'backend': {
+        'module': 'src.backend',
+        'budget_ms': 600,
+        'forbidden': ['pandas', 'numpy', 'psycopg2'],
+    },
+}
+
+
+def parse_importtime(stderr: str = '') -> dict:
+    """
+    Lines of -X importtime like "import time:   self [us] | cumulative | package"
+    to the cumulative time (ms) of every imported module
+    """
+
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        modules[parts[2].strip()] = int(parts[1]) / 1000
+
+    return modules
+
+
+def measure(module: str = '', repeat: int = 3, env: dict = {}) -> (float, dict):
+    """
+    The best cumulative time (ms) of module of several runs and imported modules of the last run
+    """
+
+    best, modules = None, {}
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+            capture_output = True, text = True, env = {**os.environ, **env},
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"import of {module} failed:\n{result.stderr[-2000:]}")
+        modules = parse_importtime(result.stderr)
+        if best is None or modules[module] < best:
+            best = modules[module]
+
+    return best, modules
+
+
+def check(name: str = '', elapsed_ms: float = 0.0, modules: dict = {}, budget_ms: float = 0.0,
+          forbidden: list = []) -> list:
+    """
+    Violations of entry point: over budget and imported forbidden modules (with their time)
+    """
+
+    violations = []
+    if elapsed_ms > budget_ms:
+        violations.append(f"{name}: {elapsed_ms:.0f} ms > budget {budget_ms:.0f} ms")
+    for module in forbidden:
+        if module in modules:
+            violations.append(f"{name}: imports {module} ({modules[module]:.0f} ms)")
+
+    return violations
+
+#-------------------------------------------------------------------------------------------------
+
+def main(args: object = None) -> int:
+
+    violations = []
+    for name in args.entry:
+        entry = ENTRY_POINTS[name]
+        elapsed_ms, modules = measure(entry['module'], args.repeat)
+        top = sorted(
+            ((ms, module) for module, ms in modules.items() if '.' not in module and module != 'src'), reverse = True,
+        )[:args.top]
+        print(f"{name:<8} {entry['module']:<12} {elapsed_ms:>8.0f} ms (budget {args.budget or entry['budget_ms']} ms)")
+        for ms, module in top:
+            print(f"{'':<22}{ms:>8.0f} ms {module}")
+        violations += check(name, elapsed_ms, modules, args.budget or entry['budget_ms'], entry['forbidden'])
+
+    for message in violations:
+        print(f"VIOLATION {message}", file = sys.stderr)
+
+    return 1 if violations else 0
+
+
+def parse_args(argv: list = None) -> object:
+
+    parser = argparse.ArgumentParser(description = 'Import time of entry points')
+    parser.add_argument('--entry', nargs = '+', choices = list(ENTRY_POINTS), default = list(ENTRY_POINTS))
+    parser.add_argument('--repeat', type = int, default = 3, help = 'runs of every entry point, the best is taken')
+    parser.add_argument('--budget', type = float, help = 'budget (ms) instead of the default of entry point')
+    parser.add_argument('--top', type = int, default = 5, help = 'the slowest top-level packages to report')
+
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    sys.exit(main(parse_args()))
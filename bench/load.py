@@ -0,0 +1,368 @@
+"""
+Load test of the read path of API: the app of src/main.py is started by uvicorn against the database
+with synthetic locations (see bench/queries.py) and the stub of backend /tasks, then mixed workload
+is replayed at fixed levels of concurrency.
+
+    python -m bench.load --seed --cities 50 --years 3
+    python -m bench.load --concurrency 1 8 32 --requests 1000 --output bench/results/load.json
+    python -m bench.load --baseline bench/results/load.json
+
+The app reads its settings from the same environment as in docker-compose (.env), only API__INT_POST
+is pointed to the stub, which answers like backend (202 and SUCCESS after --task-seconds) but doesn't
+upload anything. With --url the running API is tested as is (without starting of app and stub).
+
+Workload (the share of requests is set by --mix like "history_hot:0.4,forecast_burst:0.2"):
+- history_hot - the last week of a few popular cities (caches of workers)
+- history_cold - a week of random city in the past (DB)
+- history_long / history_daily_long - a year of random city (hourly rows / daily aggregates)
+- history_missing - days before the seeded history (trigger of backend task)
+- forecast_burst - series of identical requests of forecast (coalescing of concurrent requests)
+- history_batch - the last week of 10 random cities by one request
+
+Throughput, p50/p95/p99 of latency and errors are reported for every scenario and level.
+With --baseline the exit code is 1 if p95 of any scenario became slower or throughput became lower
+than the tolerance allows, or errors appeared.
+"""
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import subprocess
+import asyncpg
+import httpx
+from datetime import date, datetime, timedelta
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from bench.queries import BENCH_COUNTRY, seed
+
+
+MIX = {
+    'history_hot': 0.35,
+    'history_cold': 0.2,
+    'history_long': 0.1,
+    'history_daily_long': 0.1,
+    'history_missing': 0.05,
+    'forecast_burst': 0.15,
+    'history_batch': 0.05,
+}
+### popular cities of history_hot and forecast_burst, identical requests of one burst
+HOT_CITIES = 5
+BURST_SIZE = 10
+
+#-------------------------------------------------------------------------------------------------
+############################## Stub of backend /tasks --------------------------------------------
+#-------------------------------------------------------------------------------------------------
+
+stub_app = FastAPI()
+stub_tasks = {}
+
+
+@stub_app.post("/tasks")
+async def stub_run_task() -> JSONResponse:
+
+    task_id = str(uuid.uuid4())
+    stub_tasks[task_id] = time.monotonic()
+
+    return JSONResponse({'task_id': task_id}, status_code = 202)
+
+
+@stub_app.get("/tasks/{task_id}")
+async def stub_get_status(task_id: str) -> dict:
+    """
+    The task is executed during BENCH_TASK_SECONDS after its start
+    """
+
+    started = stub_tasks.get(task_id, 0)
+    done = time.monotonic() - started >= float(os.environ.get('BENCH_TASK_SECONDS', 0))
+
+    return {'current_task_status': {
+        'task_id': task_id,
+        'task_status': 'SUCCESS' if done else 'PENDING',
+        'task_result': None,
+    }}
+
+
+@stub_app.get("/healthcheck")
+async def stub_healthcheck() -> str:
+
+    return "Ok"
+
+#-------------------------------------------------------------------------------------------------
+############################## Workload ----------------------------------------------------------
+#-------------------------------------------------------------------------------------------------
+
+def _history(city: str = '', start: date = None, end: date = None) -> dict:
+
+    return {'city': city, 'country': BENCH_COUNTRY, 'start': start.isoformat(), 'end': end.isoformat()}
+
+
+def build_workload(cities: int = 50, years: int = 3, size: int = 1000, mix: dict = MIX,
+                   today: date = None, rng: object = None) -> list:
+    """
+    Requests of mixed workload: list of (scenario, path, body), bursts of forecast are consecutive
+    """
+
+    today = today or date.today()
+    rng = rng or random.Random(0)
+    names = [f"Bench City {x}" for x in range(1, cities + 1)]
+    hot = names[:HOT_CITIES]
+    week = lambda end: (end - timedelta(days = 6), end)
+    ### days of the oldest seeded week, days before it are absent
+    oldest = today - timedelta(days = 365 * years - 7)
+
+    requests_ = []
+    while len(requests_) < size:
+        scenario = rng.choices(list(mix), weights = list(mix.values()))[0]
+        if scenario == 'history_hot':
+            requests_.append((scenario, '/weather/history', _history(rng.choice(hot), *week(today - timedelta(days = 1)))))
+        elif scenario == 'history_cold':
+            end = today - timedelta(days = rng.randint(8, (today - oldest).days))
+            requests_.append((scenario, '/weather/history', _history(rng.choice(names), *week(end))))
+        elif scenario in ('history_long', 'history_daily_long'):
+            path = '/weather/history' if scenario == 'history_long' else '/weather/history/daily'
+            requests_.append((scenario, path, _history(rng.choice(names), today - timedelta(days = 365), today - timedelta(days = 1))))
+        elif scenario == 'history_missing':
+            requests_.append((scenario, '/weather/history', _history(rng.choice(names), *week(oldest - timedelta(days = rng.randint(30, 365))))))
+        elif scenario == 'forecast_burst':
+            body = {'city': rng.choice(hot), 'country': BENCH_COUNTRY, 'days': 3}
+            requests_ += [(scenario, '/weather/forecast', body)] * BURST_SIZE
+        elif scenario == 'history_batch':
+            requests_.append((scenario, '/weather/history/batch', {
+                'items': [_history(x, *week(today - timedelta(days = 1))) for x in rng.sample(names, min(10, len(names)))],
+            }))
+
+    return requests_[:size]
+
+
+def parse_mix(value: str = '') -> dict:
+    """
+    Shares of scenarios from "scenario:share,scenario:share", absent scenarios are not replayed
+    """
+
+    mix = {k.strip(): float(v) for k, v in (x.rsplit(':', 1) for x in value.split(',') if x.strip())}
+    unknown = set(mix) - set(MIX)
+    if unknown:
+        raise ValueError(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    return mix
+
+#-------------------------------------------------------------------------------------------------
+############################## Replaying and statistics ------------------------------------------
+#-------------------------------------------------------------------------------------------------
+
+async def replay(client: object = None, url: str = '', requests_: list = [], concurrency: int = 1) -> (list, float):
+    """
+    Requests are sent by concurrency clients in order of the list, every client sends the next one
+    after the response to the previous. Returns samples (scenario, status, seconds) and elapsed seconds
+    """
+
+    samples = []
+    pending = iter(requests_)
+
+    async def user():
+        for scenario, path, body in pending:
+            started = time.perf_counter()
+            try:
+                response = await client.post(url + path, json = body)
+                await response.aread()
+                status = response.status_code
+            except httpx.HTTPError:
+                status = 0
+            samples.append((scenario, status, time.perf_counter() - started))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+
+    return samples, time.perf_counter() - started
+
+
+def percentile(values: list = [], share: float = 0.5) -> float:
+    """
+    Nearest-rank percentile of sorted values
+    """
+
+    if not values:
+        return 0.0
+
+    return values[min(len(values) - 1, max(0, math.ceil(share * len(values)) - 1))]
+
+
+def summarize(samples: list = [], elapsed: float = 0.0) -> dict:
+    """
+    Statistics of every scenario and of all requests ('all'): latencies in ms, throughput in requests
+    per second of the whole run, errors - responses with status >= 400 and failed requests
+    """
+
+    groups = {'all': samples}
+    for sample in samples:
+        groups.setdefault(sample[0], []).append(sample)
+
+    summary = {}
+    for name, group in groups.items():
+        latencies = sorted(x[2] * 1000 for x in group)
+        summary[name] = {
+            'requests': len(group),
+            'errors': sum(1 for x in group if not 0 < x[1] < 400),
+            'rps': round(len(group) / elapsed, 2) if elapsed else 0.0,
+            'mean_ms': round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+            'p50_ms': round(percentile(latencies, 0.5), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+        }
+
+    return summary
+
+
+def compare(results: dict = {}, baseline: dict = {}, tolerance: float = 0.3, 
+            min_ms: float = 5.0, min_requests: int = 20) -> list:
+    """
+    Regressions against baseline for every level of concurrency: slower p95 (at least by min_ms,
+    only for scenarios with min_requests), lower throughput of all requests and new errors
+    """
+
+    regressions = []
+    for level, scenarios in results.items():
+        for name, result in scenarios.items():
+            base = baseline.get(level, {}).get(name)
+            if base is None:
+                continue
+            if result['p95_ms'] > base['p95_ms'] * (1 + tolerance) and result['p95_ms'] - base['p95_ms'] > min_ms \
+                and min(result['requests'], base['requests']) >= min_requests:
+                regressions.append(f"{level}/{name}: p95 {base['p95_ms']:.1f} -> {result['p95_ms']:.1f} ms")
+            if name == 'all' and result['rps'] < base['rps'] / (1 + tolerance):
+                regressions.append(f"{level}/{name}: throughput {base['rps']:.1f} -> {result['rps']:.1f} rps")
+            if result['errors'] > base['errors']:
+                regressions.append(f"{level}/{name}: errors {base['errors']} -> {result['errors']}")
+
+    return regressions
+
+#-------------------------------------------------------------------------------------------------
+############################## Servers -----------------------------------------------------------
+#-------------------------------------------------------------------------------------------------
+
+def start_server(app: str = '', port: int = 0, workers: int = 1, env: dict = {}) -> object:
+
+    return subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', app, '--host', '127.0.0.1', '--port', str(port),
+         '--workers', str(workers), '--log-level', 'warning'],
+        env = {**os.environ, **env},
+    )
+
+
+async def wait_ready(client: object = None, url: str = '', process: object = None, timeout: float = 60) -> None:
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode}")
+        try:
+            if (await client.get(f"{url}/healthcheck")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.5)
+
+    raise RuntimeError(f"{url} is not ready in {timeout} seconds")
+
+#-------------------------------------------------------------------------------------------------
+
+async def main(args: object = None) -> int:
+
+    if args.seed:
+        conn = await asyncpg.connect(
+            host = args.host, port = args.port, user = args.user, password = args.password, database = args.dbname,
+        )
+        try:
+            await seed(conn, args.cities, args.years)
+        finally:
+            await conn.close()
+
+    processes = []
+    url = args.url
+    limits = httpx.Limits(max_connections = max(args.concurrency), max_keepalive_connections = max(args.concurrency))
+    async with httpx.AsyncClient(timeout = args.timeout, limits = limits) as client:
+        try:
+            if url is None:
+                url = f"http://127.0.0.1:{args.api_port}"
+                stub_url = f"http://127.0.0.1:{args.stub_port}"
+                processes.append(start_server(
+                    'bench.load:stub_app', args.stub_port, env = {'BENCH_TASK_SECONDS': str(args.task_seconds)}))
+                await wait_ready(client, stub_url, processes[-1])
+                processes.append(start_server(
+                    'src.main:app', args.api_port, args.workers, env = {'API__INT_POST': f"{stub_url}/tasks"}))
+                await wait_ready(client, url, processes[-1])
+
+            mix = parse_mix(args.mix) if args.mix else MIX
+            if args.warmup:
+                await replay(client, url, build_workload(args.cities, args.years, args.warmup, mix, rng = random.Random(-1)),
+                             max(args.concurrency))
+            results = {}
+            for concurrency in args.concurrency:
+                workload = build_workload(args.cities, args.years, args.requests, mix, rng = random.Random(concurrency))
+                samples, elapsed = await replay(client, url, workload, concurrency)
+                results[str(concurrency)] = summarize(samples, elapsed)
+                for name, result in results[str(concurrency)].items():
+                    print(f"{concurrency:>4} {name:<20} {result['requests']:>6} req {result['rps']:>9.1f} rps "
+                          f"p50 {result['p50_ms']:>8.1f} p95 {result['p95_ms']:>8.1f} p99 {result['p99_ms']:>8.1f} ms "
+                          f"{result['errors']:>5} errors")
+        finally:
+            for process in processes:
+                process.terminate()
+                process.wait(timeout = 30)
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok = True)
+        with open(args.output, 'w') as f:
+            json.dump({
+                'meta': {
+                    'datetime': datetime.now().isoformat(timespec = 'seconds'), 'url': args.url,
+                    'workers': args.workers, 'cities': args.cities, 'years': args.years,
+                    'requests': args.requests, 'mix': mix, 'task_seconds': args.task_seconds,
+                },
+                'levels': results,
+            }, f, indent = 2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)['levels'], args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}", file = sys.stderr)
+        return 1 if regressions else 0
+
+    return 0
+
+
+def parse_args(argv: list = None) -> object:
+
+    parser = argparse.ArgumentParser(description = 'Load test of the read path of API')
+    parser.add_argument('--host', default = os.environ.get('PG__HOST', 'localhost'))
+    parser.add_argument('--port', type = int, default = int(os.environ.get('PG__PORT', 5432)))
+    parser.add_argument('--user', default = os.environ.get('PG__USER', 'admin'))
+    parser.add_argument('--password', default = os.environ.get('PG__PASSW', ''))
+    parser.add_argument('--dbname', default = os.environ.get('PG__DBNAME', 'weather'))
+    parser.add_argument('--seed', action = 'store_true', help = 'seed synthetic locations before test')
+    parser.add_argument('--cities', type = int, default = 50)
+    parser.add_argument('--years', type = int, default = 3)
+    parser.add_argument('--url', help = 'URL of running API, the app and the stub of backend are not started')
+    parser.add_argument('--api-port', type = int, default = 8077)
+    parser.add_argument('--stub-port', type = int, default = 8078)
+    parser.add_argument('--workers', type = int, default = int(os.environ.get('APP__WORKERS', 1)))
+    parser.add_argument('--task-seconds', type = float, default = 0.5, help = 'duration of tasks of the stub of backend')
+    parser.add_argument('--concurrency', type = int, nargs = '+', default = [1, 8, 32])
+    parser.add_argument('--requests', type = int, default = 1000, help = 'requests of every level of concurrency')
+    parser.add_argument('--warmup', type = int, default = 200, help = 'requests before measurement')
+    parser.add_argument('--mix', help = 'shares of scenarios like "history_hot:0.5,forecast_burst:0.5"')
+    parser.add_argument('--timeout', type = float, default = 60)
+    parser.add_argument('--output', help = 'file of results (JSON)')
+    parser.add_argument('--baseline', help = 'file of previous results to compare with')
+    parser.add_argument('--tolerance', type = float, default = 0.3, help = 'allowed relative growth of p95 and drop of throughput')
+
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,330 @@
+"""
+Benchmark of the read queries of API (src/queries.py) by EXPLAIN (ANALYZE, BUFFERS) on synthetic data.
+
+The database must be created by init_db/init_conf.sh (service "database" of docker-compose).
+Synthetic locations ("Bench City N", country "Benchland") with hourly history of several years
+and forecast for 3 days are seeded next to the real data and can be dropped later.
+
+    python -m bench.queries --seed --cities 50 --years 3
+    python -m bench.queries --output bench/results/queries.json
+    python -m bench.queries --baseline bench/results/queries.json
+    python -m bench.queries --drop
+
+Connection parameters are taken from the same environment as API (PG__HOST, PG__PORT,
+PG__USER, PG__PASSW, PG__DBNAME). With --baseline the exit code is 1 if any query became slower
+or reads more buffers than the tolerance allows, scans more monthly partitions
+or got sequential scan of the big table.
+"""
+import os
+import sys
+import json
+import asyncio
+import argparse
+import asyncpg
+from datetime import date, datetime, timedelta
+from src.queries import (
+                        QUERY_GEO_LOOKUP,
+                        QUERY_GEO_LOOKUP_PREFIX,
+                        QUERY_HISTORY_DATES,
+                        QUERY_HISTORY_DAILY,
+                        QUERY_FORECAST_DATES,
+                        QUERY_HISTORY_BATCH,
+                        QUERY_FORECAST_BATCH,
+                        )
+
+
+BENCH_COUNTRY = 'Benchland'
+### tables (and their partitions) which must be read only by index
+BIG_TABLES = ('local_temperature', 'day_completeness', 'daily_weather')
+### prefix of monthly partitions, queries must scan only partitions of requested months
+PARTITION_PREFIX = 'local_temperature_y'
+
+#-------------------------------------------------------------------------------------------------
+############################## Synthetic data ----------------------------------------------------
+#-------------------------------------------------------------------------------------------------
+
+SEED_CONDITIONS = \
+    """INSERT INTO regional.conditionid (id, condition_str)
+        VALUES (1000, 'Sunny'), (1003, 'Partly cloudy'), (1063, 'Patchy rain possible')
+        ON CONFLICT (id) DO NOTHING;"""
+
+SEED_LOCATIONS = \
+    """INSERT INTO regional.geoid (geo_name, geo_country)
+        SELECT 'Bench City ' || n, $2
+        FROM generate_series(1, $1) n
+        WHERE NOT EXISTS (
+            SELECT 1 FROM regional.geoid g WHERE g.geo_name = 'Bench City ' || n AND g.geo_country = $2);"""
+
+SEED_PARTITIONS = \
+    """SELECT regional.create_partitions(
+            (LOCALTIMESTAMP - make_interval(years => $1))::date, (LOCALTIMESTAMP + interval '3 days')::date);"""
+
+### observed hours are updated an hour later, forecast hours - now
+SEED_HOURS = \
+    """INSERT INTO regional.local_temperature (geo_id, latitude, longitude, datetime, datetime_update,
+                temp_c, temp_c_feelslike, cloud, condition_id, humidity, is_day,
+                wind_speed_kph, wind_gust_kph, uv_index, pressure_mb, wind_direction)
+        SELECT g.id
+             , 50.0
+             , 10.0
+             , ts
+             , CASE WHEN ts <= LOCALTIMESTAMP THEN ts + interval '1 hour' ELSE LOCALTIMESTAMP END
+             , round((10 + 15 * random())::numeric, 1)
+             , round((8 + 15 * random())::numeric, 1)
+             , (100 * random())::int
+             , (ARRAY[1000, 1003, 1063])[1 + (random() * 2)::int]
+             , (30 + 60 * random())::int
+             , extract(hour from ts) BETWEEN 6 AND 20
+             , round((30 * random())::numeric, 1)
+             , round((45 * random())::numeric, 1)
+             , round((8 * random())::numeric, 1)
+             , round((990 + 40 * random())::numeric, 1)
+             , 'N'
+        FROM regional.geoid g
+        CROSS JOIN generate_series(
+            date_trunc('day', LOCALTIMESTAMP) - make_interval(years => $1),
+            date_trunc('day', LOCALTIMESTAMP) + interval '3 days' - interval '1 hour',
+            interval '1 hour') ts
+        WHERE g.geo_country = $2
+        ON CONFLICT (geo_id, datetime) DO NOTHING;"""
+
+SEED_DAILY = \
+    """INSERT INTO regional.daily_weather (geo_id, day, hours, temp_c_min, temp_c_max, temp_c_mean,
+                humidity_min, humidity_max, humidity_mean, condition_id, datetime_update)
+        SELECT lt.geo_id
+             , lt.datetime::date
+             , count(*)
+             , min(lt.temp_c)
+             , max(lt.temp_c)
+             , round(avg(lt.temp_c)::numeric, 1)
+             , min(lt.humidity)
+             , max(lt.humidity)
+             , round(avg(lt.humidity), 1)
+             , mode() WITHIN GROUP (ORDER BY lt.condition_id)
+             , LOCALTIMESTAMP
+        FROM regional.local_temperature lt
+        JOIN regional.geoid g ON g.id = lt.geo_id
+        WHERE g.geo_country = $1
+        AND lt.datetime_update > lt.datetime
+        GROUP BY 1, 2
+        ON CONFLICT (geo_id, day) DO NOTHING;"""
+
+SEED_COMPLETENESS = \
+    """INSERT INTO regional.day_completeness (geo_id, day, hours_present, finalized, datetime_update)
+        SELECT lt.geo_id
+             , lt.datetime::date
+             , count(*) FILTER (WHERE lt.datetime_update > lt.datetime)
+             , count(*) FILTER (WHERE lt.datetime_update > lt.datetime) = 24
+             , LOCALTIMESTAMP
+        FROM regional.local_temperature lt
+        JOIN regional.geoid g ON g.id = lt.geo_id
+        WHERE g.geo_country = $1
+        GROUP BY 1, 2
+        ON CONFLICT (geo_id, day) DO UPDATE
+        SET hours_present = excluded.hours_present
+          , finalized = excluded.finalized
+          , datetime_update = excluded.datetime_update;"""
+
+DROP_BENCH = [
+    """DELETE FROM regional.daily_weather
+        WHERE geo_id IN (SELECT id FROM regional.geoid WHERE geo_country = $1);""",
+    """DELETE FROM regional.day_completeness
+        WHERE geo_id IN (SELECT id FROM regional.geoid WHERE geo_country = $1);""",
+    """DELETE FROM regional.local_temperature
+        WHERE geo_id IN (SELECT id FROM regional.geoid WHERE geo_country = $1);""",
+    """DELETE FROM regional.geoid WHERE geo_country = $1;""",
+]
+
+
+async def seed(conn: object = None, cities: int = 50, years: int = 3) -> None:
+
+    await conn.execute(SEED_CONDITIONS)
+    await conn.execute(SEED_LOCATIONS, cities, BENCH_COUNTRY)
+    await conn.execute(SEED_PARTITIONS, years)
+    await conn.execute(SEED_HOURS, years, BENCH_COUNTRY)
+    await conn.execute(SEED_COMPLETENESS, BENCH_COUNTRY)
+    await conn.execute(SEED_DAILY, BENCH_COUNTRY)
+    await conn.execute('ANALYZE regional.geoid, regional.local_temperature, regional.day_completeness, regional.daily_weather;')
+
+
+async def drop(conn: object = None) -> None:
+
+    async with conn.transaction():
+        for query in DROP_BENCH:
+            await conn.execute(query, BENCH_COUNTRY)
+
+#-------------------------------------------------------------------------------------------------
+############################## Plans of queries --------------------------------------------------
+#-------------------------------------------------------------------------------------------------
+
+def cases(geo_ids: list = [], today: date = None) -> dict:
+    """
+    Queries of API with arguments like in real requests: name -> (query, args)
+    """
+
+    today = today or date.today()
+    geo_id = geo_ids[len(geo_ids) // 2]
+    batch_ids = geo_ids[:10]
+    batch_dates = [today - timedelta(days = x) for x in range(1, 8)]
+    name = f"bench city {len(geo_ids) // 2 + 1}"
+
+    return {
+        'geo_lookup': (QUERY_GEO_LOOKUP, name, 'benchland'),
+        'geo_lookup_prefix': (QUERY_GEO_LOOKUP_PREFIX, name[:-1], None),
+        'history_week': (QUERY_HISTORY_DATES, geo_id, [], today - timedelta(days = 7), today - timedelta(days = 1)),
+        'history_year': (QUERY_HISTORY_DATES, geo_id, [], today - timedelta(days = 366), today - timedelta(days = 1)),
+        'history_dates': (QUERY_HISTORY_DATES, geo_id, [today - timedelta(days = 30 * x) for x in range(1, 6)], None, None),
+        'history_daily_year': (QUERY_HISTORY_DAILY, geo_id, [], today - timedelta(days = 366), today - timedelta(days = 1)),
+        'forecast': (QUERY_FORECAST_DATES, geo_id),
+        'history_batch': (
+            QUERY_HISTORY_BATCH,
+            list(range(len(batch_ids) * len(batch_dates))),
+            [x for x in batch_ids for _ in batch_dates],
+            batch_dates * len(batch_ids),
+        ),
+        'forecast_batch': (QUERY_FORECAST_BATCH, list(range(len(batch_ids))), batch_ids),
+    }
+
+
+def _walk(plan: dict = {}) -> list:
+
+    nodes = [plan]
+    for child in plan.get('Plans', []):
+        nodes += _walk(child)
+
+    return nodes
+
+
+def summarize_plan(explain: list = []) -> dict:
+    """
+    Main figures of EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON): timings in ms,
+    buffers of the whole plan, sequential scans of tables and scanned partitions
+    (pruned at run time ones are marked as never executed)
+    """
+
+    plan = explain[0]['Plan']
+    relations = [x for x in _walk(plan) if 'Relation Name' in x]
+
+    return {
+        'planning_ms': explain[0].get('Planning Time', 0.0),
+        'execution_ms': explain[0].get('Execution Time', 0.0),
+        'rows': plan.get('Actual Rows', 0),
+        'shared_hit': plan.get('Shared Hit Blocks', 0),
+        'shared_read': plan.get('Shared Read Blocks', 0),
+        'seq_scans': sorted({x['Relation Name'] for x in relations if x['Node Type'] == 'Seq Scan'}),
+        'partitions': len({x['Relation Name'] for x in relations \
+            if x['Relation Name'].startswith(PARTITION_PREFIX) and x.get('Actual Loops', 1) > 0}),
+    }
+
+
+async def explain(conn: object = None, query: str = '', args: tuple = (), runs: int = 5) -> dict:
+    """
+    The first run warms cache up, the run with median execution time of the others is kept
+    """
+
+    summaries = []
+    for _ in range(runs + 1):
+        value = await conn.fetchval(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}", *args)
+        summaries.append(summarize_plan(json.loads(value) if isinstance(value, str) else value))
+    summaries = sorted(summaries[1:], key = lambda x: x['execution_ms'])
+
+    return summaries[len(summaries) // 2]
+
+
+def compare(results: dict = {}, baseline: dict = {}, tolerance: float = 0.5, min_ms: float = 1.0) -> list:
+    """
+    Regressions against baseline: slower execution (at least by min_ms), more buffers,
+    more scanned partitions and new sequential scans of big tables
+    """
+
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['execution_ms'] > base['execution_ms'] * (1 + tolerance) \
+            and result['execution_ms'] - base['execution_ms'] > min_ms:
+            regressions.append(f"{name}: execution {base['execution_ms']:.2f} -> {result['execution_ms']:.2f} ms")
+        buffers, buffers_base = result['shared_hit'] + result['shared_read'], base['shared_hit'] + base['shared_read']
+        if buffers > buffers_base * (1 + tolerance) and buffers - buffers_base > 8:
+            regressions.append(f"{name}: buffers {buffers_base} -> {buffers}")
+        if result.get('partitions', 0) > base.get('partitions', 0):
+            regressions.append(f"{name}: partitions {base.get('partitions', 0)} -> {result['partitions']}")
+        for table in set(result['seq_scans']) - set(base['seq_scans']):
+            if table.startswith(BIG_TABLES):
+                regressions.append(f"{name}: sequential scan of {table}")
+
+    return regressions
+
+#-------------------------------------------------------------------------------------------------
+
+async def main(args: object = None) -> int:
+
+    conn = await asyncpg.connect(
+        host = args.host, port = args.port, user = args.user, password = args.password, database = args.dbname,
+        server_settings = {'pg_trgm.similarity_threshold': str(args.similarity)},
+    )
+    try:
+        if args.drop:
+            await drop(conn)
+            return 0
+        if args.seed:
+            await seed(conn, args.cities, args.years)
+        geo_ids = [x['id'] for x in await conn.fetch(
+            "SELECT id FROM regional.geoid WHERE geo_country = $1 ORDER BY id;", BENCH_COUNTRY)]
+        if not geo_ids:
+            print('There are no synthetic locations, run with --seed', file = sys.stderr)
+            return 1
+        results = {}
+        for name, (query, *query_args) in cases(geo_ids).items():
+            results[name] = await explain(conn, query, query_args, args.runs)
+            print(f"{name:<20} {results[name]['execution_ms']:>10.2f} ms {results[name]['rows']:>8} rows "
+                  f"{results[name]['shared_hit'] + results[name]['shared_read']:>8} buffers "
+                  f"{results[name]['partitions']:>4} partitions "
+                  f"{','.join(results[name]['seq_scans'])}")
+        locations, hours = await conn.fetchrow(
+            """SELECT count(DISTINCT g.id), count(*) FROM regional.local_temperature lt
+                JOIN regional.geoid g ON g.id = lt.geo_id WHERE g.geo_country = $1;""", BENCH_COUNTRY)
+    finally:
+        await conn.close()
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok = True)
+        with open(args.output, 'w') as f:
+            json.dump({
+                'meta': {'datetime': datetime.now().isoformat(timespec = 'seconds'), 'locations': locations, 'hours': hours},
+                'queries': results,
+            }, f, indent = 2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)['queries'], args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}", file = sys.stderr)
+        return 1 if regressions else 0
+
+    return 0
+
+
+def parse_args(argv: list = None) -> object:
+
+    parser = argparse.ArgumentParser(description = 'EXPLAIN (ANALYZE, BUFFERS) of the read queries of API')
+    parser.add_argument('--host', default = os.environ.get('PG__HOST', 'localhost'))
+    parser.add_argument('--port', type = int, default = int(os.environ.get('PG__PORT', 5432)))
+    parser.add_argument('--user', default = os.environ.get('PG__USER', 'admin'))
+    parser.add_argument('--password', default = os.environ.get('PG__PASSW', ''))
+    parser.add_argument('--dbname', default = os.environ.get('PG__DBNAME', 'weather'))
+    parser.add_argument('--similarity', type = float, default = float(os.environ.get('PG__GEO_SIMILARITY', 0.6)))
+    parser.add_argument('--seed', action = 'store_true', help = 'seed synthetic locations before benchmark')
+    parser.add_argument('--drop', action = 'store_true', help = 'drop synthetic locations and exit')
+    parser.add_argument('--cities', type = int, default = 50)
+    parser.add_argument('--years', type = int, default = 3)
+    parser.add_argument('--runs', type = int, default = 5)
+    parser.add_argument('--output', help = 'file of results (JSON)')
+    parser.add_argument('--baseline', help = 'file of previous results to compare with')
+    parser.add_argument('--tolerance', type = float, default = 0.5, help = 'allowed relative growth of time and buffers')
+
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main(parse_args())))
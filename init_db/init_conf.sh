@@ -53,33 +53,89 @@ psql -v ON_ERROR_STOP=1 -U "$POSTGRES_USER" -d "$POSTGRES_DB" <<-EOSQL
     pressure_mb real,
     wind_direction character varying,
     CONSTRAINT regional_local_temperature_pkey PRIMARY KEY (geo_id,datetime)
-    )
+    ) PARTITION BY RANGE (datetime)
     TABLESPACE pg_default;
     ALTER TABLE regional.local_temperature OWNER to admin;
     REVOKE ALL ON TABLE regional.local_temperature FROM bot_parser;
     GRANT ALL ON TABLE regional.local_temperature TO admin;
     GRANT DELETE, INSERT, SELECT, UPDATE, TRUNCATE ON TABLE regional.local_temperature TO bot_parser;
     
-    CREATE INDEX local_temperature_temp_c_ids_inx
-        ON regional.local_temperature USING btree
-        (temp_c ASC NULLS LAST) TABLESPACE pg_default;
+    -- reading by API goes through primary key (geo_id, datetime) with range of datetime,
+    -- the index by datetime is for maintenance over all locations.
+    -- Partitions by month are created by backend (regional.create_partitions), see below
     CREATE INDEX local_temperature_datetime_inx
         ON regional.local_temperature USING btree
         (datetime ASC NULLS LAST)
     TABLESPACE pg_default;
-        
+
+    -- Table: regional.day_completeness (observed hours of day per location, it's updated by backend
+    -- together with regional.local_temperature, API reads history only for finalized days)
+    CREATE TABLE IF NOT EXISTS regional.day_completeness
+    (
+    geo_id integer NOT NULL,
+    day date NOT NULL,
+    hours_present smallint NOT NULL DEFAULT 0,
+    finalized boolean NOT NULL DEFAULT false,
+    datetime_update timestamp without time zone,
+    CONSTRAINT regional_day_completeness_pkey PRIMARY KEY (geo_id,day)
+    )
+    TABLESPACE pg_default;
+    ALTER TABLE regional.day_completeness OWNER to admin;
+    REVOKE ALL ON TABLE regional.day_completeness FROM bot_parser;
+    GRANT ALL ON TABLE regional.day_completeness TO admin;
+    GRANT DELETE, INSERT, SELECT, UPDATE, TRUNCATE ON TABLE regional.day_completeness TO bot_parser;
+
+    -- Table: regional.daily_weather (daily aggregates of observed hours, they are updated by backend
+    -- together with regional.local_temperature and kept after retention of hourly partitions)
+    CREATE TABLE IF NOT EXISTS regional.daily_weather
+    (
+    geo_id integer NOT NULL,
+    day date NOT NULL,
+    hours smallint NOT NULL DEFAULT 0,
+    temp_c_min real,
+    temp_c_max real,
+    temp_c_mean real,
+    humidity_min integer,
+    humidity_max integer,
+    humidity_mean real,
+    condition_id integer,
+    datetime_update timestamp without time zone,
+    CONSTRAINT regional_daily_weather_pkey PRIMARY KEY (geo_id,day)
+    )
+    TABLESPACE pg_default;
+    ALTER TABLE regional.daily_weather OWNER to admin;
+    REVOKE ALL ON TABLE regional.daily_weather FROM bot_parser;
+    GRANT ALL ON TABLE regional.daily_weather TO admin;
+    GRANT DELETE, INSERT, SELECT, UPDATE, TRUNCATE ON TABLE regional.daily_weather TO bot_parser;
+
     -- Table: regional.geoid
     CREATE TABLE IF NOT EXISTS regional.geoid
     (
     id integer NOT NULL GENERATED ALWAYS AS IDENTITY ( INCREMENT 1 START 1 MINVALUE 1 MAXVALUE 2147483647 CACHE 1 ),
     geo_name character varying COLLATE pg_catalog."default",
     geo_country character varying COLLATE pg_catalog."default",
+    geo_name_norm character varying COLLATE pg_catalog."default",
+    geo_country_norm character varying COLLATE pg_catalog."default",
     CONSTRAINT geoid_pkey PRIMARY KEY (id)
     )  TABLESPACE pg_default;
     ALTER TABLE regional.geoid OWNER to admin;
     REVOKE ALL ON TABLE regional.geoid FROM bot_parser;
     GRANT ALL ON TABLE regional.geoid TO admin;
     GRANT DELETE, INSERT, SELECT, UPDATE, TRUNCATE ON TABLE regional.geoid TO bot_parser;
+    
+    -- Table: regional.geoalias (alternate spellings of locations, like requested 'Kiev' for 'Kyiv')
+    CREATE TABLE IF NOT EXISTS regional.geoalias
+    (
+    alias character varying COLLATE pg_catalog."default" NOT NULL,
+    alias_norm character varying COLLATE pg_catalog."default",
+    geo_id integer NOT NULL,
+    CONSTRAINT geoalias_pkey PRIMARY KEY (alias),
+    CONSTRAINT geoalias_geo_id_fkey FOREIGN KEY (geo_id) REFERENCES regional.geoid (id) ON DELETE CASCADE
+    ) TABLESPACE pg_default;
+    ALTER TABLE regional.geoalias OWNER to admin;
+    REVOKE ALL ON TABLE regional.geoalias FROM bot_parser;
+    GRANT ALL ON TABLE regional.geoalias TO admin;
+    GRANT DELETE, INSERT, SELECT, UPDATE, TRUNCATE ON TABLE regional.geoalias TO bot_parser;
 
     -- Table: regional.conditionid
     CREATE TABLE IF NOT EXISTS regional.conditionid
@@ -93,4 +149,177 @@ psql -v ON_ERROR_STOP=1 -U "$POSTGRES_USER" -d "$POSTGRES_DB" <<-EOSQL
     GRANT ALL ON TABLE regional.conditionid TO admin;
     GRANT DELETE, INSERT, SELECT, UPDATE, TRUNCATE ON TABLE regional.conditionid TO bot_parser;
     
+    /*------------------------- Normalized names of locations ----------------------------------------------*/
+    -- the same normalization is done by API for requested names (normalize_geo in src/utils.py):
+    -- lower case without diacritics and punctuation, common abbreviations are expanded
+    CREATE EXTENSION IF NOT EXISTS unaccent;
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+    
+    CREATE OR REPLACE FUNCTION regional.normalize_geo(value character varying)
+    RETURNS character varying
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE
+    AS \$\$
+        SELECT regexp_replace(regexp_replace(regexp_replace(regexp_replace(
+            btrim(regexp_replace(lower(public.unaccent('public.unaccent', coalesce(value, ''))), '[^[:alnum:]]+', ' ', 'g')),
+            '\mst\M', 'saint', 'g'), '\mste\M', 'sainte', 'g'), '\mmt\M', 'mount', 'g'), '\mft\M', 'fort', 'g');
+    \$\$;
+    ALTER FUNCTION regional.normalize_geo(character varying) OWNER TO admin;
+    
+    CREATE OR REPLACE FUNCTION regional.fill_geo_norm()
+    RETURNS trigger
+    LANGUAGE plpgsql
+    AS \$\$
+    BEGIN
+        IF TG_TABLE_NAME = 'geoalias' THEN
+            NEW.alias_norm := regional.normalize_geo(NEW.alias);
+        ELSE
+            NEW.geo_name_norm := regional.normalize_geo(NEW.geo_name);
+            NEW.geo_country_norm := regional.normalize_geo(NEW.geo_country);
+        END IF;
+        RETURN NEW;
+    END;
+    \$\$;
+    ALTER FUNCTION regional.fill_geo_norm() OWNER TO admin;
+    
+    CREATE TRIGGER geoid_fill_geo_norm
+        BEFORE INSERT OR UPDATE OF geo_name, geo_country ON regional.geoid
+        FOR EACH ROW EXECUTE FUNCTION regional.fill_geo_norm();
+    CREATE TRIGGER geoalias_fill_geo_norm
+        BEFORE INSERT OR UPDATE OF alias ON regional.geoalias
+        FOR EACH ROW EXECUTE FUNCTION regional.fill_geo_norm();
+    
+    -- exact search by name (and country), by the beginning of name (operator ^@) and fuzzy search (operator %)
+    CREATE INDEX geoid_geo_name_norm_inx
+        ON regional.geoid USING btree
+        (geo_name_norm, geo_country_norm) TABLESPACE pg_default;
+    CREATE INDEX geoid_geo_name_norm_prefix_inx
+        ON regional.geoid USING spgist
+        (geo_name_norm) TABLESPACE pg_default;
+    CREATE INDEX geoid_geo_name_norm_trgm_inx
+        ON regional.geoid USING gin
+        (geo_name_norm gin_trgm_ops) TABLESPACE pg_default;
+    -- search of id by backend after inserting of location
+    CREATE INDEX geoid_geo_name_inx
+        ON regional.geoid USING btree
+        (geo_name, geo_country) TABLESPACE pg_default;
+    CREATE INDEX geoalias_alias_norm_inx
+        ON regional.geoalias USING btree
+        (alias_norm) TABLESPACE pg_default;
+    
+    /*------------------------- Partitions of regional.local_temperature ----------------------------------*/
+    -- monthly partitions like regional.local_temperature_y2023m08, backend creates them ahead of time
+    -- and for months of uploaded history. The functions are run with rights of owner of the table
+    CREATE SCHEMA IF NOT EXISTS regional_archive
+    AUTHORIZATION admin;
+
+    CREATE OR REPLACE FUNCTION regional.create_partitions(date_from date, date_to date)
+    RETURNS integer
+    LANGUAGE plpgsql SECURITY DEFINER
+    SET search_path = regional, pg_temp
+    AS \$\$
+    DECLARE
+        month_ date := date_trunc('month', date_from)::date;
+        name_ text;
+        created integer := 0;
+    BEGIN
+        WHILE month_ <= date_to LOOP
+            name_ := 'local_temperature_' || to_char(month_, '"y"YYYY"m"MM');
+            IF to_regclass('regional.' || name_) IS NULL THEN
+                BEGIN
+                    EXECUTE format(
+                        'CREATE TABLE regional.%I PARTITION OF regional.local_temperature FOR VALUES FROM (%L) TO (%L)',
+                        name_, month_, (month_ + interval '1 month')::date);
+                    created := created + 1;
+                EXCEPTION WHEN duplicate_table THEN
+                    -- created by concurrent upload
+                    NULL;
+                END;
+            END IF;
+            month_ := (month_ + interval '1 month')::date;
+        END LOOP;
+        RETURN created;
+    END;
+    \$\$;
+    ALTER FUNCTION regional.create_partitions(date, date) OWNER TO admin;
+
+    -- retention: partitions of months before keep_from are detached (it's cheap, without rewriting of data)
+    -- and dropped or moved to schema regional_archive, completeness of their days is removed too
+    CREATE OR REPLACE FUNCTION regional.retire_partitions(keep_from date, drop_ boolean)
+    RETURNS integer
+    LANGUAGE plpgsql SECURITY DEFINER
+    SET search_path = regional, pg_temp
+    AS \$\$
+    DECLARE
+        name_ text;
+        retired integer := 0;
+    BEGIN
+        FOR name_ IN
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'regional.local_temperature'::regclass
+            AND c.relname ~ '^local_temperature_y[0-9]{4}m[0-9]{2}\$'
+            AND (to_date(right(c.relname, 7), 'YYYY"m"MM') + interval '1 month')::date <= keep_from
+            ORDER BY 1
+        LOOP
+            EXECUTE format('ALTER TABLE regional.local_temperature DETACH PARTITION regional.%I', name_);
+            IF drop_ THEN
+                EXECUTE format('DROP TABLE regional.%I', name_);
+            ELSE
+                EXECUTE format('ALTER TABLE regional.%I SET SCHEMA regional_archive', name_);
+            END IF;
+            retired := retired + 1;
+        END LOOP;
+        DELETE FROM regional.day_completeness WHERE day < keep_from;
+        RETURN retired;
+    END;
+    \$\$;
+    ALTER FUNCTION regional.retire_partitions(date, boolean) OWNER TO admin;
+    REVOKE ALL ON FUNCTION regional.create_partitions(date, date), regional.retire_partitions(date, boolean) FROM PUBLIC;
+    GRANT EXECUTE ON FUNCTION regional.create_partitions(date, date), regional.retire_partitions(date, boolean) TO bot_parser;
+    
+    -- the current month and the next one, the rest is created by backend
+    SELECT regional.create_partitions(CURRENT_DATE, (CURRENT_DATE + interval '1 month')::date);
+
+    /*------------------------- Notifications about changes of dictionaries --------------------------------*/
+    -- API keeps regional.geoid, regional.geoalias and regional.conditionid in memory and receives their changes by LISTEN
+    CREATE OR REPLACE FUNCTION regional.notify_dimensions()
+    RETURNS trigger
+    LANGUAGE plpgsql
+    AS \$\$
+    BEGIN
+        PERFORM pg_notify(
+            'weather_dimensions',
+            json_build_object(
+                'table', TG_TABLE_NAME,
+                'op', TG_OP,
+                'row', CASE WHEN TG_OP = 'DELETE' THEN row_to_json(OLD)
+                            WHEN TG_OP = 'TRUNCATE' THEN NULL
+                            ELSE row_to_json(NEW) END
+            )::text
+        );
+        RETURN NULL;
+    END;
+    \$\$;
+    ALTER FUNCTION regional.notify_dimensions() OWNER TO admin;
+
+    CREATE TRIGGER geoid_notify_dimensions
+        AFTER INSERT OR UPDATE OR DELETE ON regional.geoid
+        FOR EACH ROW EXECUTE FUNCTION regional.notify_dimensions();
+    CREATE TRIGGER geoid_truncate_notify_dimensions
+        AFTER TRUNCATE ON regional.geoid
+        FOR EACH STATEMENT EXECUTE FUNCTION regional.notify_dimensions();
+    CREATE TRIGGER conditionid_notify_dimensions
+        AFTER INSERT OR UPDATE OR DELETE ON regional.conditionid
+        FOR EACH ROW EXECUTE FUNCTION regional.notify_dimensions();
+    CREATE TRIGGER conditionid_truncate_notify_dimensions
+        AFTER TRUNCATE ON regional.conditionid
+        FOR EACH STATEMENT EXECUTE FUNCTION regional.notify_dimensions();
+    CREATE TRIGGER geoalias_notify_dimensions
+        AFTER INSERT OR UPDATE OR DELETE ON regional.geoalias
+        FOR EACH ROW EXECUTE FUNCTION regional.notify_dimensions();
+    CREATE TRIGGER geoalias_truncate_notify_dimensions
+        AFTER TRUNCATE ON regional.geoalias
+        FOR EACH STATEMENT EXECUTE FUNCTION regional.notify_dimensions();
+    
 EOSQL
\ No newline at end of file
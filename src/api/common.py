@@ -1,8 +1,50 @@
 from fastapi import APIRouter
+from fastapi.responses import Response, JSONResponse
+
+from src.data.get_data import history_cache, single_flight, dimensions, warmup
+from src.metrics import render
 
 router = APIRouter()
 
 
 @router.get("/healthcheck")
 async def healthcheck():
+    """
+    The worker is ready when warm-up of its caches is over (or its timeout), before it - 503
+    """
+    
+    if not warmup.ready:
+        return JSONResponse(status_code = 503, content = {'status': 'warming up', **warmup.stats})
+    
     return "Ok"
+
+
+@router.get("/stats")
+async def stats():
+    """
+    Counters of in-process caches, coalesced requests and dictionaries of DB in memory of the worker
+    """
+    
+    return {
+        'history_cache': {
+            'entries': len(history_cache),
+            'size_bytes': history_cache.size,
+            'hits': history_cache.hits,
+            'misses': history_cache.misses,
+        },
+        'single_flight': single_flight.stats,
+        'dimensions': dimensions.stats,
+        'warmup': warmup.stats,
+    }
+
+
+@router.get("/metrics")
+async def metrics():
+    """
+    Metrics in format of Prometheus: latency of requests and their stages, caches, backend tasks
+    (of all workers if PROMETHEUS_MULTIPROC_DIR is set)
+    """
+    
+    content, media_type = render()
+    
+    return Response(content = content, media_type = media_type)
@@ -0,0 +1,274 @@
+import gzip
+import orjson
+import importlib.util
+import hashlib
+from decimal import Decimal
+from datetime import date, datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse, Response
+from src.utils.lazy import lazy_import
+
+### compact formats are optional, the format isn't offered if its library isn't installed
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+### pyarrow is heavy, it's imported at the first response in Arrow format
+if importlib.util.find_spec('pyarrow') is not None:
+    pa = lazy_import('pyarrow')
+else:
+    pa = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+MEDIA_JSON = 'application/json'
+MEDIA_COLUMNAR = 'application/vnd.weather.columnar+json'
+MEDIA_MSGPACK = 'application/x-msgpack'
+MEDIA_ARROW = 'application/vnd.apache.arrow.stream'
+### responses differ by format and compression, so shared caches must keep them apart
+VARY = 'Accept, Accept-Encoding'
+
+
+def _default(obj: object) -> object:
+    """
+    Types which are not serialized by orjson natively
+    """
+
+    if isinstance(obj, Decimal):
+        return float(obj)
+
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: object = None) -> bytes:
+    """
+    Fast serialization of rows from DB: datetime in isoformat, numpy values as python ones
+    """
+
+    return orjson.dumps(content, default = _default, option = orjson.OPT_SERIALIZE_NUMPY)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Response rendered by orjson. Rows of response are built from trusted records of DB,
+    so the handlers return this response directly, without re-validation by pydantic
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: object) -> bytes:
+
+        return dumps(content)
+
+
+#-------------------------------------------------------------------------------------------------
+############################## Negotiation of format and compression -----------------------------
+#-------------------------------------------------------------------------------------------------
+
+def _parse_header(header: str = None) -> list:
+    """
+    Values of header like Accept or Accept-Encoding in order of preference (by q parameter)
+    """
+
+    values = []
+    for n, part in enumerate((header or '').split(',')):
+        value, *params = [x.strip() for x in part.split(';')]
+        if not value:
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            values.append((-q, n, value.lower()))
+
+    return [x[-1] for x in sorted(values)]
+
+
+def negotiate_format(accept: str = None) -> str:
+    """
+    Media type of response by header Accept, JSON rows by default.
+    Raises 406 if only compact formats are requested and their libraries aren't installed
+    """
+
+    available = {
+        MEDIA_JSON: True,
+        MEDIA_COLUMNAR: True,
+        MEDIA_MSGPACK: msgpack is not None,
+        MEDIA_ARROW: pa is not None,
+    }
+    requested = _parse_header(accept)
+    for media_type in requested:
+        if media_type in ('*/*', 'application/*'):
+            return MEDIA_JSON
+        if available.get(media_type):
+            return media_type
+    if any(x in available for x in requested):
+        raise HTTPException(
+            status_code = 406,
+            detail = f"Available formats: {', '.join(x for x, y in available.items() if y)}"
+        )
+
+    return MEDIA_JSON
+
+
+def to_columnar(data: list = []) -> dict:
+    """
+    Rows of data to arrays of columns, the location is moved to header if it's the same for all rows
+    """
+
+    columns = {k: [row[k] for row in data] for k in (data[0] if data else {})}
+    geo_location = None
+    if len(set(columns.get('geo_location', []))) == 1:
+        geo_location = columns.pop('geo_location')[0]
+
+    return {'geo_location': geo_location, 'rows': len(data), 'columns': columns}
+
+
+def _msgpack_default(obj: object) -> object:
+
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    elif isinstance(obj, Decimal):
+        return float(obj)
+    elif hasattr(obj, 'tolist'):
+        return obj.tolist()
+
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable by msgpack")
+
+
+def _to_arrow(content: dict = {}) -> bytes:
+    """
+    Columns of data as Arrow IPC stream, current_time, metainfo and location are in metadata of schema
+    """
+
+    body = content['data']
+    columns = {}
+    for k, values in body['columns'].items():
+        ### rows from REDIS cache keep datetime as string
+        if values and isinstance(values[0], str) and k == 'datetime':
+            values = [datetime.fromisoformat(x) for x in values]
+        columns[k] = pa.array(values)
+    table = pa.table(columns, metadata = {
+        'current_time': content['current_time'],
+        'metainfo': dumps(content['metainfo']),
+        'geo_location': body['geo_location'] or '',
+    })
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+    return sink.getvalue().to_pybytes()
+
+
+def encode(content: dict = {}, media_type: str = MEDIA_JSON) -> bytes:
+    """
+    Body of response in negotiated format, content - {'current_time', 'metainfo', 'data'}
+    """
+
+    if media_type == MEDIA_JSON:
+        return dumps(content)
+    content = {**content, 'data': to_columnar(content['data'])}
+    if media_type == MEDIA_COLUMNAR:
+        return dumps(content)
+    elif media_type == MEDIA_MSGPACK:
+        return msgpack.packb(content, default = _msgpack_default)
+    elif media_type == MEDIA_ARROW:
+        return _to_arrow(content)
+
+    raise ValueError(f"Unknown format of response: {media_type}")
+
+
+def compress(body: bytes = b'', accept_encoding: str = None,
+             min_size: int = 1024, gzip_level: int = 5, brotli_quality: int = 4) -> (bytes, str):
+    """
+    Compression of body bigger than min_size by Accept-Encoding, returns body and its encoding
+    """
+
+    if len(body) < min_size:
+        return body, None
+    for encoding in _parse_header(accept_encoding):
+        if encoding == 'br' and brotli is not None:
+            return brotli.compress(body, quality = brotli_quality), 'br'
+        elif encoding == 'gzip':
+            return gzip.compress(body, compresslevel = gzip_level), 'gzip'
+
+    return body, None
+
+
+def negotiated_response(content: dict = {}, media_type: str = MEDIA_JSON, accept_encoding: str = None,
+                        headers: dict = None, **compress_pars) -> Response:
+    """
+    media_type - result of negotiate_format (it's called before processing of request)
+    headers - additional headers like validators of conditional requests
+    """
+
+    body, encoding = compress(encode(content, media_type), accept_encoding, **compress_pars)
+    headers = {'Vary': VARY, **(headers or {})}
+    if encoding:
+        headers['Content-Encoding'] = encoding
+
+    return Response(content = body, media_type = media_type, headers = headers)
+
+
+#-------------------------------------------------------------------------------------------------
+############################## Conditional requests ----------------------------------------------
+#-------------------------------------------------------------------------------------------------
+
+def make_etag(*parts) -> str:
+    """
+    Weak validator from parts which define the content (location, dates, format, time of update),
+    it's weak because the same content is sent with different compression
+    """
+
+    return 'W/"' + hashlib.sha1('|'.join(str(x) for x in parts).encode()).hexdigest() + '"'
+
+
+def _opaque_tag(tag: str = '') -> str:
+
+    tag = tag.strip()
+
+    return tag[2:] if tag.startswith('W/') else tag
+
+
+def http_date(value: datetime = None) -> str:
+    """
+    Value of Last-Modified, value - datetime with time zone
+    """
+
+    return format_datetime(value.astimezone(timezone.utc), usegmt = True)
+
+
+def is_not_modified(etag: str = None, last_modified: datetime = None,
+                    if_none_match: str = None, if_modified_since: str = None) -> bool:
+    """
+    Check of conditional request like RFC 7232: If-None-Match (weak comparison) takes precedence,
+    If-Modified-Since is used only without it. last_modified - datetime with time zone
+    """
+
+    if if_none_match:
+        tags = {_opaque_tag(x) for x in if_none_match.split(',')}
+        return etag is not None and ('*' in tags or _opaque_tag(etag) in tags)
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return since.tzinfo is not None and last_modified.replace(microsecond = 0) <= since
+
+    return False
+
+
+def not_modified_response(headers: dict = {}) -> Response:
+    """
+    304 with validators and Cache-Control, but without body
+    """
+
+    return Response(status_code = 304, headers = {'Vary': VARY, **headers})
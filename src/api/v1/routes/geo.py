@@ -1,13 +1,52 @@
+import pytz
+from datetime import datetime
 from src.logger import *
-from fastapi import APIRouter
+from src.utils.logs import log
+from typing import Optional
+from fastapi import APIRouter, Header
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+
+from src.api.responses import (
+                            FastJSONResponse, 
+                            dumps, 
+                            negotiate_format, 
+                            negotiated_response,
+                            make_etag,
+                            http_date,
+                            is_not_modified,
+                            not_modified_response,
+                            )
 
 from src.data.models import (
                             WeatherRequestHistory,
                             WeatherRequestForecast,
-                            WeatherResponse
+                            WeatherRequestHistoryBatch,
+                            WeatherRequestForecastBatch,
+                            WeatherResponse,
+                            WeatherResponseHistoryBatch,
+                            WeatherResponseForecastBatch,
+                            )
+from src.data.get_data import (
+                            WeatherDataFromDB, 
+                            WeatherDataFromAPI, 
+                            forecast_cache,
+                            single_flight,
+                            popularity,
+                            dimensions,
+                            FORECAST_SERVICE_COLUMNS,
+                            to_row,
+                            group_by,
+                            get_cached_days,
+                            put_cached_days,
+                            key_location,
+                            keys_forecast,
+                            cache_forecast,
+                            forecast_ttl,
+                            forecast_age,
                             )
-from src.data.get_data import WeatherDataFromDB, WeatherDataFromAPI
 from src.settings import configs
+from src.metrics import API_STAGE_SECONDS, API_CACHE_RESPONSES
 
 router = APIRouter()
 
@@ -15,8 +54,11 @@ router = APIRouter()
 ############## the endpoint /weather/history ####################################################
 #------------------------------------------------------------------------------------------------
 
-@router.post("/history")
-async def history(request: WeatherRequestHistory) -> WeatherResponse:
+@router.post("/history", response_model = WeatherResponse, response_class = FastJSONResponse)
+async def history(request: WeatherRequestHistory, 
+                  accept: Optional[str] = Header(None), 
+                  accept_encoding: Optional[str] = Header(None),
+                  if_none_match: Optional[str] = Header(None)) -> WeatherResponse:
     """
     Get weather's data on definite city and country for period or date from DB or API
     (if not exist in DB)
@@ -24,7 +66,11 @@ async def history(request: WeatherRequestHistory) -> WeatherResponse:
     Request body:
     - city:    string require (the name of location)
     - country: string optional (the country if necessary to specify it)
-    - dates:   string (list of dates in string format like %Y-%m-%d separated by comma)
+    - dates:   string (list of dates in string format like %Y-%m-%d separated by comma) OR
+    - start:   date (the first date of range in format %Y-%m-%d)
+    - end:     date optional (the last date of range, by default - start)
+    
+    The limit is 366 days in one request
 
     Returns:
     - current_time
@@ -39,63 +85,268 @@ async def history(request: WeatherRequestHistory) -> WeatherResponse:
         - 'pressure_mb':            float,
         - 'day_or_night':           string ('day' or 'night' values),
         - 'geo_location':           string (the name of location in format - "City, Country")
+    
+    With header "Accept: application/x-ndjson" rows are streamed from DB as they are read,
+    one JSON object per line, the last line is {"metainfo": {...}, "current_time": ...}
+    (rows of dates parsed additionally from Weather API follow after the rows from DB)
+    
+    Compact formats by header Accept (data as arrays of columns, geo_location in header of data):
+    - application/vnd.weather.columnar+json
+    - application/x-msgpack (if msgpack is installed)
+    - application/vnd.apache.arrow.stream (if pyarrow is installed, metainfo in metadata of schema)
+    Responses bigger than API__COMPRESS_MIN_SIZE are compressed by Accept-Encoding (br, gzip)
+    
+    Responses with all requested days have ETag and long Cache-Control (finalized days don't change),
+    request with the same ETag in If-None-Match gets 304 without body
     """
     
     ### processing request ----------------------------------------------------------------------
     pars = request.get_dict
-    log(logger, 'parsing params', 'info', f"Got next input params : {pars}")
+    log(logger, 'parsing params', 'info', 'Got next input params', {'params': pars})
     if pars['geo_country'] is None: pars.pop('geo_country')
-    pars['condition_geo'] =  (
-        ' AND '
-        .join([f"LOWER({x[0]}) = " + json.dumps(x[1], cls= NpEncoder).replace('"',"'").lower() \
-                for x in pars.items() \
-                if x[0] in ['geo_name','geo_country']])
+    
+    dates = pars['date_range']
+    key_geo = key_location(pars['geo_name'], pars.get('geo_country'))
+    if accept and 'application/x-ndjson' in accept:
+        ### the stream is read from DB, the outcome is counted like for other formats: complete
+        ### if all days are in memory of worker
+        cached = get_cached_days(key_geo, dates)
+        API_CACHE_RESPONSES.labels('history', 'complete' if len(cached) == len(dates) else 'miss').inc()
+        return StreamingResponse(_stream_history(pars, dates), media_type = 'application/x-ndjson')
+    media_type = negotiate_format(accept)
+    etag = make_etag('history', *key_geo, *dates, media_type)
+    
+    ### trying to retrieve data from memory of worker, then from DB -----------------------------
+    data = get_cached_days(key_geo, dates)
+    if await _history_not_modified(pars, dates, data, etag, if_none_match):
+        API_CACHE_RESPONSES.labels('history', 'not_modified').inc()
+        return not_modified_response(_history_headers(etag))
+    missing_dates = [x for x in dates if x not in data]
+    API_CACHE_RESPONSES.labels('history', 'miss' if missing_dates else 'complete').inc()
+    metainfo, task_id, coalesced = 'All data available from cache', None, False
+    if missing_dates:
+        ### concurrent requests of the same days are waiting for the first one
+        (data_loaded, metainfo, task_id), coalesced = await single_flight.do(
+            ('history', key_geo, tuple(missing_dates)), 
+            _load_history_days, pars, key_geo, missing_dates
+        )
+        data.update(data_loaded)
+    #--------------------------------------------------------------------------------------------
+    
+    return _response(
+        data = [row for date_ in dates for row in data.get(date_, [])],
+        metainfo = {
+            'message': metainfo, 
+            'backend_task':task_id,
+            'coalesced': coalesced,
+        },
+        media_type = media_type,
+        accept_encoding = accept_encoding,
+        headers = _history_headers(etag if all(x in data for x in dates) else None),
     )
+
+
+async def _history_not_modified(pars: dict = {}, dates: list = [], data: dict = {}, etag: str = '', 
+                                if_none_match: str = None, daily: bool = False) -> bool:
+    """
+    The client has the same days if its ETag matches and all requested days are finalized:
+    they are in memory of worker or finalized in DB (checked by primary key without reading of rows)
+    """
+    
+    if not is_not_modified(etag, None, if_none_match):
+        return False
+    if all(x in data for x in dates):
+        return True
+    
+    return await WeatherDataFromDB().count_finalized_days(daily, **pars) == len(dates)
+
+
+def _history_headers(etag: str = None) -> dict:
+    """
+    Complete history is cached by clients for a long time, incomplete one is revalidated
+    """
+    
+    if etag is None:
+        return {'Cache-Control': 'no-cache'}
+    
+    return {
+        'ETag': etag,
+        'Cache-Control': f"public, max-age={configs['CACHE__HTTP_HISTORY_MAX_AGE']}, immutable",
+    }
+
+
+async def _load_history_days(pars: dict = {}, key_geo: tuple = (), missing_dates: list = [], 
+                             daily: bool = False) -> (dict, str, str):
+    """
+    Retrieving days absent in memory from DB, if some of them are absent in DB too - 
+    making request to origin API through backend
+    :daily - daily aggregates instead of hourly rows
+    """
     
-    ### trying to retrieve data from DB ---------------------------------------------------------
     wdb = WeatherDataFromDB()
-    df = await wdb.get_history_by_dates_and_locations(**pars)
+    get_history = wdb.get_history_daily_by_dates_and_locations if daily else wdb.get_history_by_dates_and_locations
+    records = await get_history(**{**pars, 'date_range': missing_dates})
+    data = put_cached_days(key_geo, records, daily)
+    missing_dates = _missing_days(records, daily)
     task_id = None
     ### check - if all requested dates in response, else making request to origin API -----------
-    if set(map(parse, df['check_date'].astype(str).unique())) & set(map(parse, pars['date_range'])) \
-        != set(map(parse, pars['date_range'])):
-        pars['date_range'] = list(
-            set(map(lambda x: parse(x).strftime('%Y-%m-%d'), df['check_date'].astype(str).unique())) ^ \
-            set(pars['date_range'])
-        )
+    if missing_dates:
         wapi = WeatherDataFromAPI()
-        load, task_id = wapi.trigger_backend_history_by_dates_and_locations(**pars)
+        load, task_id = await wapi.trigger_backend_history_by_dates_and_locations(**{**pars, 'date_range': missing_dates})
         if load:
             metainfo = 'Data was parsed additionally from Weather API'
         else:
             metainfo = 'There are maybe issue with caching data from API'
         #----------------------------------------------------------
-        pars['condition_geo'] =  (
-            ' AND '
-            .join([f"LOWER({x[0]}) LIKE " + json.dumps(x[1]+'%', cls= NpEncoder).replace('"',"'").lower() \
-                    for x in pars.items() \
-                    if x[0] in ['geo_name','geo_country']])
-        )
-        df = await wdb.get_history_by_dates_and_locations(**pars)
+        records = await get_history(prefix = True, **{**pars, 'date_range': missing_dates})
+        data.update(put_cached_days(key_geo, records, daily))
+    else:
+        metainfo = 'All data available from cache'
+    
+    return data, metainfo, task_id
+
+
+async def _stream_history(pars: dict = {}, dates: list = []) -> str:
+    """
+    Streaming of history as NDJSON directly from DB cursor, without caching in memory of worker
+    """
+    
+    wdb = WeatherDataFromDB()
+    missing_dates = []
+    async for chunk in wdb.iterate_history_by_dates_and_locations(**{**pars, 'date_range': dates}):
+        yield _to_ndjson(chunk, missing_dates)
+    task_id = None
+    ### check - if all requested dates in response, else making request to origin API -----------
+    if missing_dates:
+        wapi = WeatherDataFromAPI()
+        load, task_id = await wapi.trigger_backend_history_by_dates_and_locations(**{**pars, 'date_range': missing_dates})
+        if load:
+            metainfo = 'Data was parsed additionally from Weather API'
+        else:
+            metainfo = 'There are maybe issue with caching data from API'
+        #----------------------------------------------------------
+        missing_dates_api, missing_dates = missing_dates, []
+        async for chunk in wdb.iterate_history_by_dates_and_locations(prefix = True, **{**pars, 'date_range': missing_dates_api}):
+            yield _to_ndjson(chunk, missing_dates)
     else:
         metainfo = 'All data available from cache'
     #--------------------------------------------------------------------------------------------
     
-    return WeatherResponse(
-        data = df.drop(['check_date'], axis = 1).to_dict(orient = 'records'),
+    yield dumps({
+        'metainfo': {
+            'message': metainfo, 
+            'backend_task':task_id,
+            'missing_dates': missing_dates,
+        },
+        'current_time': _current_time(),
+    }) + b'\n'
+
+
+def _to_ndjson(chunk: list = [], missing_dates: list = []) -> bytes:
+    """
+    Records of DB to lines of JSON, missing days (reported by DB) are collected to missing_dates
+    """
+    
+    lines = []
+    for record in chunk:
+        if record['datetime'] is None:
+            missing_dates.append(record['check_date'].isoformat())
+        else:
+            lines.append(dumps(to_row(record)))
+    
+    return b''.join(x + b'\n' for x in lines)
+
+
+def _missing_days(records: list = [], daily: bool = False) -> list:
+    """
+    Days which are absent in DB (the query returns them as records with NULL values)
+    """
+    
+    column = 'date' if daily else 'datetime'
+    
+    return [x['check_date'].isoformat() for x in records if x[column] is None]
+
+#------------------------------------------------------------------------------------------------
+############## the endpoint /weather/history/daily ##############################################
+#------------------------------------------------------------------------------------------------
+
+@router.post("/history/daily", response_model = WeatherResponse, response_class = FastJSONResponse)
+async def history_daily(request: WeatherRequestHistory, 
+                        accept: Optional[str] = Header(None), 
+                        accept_encoding: Optional[str] = Header(None),
+                        if_none_match: Optional[str] = Header(None)) -> WeatherResponse:
+    """
+    Get daily aggregates of weather on definite city and country for period or date from DB or API
+    (if not exist in DB). Aggregates are calculated by backend when hourly data is saved
+    
+    Request body like in /weather/history
+
+    Returns:
+    - current_time
+    - metainfo - about process of retrieving data from DB and/or API
+    - data - list of dicts (one value for the definite date)
+        - 'date':               date,
+        - 'temperature_min':    float (value in C degree),
+        - 'temperature_max':    float (value in C degree),
+        - 'temperature_mean':   float (value in C degree),
+        - 'humidity_min':       float (in %),
+        - 'humidity_max':       float (in %),
+        - 'humidity_mean':      float (in %),
+        - 'condition_weather':  string (the most frequent condition of the day),
+        - 'geo_location':       string (the name of location in format - "City, Country")
+    
+    Compact formats, compression and conditional requests like in /weather/history
+    """
+    
+    ### processing request ----------------------------------------------------------------------
+    pars = request.get_dict
+    log(logger, 'parsing params', 'info', 'Got next input params', {'params': pars})
+    if pars['geo_country'] is None: pars.pop('geo_country')
+    
+    dates = pars['date_range']
+    media_type = negotiate_format(accept)
+    key_geo = key_location(pars['geo_name'], pars.get('geo_country'))
+    etag = make_etag('history_daily', *key_geo, *dates, media_type)
+    
+    ### trying to retrieve data from memory of worker, then from DB -----------------------------
+    data = get_cached_days(key_geo, dates, daily = True)
+    if await _history_not_modified(pars, dates, data, etag, if_none_match, daily = True):
+        API_CACHE_RESPONSES.labels('history_daily', 'not_modified').inc()
+        return not_modified_response(_history_headers(etag))
+    missing_dates = [x for x in dates if x not in data]
+    API_CACHE_RESPONSES.labels('history_daily', 'miss' if missing_dates else 'complete').inc()
+    metainfo, task_id, coalesced = 'All data available from cache', None, False
+    if missing_dates:
+        ### concurrent requests of the same days are waiting for the first one
+        (data_loaded, metainfo, task_id), coalesced = await single_flight.do(
+            ('history_daily', key_geo, tuple(missing_dates)), 
+            _load_history_days, pars, key_geo, missing_dates, True
+        )
+        data.update(data_loaded)
+    #--------------------------------------------------------------------------------------------
+    
+    return _response(
+        data = [row for date_ in dates for row in data.get(date_, [])],
         metainfo = {
             'message': metainfo, 
             'backend_task':task_id,
+            'coalesced': coalesced,
         },
-        current_time = datetime.now().astimezone(pytz.timezone(configs['TZ'])).isoformat()
+        media_type = media_type,
+        accept_encoding = accept_encoding,
+        headers = _history_headers(etag if all(x in data for x in dates) else None),
     )
 
 #------------------------------------------------------------------------------------------------
-############## the endpoint /weather/history ####################################################
+############## the endpoint /weather/forecast ###################################################
 #------------------------------------------------------------------------------------------------
 
-@router.post("/forecast")
-async def forecast(request: WeatherRequestForecast) -> WeatherResponse:
+@router.post("/forecast", response_model = WeatherResponse, response_class = FastJSONResponse)
+async def forecast(request: WeatherRequestForecast, 
+                   accept: Optional[str] = Header(None), 
+                   accept_encoding: Optional[str] = Header(None),
+                   if_none_match: Optional[str] = Header(None),
+                   if_modified_since: Optional[str] = Header(None)) -> WeatherResponse:
     """
     Get weather's data on definite city and country as forecast for the next 1-3 days 
     from DB or API (if not exist in DB)
@@ -118,51 +369,420 @@ async def forecast(request: WeatherRequestForecast) -> WeatherResponse:
         - 'pressure_mb':            float,
         - 'day_or_night':           string ('day' or 'night' values),
         - 'geo_location':           string (the name of location in format - "City, Country")
+    
+    Compact formats and compression like in /weather/history
+    
+    Complete forecast has ETag and Last-Modified (the latest update of forecast) and short Cache-Control,
+    request with the same validators (If-None-Match or If-Modified-Since) gets 304 without body.
+    Validators are kept in the shared cache of workers, so 304 is sent without reading of rows
     """
     
     ### processing request ----------------------------------------------------------------------
     pars = request.get_dict
-    log(logger, 'parsing params', 'info', f"Got next input params : {pars}")
+    log(logger, 'parsing params', 'info', 'Got next input params', {'params': pars})
     if pars['geo_country'] is None: pars.pop('geo_country')
-    pars['condition_geo'] =  (
-        ' AND '
-        .join([f"LOWER({x[0]}) = " + json.dumps(x[1], cls= NpEncoder).replace('"',"'").lower() \
-                for x in pars.items() \
-                if x[0] in ['geo_name','geo_country']])
+    media_type = negotiate_format(accept)
+    _count_request(pars)
+    
+    key_geo = key_location(pars['geo_name'], pars.get('geo_country'))
+    key_cache, key_validator = keys_forecast(pars, key_geo)
+    
+    ### conditional request is checked by validator in shared cache of workers ------------------
+    if if_none_match or if_modified_since:
+        validator = await run_in_threadpool(forecast_cache.get, key_validator)
+        if validator is not None:
+            updated = datetime.fromisoformat(validator['updated'])
+            if is_not_modified(_forecast_etag(pars, media_type, updated), _localize(updated), 
+                               if_none_match, if_modified_since):
+                API_CACHE_RESPONSES.labels('forecast', 'not_modified').inc()
+                return not_modified_response(_forecast_headers(pars, media_type, updated))
+    
+    ### trying to retrieve data from shared cache of workers ------------------------------------
+    data, validator = await run_in_threadpool(forecast_cache.get_many, [key_cache, key_validator])
+    API_CACHE_RESPONSES.labels('forecast', 'miss' if data is None else 'complete').inc()
+    if data is not None:
+        return _response(
+            data = data,
+            metainfo = {
+                'message': 'All data available from cache', 
+                'backend_task':None,
+                'coalesced': False,
+            },
+            media_type = media_type,
+            accept_encoding = accept_encoding,
+            headers = _forecast_headers(pars, media_type, \
+                datetime.fromisoformat(validator['updated']) if validator is not None else None),
+        )
+    
+    ### concurrent requests of the same location are waiting for the first one -----------------
+    (data, metainfo, updated), coalesced = await single_flight.do(
+        ('forecast', key_geo, pars['days']), 
+        _load_forecast, pars, key_cache, key_validator
+    )
+    
+    return _response(
+        data = data,
+        metainfo = {
+            **metainfo,
+            'coalesced': coalesced,
+        },
+        media_type = media_type,
+        accept_encoding = accept_encoding,
+        headers = _forecast_headers(pars, media_type, updated),
+    )
+
+
+def _count_request(pars: dict = {}) -> None:
+    """
+    Popularity of known locations (resolved by the index in memory, without queries to DB)
+    """
+    
+    if popularity.enabled:
+        popularity.hit(dimensions.resolve_geo(pars['geo_name'], pars.get('geo_country')))
+
+
+def _localize(updated: datetime = None) -> datetime:
+    """
+    datetime_update is saved in the TZ of service without time zone
+    """
+    
+    return pytz.timezone(configs['TZ']).localize(updated)
+
+
+def _forecast_etag(pars: dict = {}, media_type: str = '', updated: datetime = None) -> str:
+    
+    return make_etag(
+        'forecast', *key_location(pars['geo_name'], pars.get('geo_country')), 
+        pars['days'], media_type, updated.isoformat(),
     )
+
+
+def _forecast_headers(pars: dict = {}, media_type: str = '', updated: datetime = None) -> dict:
+    """
+    Complete forecast is cached by clients while it's fresh (not longer than CACHE__HTTP_FORECAST_MAX_AGE),
+    incomplete one (updated is None) is revalidated
+    """
+    
+    if updated is None:
+        return {'Cache-Control': 'no-cache'}
+    
+    return {
+        'ETag': _forecast_etag(pars, media_type, updated),
+        'Last-Modified': http_date(_localize(updated)),
+        'Cache-Control': f"public, max-age={min(configs['CACHE__HTTP_FORECAST_MAX_AGE'], forecast_ttl(updated))}",
+    }
+
+
+async def _load_forecast(pars: dict = {}, key_cache: str = '', key_validator: str = '') -> (list, dict, datetime):
+    """
+    Retrieving forecast from DB, if some of days are absent - making request to origin API 
+    through backend. The complete forecast is saved to shared cache of workers with its validator,
+    the latest update is returned only for complete forecast (for too old one - only if it was refreshed by backend).
+    Stale forecast (incomplete or older than CACHE__FORECAST_MAX_AGE, but not older than 
+    CACHE__FORECAST_MAX_STALE beyond it) is returned at once, the location is refreshed in background
+    """
     
-    ### trying to retrieve data from DB ---------------------------------------------------------
     wdb = WeatherDataFromDB()
-    df = await wdb.get_forecast_by_locations(**pars)
-    task_id = None
+    records = await wdb.get_forecast_by_locations(**pars)
+    task_id, expired = None, None
+    
+    ### stale-while-revalidate ------------------------------------------------------------------
+    if configs['CACHE__FORECAST_SWR'] and records:
+        age = forecast_age(max(x['datetime_update'] for x in records))
+        complete = len({x['check_date'] for x in records}) >= pars['days']
+        if (not complete or age > configs['CACHE__FORECAST_MAX_AGE']) \
+            and age <= configs['CACHE__FORECAST_MAX_AGE'] + configs['CACHE__FORECAST_MAX_STALE']:
+            scheduled = await _schedule_refresh_forecast(pars)
+            return [to_row(x, FORECAST_SERVICE_COLUMNS) for x in records], {
+                'message': 'Stale data from cache, refreshing from Weather API was ' + \
+                    ('scheduled' if scheduled else 'already scheduled'),
+                'backend_task': None,
+                'stale': True,
+                'age': int(age),
+            }, None
+        ### too old forecast is refreshed like absent one
+        if complete and age > configs['CACHE__FORECAST_MAX_AGE']:
+            expired = max(x['datetime_update'] for x in records)
+            records = []
     
     ### check - if all requested days in response, else making request to origin API -----------
-    if df['check_date'].nunique() < pars['days']:
+    if len({x['check_date'] for x in records}) < pars['days']:
         wapi = WeatherDataFromAPI()
-        load, task_id = wapi.trigger_backend_forecast_by_days_and_locations(**pars)
+        load, task_id = await wapi.trigger_backend_forecast_by_days_and_locations(**pars)
         if load:
             metainfo = 'Data was parsed additionally from Weather API'
         else:
             metainfo = 'There are maybe issue with caching data from API'
         #----------------------------------------------------------
-        pars['condition_geo'] =  (
-            ' AND '
-            .join([f"LOWER({x[0]}) LIKE " + json.dumps(x[1]+'%', cls= NpEncoder).replace('"',"'").lower() \
-                    for x in pars.items() \
-                    if x[0] in ['geo_name','geo_country']])
-        )
-        df = await wdb.get_forecast_by_locations(**pars)
+        records = await wdb.get_forecast_by_locations(prefix = True, **pars)
     else:
         metainfo = 'All data available from cache'
     #--------------------------------------------------------------------------------------------
     
-    return WeatherResponse(
-        data = df.drop(['check_date'], axis = 1).to_dict(orient = 'records'),
+    data = [to_row(x, FORECAST_SERVICE_COLUMNS) for x in records]
+    metainfo = {'message': metainfo, 'backend_task': task_id}
+    if len({x['check_date'] for x in records}) < pars['days']:
+        return data, metainfo, None
+    updated = max(x['datetime_update'] for x in records)
+    ### refresh of too old forecast failed (the task is started, but it failed or timed out),
+    ### the same expired rows aren't cached as fresh
+    if expired is not None and updated <= expired:
+        return data, metainfo, None
+    if forecast_cache.enabled:
+        await run_in_threadpool(cache_forecast, key_cache, key_validator, data, updated, records[0]['geo_location'])
+    
+    return data, metainfo, updated
+
+
+async def _schedule_refresh_forecast(pars: dict = {}) -> bool:
+    """
+    Only one refresh of location is in flight: in the worker (by single flight) 
+    and between workers (by lock in shared cache, if it's enabled)
+    """
+    
+    key_geo = key_location(pars['geo_name'], pars.get('geo_country'))
+    key_lock = forecast_cache.key(*key_geo, 'refresh')
+    if ('forecast_refresh', key_geo) in single_flight.calls:
+        return False
+    if not await run_in_threadpool(forecast_cache.claim, key_lock, configs['CACHE__FORECAST_REFRESH_LOCK']):
+        return False
+    
+    return single_flight.spawn(('forecast_refresh', key_geo), _refresh_forecast, pars, key_lock)
+
+
+async def _refresh_forecast(pars: dict = {}, key_lock: str = '') -> None:
+    """
+    Backend uploads the forecast to DB and drops cached payloads of location
+    """
+    
+    try:
+        wapi = WeatherDataFromAPI()
+        load, task_id = await wapi.trigger_backend_forecast_by_days_and_locations(**pars)
+        log(logger, 'refresh of stale forecast', 'info' if load else 'error', 
+            f"{pars['geo_name']}: task {task_id} {'finished' if load else 'failed'}")
+    finally:
+        await run_in_threadpool(forecast_cache.release, key_lock)
+
+#------------------------------------------------------------------------------------------------
+############## the endpoint /weather/history/batch ##############################################
+#------------------------------------------------------------------------------------------------
+
+@router.post("/history/batch", response_model = WeatherResponseHistoryBatch, response_class = FastJSONResponse)
+async def history_batch(request: WeatherRequestHistoryBatch) -> WeatherResponseHistoryBatch:
+    """
+    Get weather's data on several locations for their periods or dates by one request.
+    All locations are retrieved from DB by one query, absent data of all locations 
+    is requested from API by one backend task
+    
+    Request body:
+    - items: list of requests like for /weather/history (city, country, dates)
+
+    Returns:
+    - current_time
+    - metainfo - about process of retrieving data from DB and/or API
+    - data - list of results in the same order as items
+        - 'item':          integer (the number of item in request)
+        - 'city':          string
+        - 'country':       string
+        - 'missing_dates': list of dates which are still not available
+        - 'data':          list of dicts like in /weather/history
+    """
+    
+    ### processing request ----------------------------------------------------------------------
+    items = request.get_list
+    log(logger, 'parsing params', 'info', 'Got batch', {'items': len(items)})
+    keys_geo, dates, data = [], [], []
+    for pars in items:
+        if pars['geo_country'] is None: pars.pop('geo_country')
+        keys_geo.append(key_location(pars['geo_name'], pars.get('geo_country')))
+        dates.append(pars['date_range'])
+        data.append(get_cached_days(keys_geo[-1], dates[-1]))
+    
+    ### trying to retrieve data of all items from DB by one query -------------------------------
+    wdb = WeatherDataFromDB()
+    metainfo, task_id = 'All data available from cache', None
+    items_missing = _missing_days_batch(items, dates, data)
+    API_CACHE_RESPONSES.labels('history_batch', 'miss' if items_missing else 'complete').inc()
+    if items_missing:
+        records = await wdb.get_history_batch(items_missing)
+        _put_cached_days_batch(records, keys_geo, data)
+        items_missing = _missing_days_batch(items, dates, data)
+    
+    ### one backend task for all absent days, dates of the same location are merged -------------
+    if items_missing:
+        locations = {}
+        for idx, pars in items_missing:
+            location = locations.setdefault(keys_geo[idx], {**pars, 'date_range': []})
+            location['date_range'] = sorted(set(location['date_range']) | set(pars['date_range']))
+        wapi = WeatherDataFromAPI()
+        load, task_id = await wapi.trigger_backend_history_batch(list(locations.values()))
+        if load:
+            metainfo = 'Data was parsed additionally from Weather API'
+        else:
+            metainfo = 'There are maybe issue with caching data from API'
+        #----------------------------------------------------------
+        records = await wdb.get_history_batch(items_missing, prefix = True)
+        _put_cached_days_batch(records, keys_geo, data)
+    #--------------------------------------------------------------------------------------------
+    
+    return _response(
+        data = [{
+            'item': idx,
+            'city': pars['geo_name'],
+            'country': pars.get('geo_country'),
+            'missing_dates': [x for x in dates[idx] if x not in data[idx]],
+            'data': [row for date_ in dates[idx] for row in data[idx].get(date_, [])],
+        } for idx, pars in enumerate(items)],
         metainfo = {
             'message': metainfo, 
             'backend_task':task_id,
         },
-        current_time = datetime.now().astimezone(pytz.timezone(configs['TZ'])).isoformat()
     )
 
-#------------------------------------------------------------------------------------------------
\ No newline at end of file
+
+def _missing_days_batch(items: list = [], dates: list = [], data: list = []) -> list:
+    """
+    Items with absent days: [(number of item, params of item with only absent dates)]
+    """
+    
+    items_missing = []
+    for idx, pars in enumerate(items):
+        missing_dates = [x for x in dates[idx] if x not in data[idx]]
+        if missing_dates:
+            items_missing.append((idx, {**pars, 'date_range': missing_dates}))
+    
+    return items_missing
+
+
+def _put_cached_days_batch(records: list = [], keys_geo: list = [], data: list = []) -> None:
+    
+    for idx, records_item in group_by(records, 'item').items():
+        data[idx].update(put_cached_days(keys_geo[idx], records_item))
+
+#------------------------------------------------------------------------------------------------
+############## the endpoint /weather/forecast/batch #############################################
+#------------------------------------------------------------------------------------------------
+
+@router.post("/forecast/batch", response_model = WeatherResponseForecastBatch, response_class = FastJSONResponse)
+async def forecast_batch(request: WeatherRequestForecastBatch) -> WeatherResponseForecastBatch:
+    """
+    Get weather's forecast on several locations by one request.
+    All locations are retrieved from DB by one query, absent forecasts of all locations 
+    are requested from API by one backend task
+    
+    Request body:
+    - items: list of requests like for /weather/forecast (city, country, days)
+
+    Returns:
+    - current_time
+    - metainfo - about process of retrieving data from DB and/or API
+    - data - list of results in the same order as items
+        - 'item':          integer (the number of item in request)
+        - 'city':          string
+        - 'country':       string
+        - 'data':          list of dicts like in /weather/forecast
+    """
+    
+    ### processing request ----------------------------------------------------------------------
+    items = request.get_list
+    log(logger, 'parsing params', 'info', 'Got batch', {'items': len(items)})
+    for pars in items:
+        if pars['geo_country'] is None: pars.pop('geo_country')
+        _count_request(pars)
+    keys_cache = [keys_forecast(pars) for pars in items]
+    
+    ### trying to retrieve data from shared cache of workers, then from DB by one query ---------
+    data = await run_in_threadpool(forecast_cache.get_many, [x[0] for x in keys_cache])
+    items_missing = [(idx, pars) for idx, pars in enumerate(items) if data[idx] is None]
+    API_CACHE_RESPONSES.labels('forecast_batch', 'miss' if items_missing else 'complete').inc()
+    wdb = WeatherDataFromDB()
+    metainfo, task_id = 'All data available from cache', None
+    if items_missing:
+        records = await wdb.get_forecast_batch(items_missing)
+        await _put_forecast_batch(records, items, keys_cache, data)
+        items_missing = [(idx, pars) for idx, pars in enumerate(items) if data[idx] is None]
+    
+    ### one backend task for all absent forecasts, the longest one for the same location ---------
+    if items_missing:
+        locations = {}
+        for idx, pars in items_missing:
+            location = locations.setdefault(key_location(pars['geo_name'], pars.get('geo_country')), dict(pars))
+            location['days'] = max(location['days'], pars['days'])
+        wapi = WeatherDataFromAPI()
+        load, task_id = await wapi.trigger_backend_forecast_batch(list(locations.values()))
+        if load:
+            metainfo = 'Data was parsed additionally from Weather API'
+        else:
+            metainfo = 'There are maybe issue with caching data from API'
+        #----------------------------------------------------------
+        records = await wdb.get_forecast_batch(items_missing, prefix = True)
+        await _put_forecast_batch(records, items, keys_cache, data, partial = True)
+    #--------------------------------------------------------------------------------------------
+    
+    return _response(
+        data = [{
+            'item': idx,
+            'city': pars['geo_name'],
+            'country': pars.get('geo_country'),
+            'data': data[idx] or [],
+        } for idx, pars in enumerate(items)],
+        metainfo = {
+            'message': metainfo, 
+            'backend_task':task_id,
+        },
+    )
+
+
+async def _put_forecast_batch(records: list = [], items: list = [], keys_cache: list = [], 
+                              data: list = [], partial: bool = False) -> None:
+    """
+    Filling results of items with complete forecasts (or any found forecasts if partial) 
+    and saving complete ones to shared cache of workers
+    :keys_cache - keys of payload and validator of every item
+    """
+    
+    to_cache = []
+    for idx, records_item in group_by(records, 'item').items():
+        complete = len({x['check_date'] for x in records_item}) >= items[idx]['days']
+        if complete or partial:
+            data[idx] = [to_row(x, FORECAST_SERVICE_COLUMNS) for x in records_item]
+        if complete and forecast_cache.enabled:
+            to_cache.append((
+                *keys_cache[idx], data[idx], 
+                max(x['datetime_update'] for x in records_item), records_item[0]['geo_location'],
+            ))
+    
+    if to_cache:
+        await run_in_threadpool(lambda: [cache_forecast(*x) for x in to_cache])
+
+#------------------------------------------------------------------------------------------------
+############## common procedures of endpoints ###################################################
+#------------------------------------------------------------------------------------------------
+
+def _current_time() -> str:
+    
+    return datetime.now().astimezone(pytz.timezone(configs['TZ'])).isoformat()
+
+
+def _response(data: list = [], metainfo: dict = {}, media_type: str = FastJSONResponse.media_type, 
+              accept_encoding: str = None, headers: dict = None) -> Response:
+    """
+    Response is rendered from trusted rows without validation by response models (WeatherResponse etc.)
+    """
+    
+    with API_STAGE_SECONDS.labels('serialization').time():
+        return negotiated_response(
+            {
+                'current_time': _current_time(),
+                'metainfo': metainfo,
+                'data': data,
+            },
+            media_type = media_type,
+            accept_encoding = accept_encoding,
+            headers = headers,
+            min_size = configs['API__COMPRESS_MIN_SIZE'],
+            gzip_level = configs['API__GZIP_LEVEL'],
+            brotli_quality = configs['API__BROTLI_QUALITY'],
+        )
+
+#------------------------------------------------------------------------------------------------
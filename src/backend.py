@@ -1,21 +1,43 @@
+import socket
+import traceback
+from time import time
+from datetime import date
 from celery import Celery
-import celery as clr
 from celery.result import AsyncResult
+from celery import signals
 
 from src.settings import *
-from src.weather_process import WethearMetadata, processing_data_and_uploading
-from src.utils import *
+from src.utils.lazy import lazy_import
+from src.utils.logs import logger_init, log
+from src.utils.postgres import DBpostgreSQL
+from src.utils.redis_broker import DBredis
+from src.data.cache import RedisJSONCache
+from src.data.popularity import PopularityTracker, plan_prefetch
+from src.queries import QUERY_FORECAST_AGE_TEMPLATE
+from src.metrics import (
+                        BACKEND_REQUEST_SECONDS,
+                        BACKEND_REQUESTS_IN_FLIGHT,
+                        BACKEND_STAGE_SECONDS,
+                        BACKEND_TASK_SECONDS,
+                        BACKEND_TASKS,
+                        endpoint_label,
+                        render,
+                        )
 
 from flask import (
                     Flask,
                     Response,
-                    render_template,
                     request,
-                    json,
                     jsonify,
-                    make_response
+                    make_response,
+                    g
                     )
 
+### processing of data (pandas) is imported by tasks, Flask app and celery beat only route them
+requests = lazy_import('requests')
+### broker, statuses of tasks and shared caches are in REDIS of backend
+check_redis_password()
+
 app = Flask(__name__, static_url_path='')
 
 #Initialize celery --------------------------------------------------------------------
@@ -35,7 +57,12 @@ celery.conf.update(
 
 ## logging instance -----------------------------------------------------------------------
 
-logger = logger_init(location = 'init_backendapi', log_path = main_dirs['LOG'])
+logging_pars = {
+    'log_level': configs['LOG__LEVEL'],
+    'sampling': configs['LOG__SAMPLING'],
+    'queue_size': configs['LOG__QUEUE_SIZE'],
+}
+logger = logger_init(location = 'init_backendapi', log_path = main_dirs['LOG'], **logging_pars)
 
 ### DB instance ----------------------------------------------------------------------------
 
@@ -48,111 +75,314 @@ db = DBpostgreSQL(
 )
 db.logger = logger
 
+### shared cache of forecast payloads of REST API --------------------------------------------
+
+forecast_cache = RedisJSONCache(
+    host = configs['REDIS_HOST'],
+    port = configs['REDIS_PORT'],
+    db = configs['REDIS_DB_CACHE'],
+    password = configs['REDIS__PASSWORD'],
+    prefix = 'weather:forecast',
+    enabled = configs['CACHE__FORECAST_ENABLED'],
+    logger = logger,
+)
+
+### popularity of locations counted by REST API (requests of forecast) -----------------------
+
+popularity = PopularityTracker(
+    host = configs['REDIS_HOST'],
+    port = configs['REDIS_PORT'],
+    db = configs['REDIS_DB_CACHE'],
+    password = configs['REDIS__PASSWORD'],
+    key = 'weather:popularity:forecast',
+    enabled = configs['PREFETCH__ENABLED'],
+    logger = logger,
+)
+
 ############################################################################################
 ### tasks with delay execution #############################################################
 ############################################################################################
 
-@celery.task(name = 'celery.upload_history', queue=CELERY_QUEUE_HIST)
-def upload_history_post(querystring, dates):
+def download_history(logger: object = None, querystring: dict = {}, dates: list = []) -> None:
     """
-    procedure of async running task for downloading data from EXT API endpoint 'history'
+    downloading data from EXT API endpoint 'history' for one location and uploading it to DB
     :dates - the list of isoformat the period of dates like '%Y-%m-%d'
     """
     
-    logger = logger_init(location = 'init_backendapi_post', log_path = main_dirs['LOG'])
-    db.logger = logger
-    key = "{}_{}_{}".format(
-        socket.gethostname(),
-        date.today().strftime('%Y%m%d'),
-        'upload_history',
-    )
-    ## DB Redis instance ###################################################################
-    db_redis = DBredis(
-        topic = configs['REDIS_DB_STATUS'],
-        host = configs['REDIS_HOST'],
-        port = configs['REDIS_PORT'],
-    )
-    ########################################################################################
-    go_on = db_redis.publish_message(key, 'busy')
-    if go_on:
-        if querystring == {}: querystring = querystring_template['history']
-        log(logger, 'API init', 'info', f"Starting with next params:{querystring}, date range = {dates}")
-        #### GET API data ------------------------------------------------------------------
-        for date_ in dates:
-            querystring['dt'] = date_
-            go_on = False
-            try:
+    from src.weather_process import processing_data_and_uploading
+    log(logger, 'API init', 'info', 'Starting with next params', {'querystring': querystring, 'dates': dates})
+    #### GET API data ------------------------------------------------------------------
+    for date_ in dates:
+        querystring['dt'] = date_
+        try:
+            with BACKEND_STAGE_SECONDS.labels('origin_request').time():
                 response = requests.get(configs['WEATHER_API__HISTORY'],\
                                         headers=headers, \
                                         params=querystring)
-                if response.status_code == 200: 
-                    go_on = True
-                else:
-                    log(logger, 'API request', 'error', f"date - {querystring['dt']}: {response.text}")
-                    continue
-            except Exception as err:
-                traceback_info = traceback.format_exc()
-                log(logger, 'API request', 'error', f"{configs['WEATHER_API__HISTORY']}:{traceback_info}")
+            if response.status_code != 200: 
+                log(logger, 'API request', 'error', f"date - {querystring['dt']}: {response.text}")
                 continue
-            
-            ################################################################################
-            processing_data_and_uploading(logger, db, configs, response)
-            ################################################################################
-    else:
-        log(logger, 'API init', 'error', "Could not publish the status")
+        except Exception as err:
+            traceback_info = traceback.format_exc()
+            log(logger, 'API request', 'error', f"{configs['WEATHER_API__HISTORY']}:{traceback_info}")
+            continue
         
-    _ = db_redis.publish_message(key, 'free')
+        ################################################################################
+        with BACKEND_STAGE_SECONDS.labels('processing').time():
+            processing_data_and_uploading(logger, db, configs, response, querystring['q'])
+        ################################################################################
 
 
-@celery.task(name = 'celery.upload_forecast', queue=CELERY_QUEUE_FORE)
-def upload_forecast_post(querystring):
+def download_forecast(logger: object = None, querystring: dict = {}) -> None:
     """
-    procedure of async running task for downloading data from EXT API endpoint 'forecast'
-    :days - the number of days for the forecast - max value is 6
+    downloading data from EXT API endpoint 'forecast' for one location and uploading it to DB
     """
     
-    logger = logger_init(location = 'init_backendapi_post', log_path = main_dirs['LOG'])
+    from src.weather_process import processing_data_and_uploading
+    log(logger, 'API init', 'info', 'Starting with next params', {'querystring': querystring})
+    #### GET API data ------------------------------------------------------------------
+    try:
+        with BACKEND_STAGE_SECONDS.labels('origin_request').time():
+            response = requests.get(configs['WEATHER_API__FORECAST'],\
+                                        headers=headers, \
+                                        params=querystring)
+        if response.status_code != 200: 
+            log(logger, 'API request', 'error', f"location - {querystring['q']}: {response.text}")
+            return
+    except Exception as err:
+        traceback_info = traceback.format_exc()
+        log(logger, 'API request', 'error', f"{configs['WEATHER_API__FORECAST']}:{traceback_info}")
+        return
+    
+    ################################################################################
+    with BACKEND_STAGE_SECONDS.labels('processing').time():
+        processing_data_and_uploading(logger, db, configs, response, querystring['q'])
+    ################################################################################
+    ### dropping cached payloads of the location, they are older than the new forecast
+    location = response.json().get('location', {})
+    forecast_cache.invalidate(f"{location.get('name')}, {location.get('country')}")
+
+
+def maintain_partitions(logger: object = None) -> None:
+    """
+    creating partitions of table with weather data for the next months and retention of old ones
+    """
+
+    from src.weather_process import queries_maintain_partitions
+    for query in queries_maintain_partitions(
+        months_ahead = configs['PG__PARTITIONS_AHEAD'],
+        retention_months = configs['PG__RETENTION_MONTHS'],
+        drop = configs['PG__RETENTION_DROP'],
+    ):
+        rows, go_on = db.select_rows(query = query)
+        if go_on:
+            log(logger, 'maintenance of partitions', 'info', 'Partitions are maintained', {'query': query, 'partitions': rows[0][0]})
+        else:
+            log(logger, 'maintenance of partitions', 'error', f"{query}: failed")
+
+
+def prefetch_forecast(logger: object = None) -> None:
+    """
+    refreshing forecast of the most popular locations which becomes stale before the next run,
+    not more than PREFETCH__BUDGET calls of Weather API
+    """
+
+    popularity.decay(0.5 ** (configs['PREFETCH__INTERVAL'] / configs['PREFETCH__HALF_LIFE']))
+    ranking = popularity.top(configs['PREFETCH__TOP'])
+    if not ranking:
+        log(logger, 'prefetch of forecast', 'info', "no popular locations")
+        return
+    rows, go_on = db.select_rows(query = QUERY_FORECAST_AGE_TEMPLATE.format(
+        geo_ids = ', '.join(str(int(x)) for x, _ in ranking),
+    ))
+    if not go_on:
+        log(logger, 'prefetch of forecast', 'error', "ages of forecasts weren't read")
+        return
+    plan = plan_prefetch(
+        ranking,
+        {x[0]: (x[1], x[2], x[3]) for x in rows},
+        stale_after = max(0, configs['CACHE__FORECAST_MAX_AGE'] - configs['PREFETCH__INTERVAL']),
+        days = configs['PREFETCH__DAYS'],
+        budget = configs['PREFETCH__BUDGET'],
+    )
+    log(logger, 'prefetch of forecast', 'info', \
+        f"{len(plan)} of {len(ranking)} popular locations: {[x[1] for x in plan]}")
+    for _, geo_name in plan:
+        download_forecast(logger, {**querystring_template['forecast'], 'q': geo_name, 'days': configs['PREFETCH__DAYS']})
+
+
+def run_exclusively(task_type: str = '', procedure: object = None, *args) -> None:
+    """
+    running procedure with the status 'busy' of task_type in REDIS (checked by route /tasks)
+    """
+    
+    logger = logger_init(location = 'init_backendapi_post', log_path = main_dirs['LOG'], **logging_pars)
     db.logger = logger
     key = "{}_{}_{}".format(
         socket.gethostname(),
         date.today().strftime('%Y%m%d'),
-        'upload_forecast',
+        task_type,
     )
     ## DB Redis instance ###################################################################
     db_redis = DBredis(
         topic = configs['REDIS_DB_STATUS'],
         host = configs['REDIS_HOST'],
         port = configs['REDIS_PORT'],
+        password = configs['REDIS__PASSWORD'],
     )
     ########################################################################################
-    go_on = db_redis.publish_message(key, 'busy')
-    if go_on:
-        if querystring == {}: querystring = querystring_template['forecast']
-        log(logger, 'API init', 'info', f"Starting with next params:{querystring}")
-        #### GET API data ------------------------------------------------------------------
-        try:
-            response = requests.get(configs['WEATHER_API__FORECAST'],\
-                                        headers=headers, \
-                                        params=querystring)
-            if response.status_code == 200: 
-                go_on = True
-            else:
-                log(logger, 'API request', 'error', f"date - {querystring['dt']}: {response.text}")
-        except Exception as err:
-            traceback_info = traceback.format_exc()
-            log(logger, 'API request', 'error', f"{configs['WEATHER_API__FORECAST']}:{traceback_info}")
+    if db_redis.publish_message(key, 'busy'):
+        procedure(logger, *args)
     else:
         log(logger, 'API init', 'error', "Could not publish the status")
-    
-    if go_on:
-        ################################################################################
-        processing_data_and_uploading(logger, db, configs, response)
-        ################################################################################
         
     _ = db_redis.publish_message(key, 'free')
 
+
+@celery.task(name = 'celery.upload_history', queue=CELERY_QUEUE_HIST)
+def upload_history_post(querystring, dates):
+    """
+    procedure of async running task for downloading data from EXT API endpoint 'history'
+    :dates - the list of isoformat the period of dates like '%Y-%m-%d'
+    """
+    
+    if querystring == {}: querystring = querystring_template['history']
+    run_exclusively('upload_history', download_history, querystring, dates)
+
+
+@celery.task(name = 'celery.upload_history_batch', queue=CELERY_QUEUE_HIST)
+def upload_history_batch_post(querystring, locations):
+    """
+    procedure of async running task for downloading data from EXT API endpoint 'history' 
+    for several locations at once
+    :locations - the list of dicts like {'location': 'London', 'dates': ['1970-01-01']}
+    """
+    
+    if querystring == {}: querystring = querystring_template['history']
+    
+    def download(logger, querystring, locations):
+        for item in locations:
+            download_history(logger, {**querystring, 'q': item['location']}, item['dates'])
+    
+    run_exclusively('upload_history_batch', download, querystring, locations)
+
+
+@celery.task(name = 'celery.upload_forecast', queue=CELERY_QUEUE_FORE)
+def upload_forecast_post(querystring):
+    """
+    procedure of async running task for downloading data from EXT API endpoint 'forecast'
+    :days - the number of days for the forecast - max value is 6
+    """
+    
+    if querystring == {}: querystring = querystring_template['forecast']
+    run_exclusively('upload_forecast', download_forecast, querystring)
+
+
+@celery.task(name = 'celery.upload_forecast_batch', queue=CELERY_QUEUE_FORE)
+def upload_forecast_batch_post(querystring, locations):
+    """
+    procedure of async running task for downloading data from EXT API endpoint 'forecast'
+    for several locations at once
+    :locations - the list of dicts like {'location': 'London', 'days': 3}
+    """
+    
+    if querystring == {}: querystring = querystring_template['forecast']
+    
+    def download(logger, querystring, locations):
+        for item in locations:
+            download_forecast(logger, {**querystring, 'q': item['location'], 'days': min(4, item['days'])})
+    
+    run_exclusively('upload_forecast_batch', download, querystring, locations)
+
+@celery.task(name = 'celery.maintain_partitions', queue=CELERY_QUEUE_HIST)
+def maintain_partitions_post():
+    """
+    periodic task (celery beat) of maintenance of partitions
+    """
+    
+    run_exclusively('maintain_partitions', maintain_partitions)
+
+
+@celery.task(name = 'celery.prefetch_forecast', queue=CELERY_QUEUE_FORE)
+def prefetch_forecast_post():
+    """
+    periodic task (celery beat) of prefetching of forecast of popular locations
+    """
+    
+    run_exclusively('prefetch_forecast', prefetch_forecast)
+
+
+@signals.worker_init.connect
+def preload_processing(**kwargs):
+    """
+    Importing of processing (pandas, psycopg2) once in the main process of celery worker,
+    its children (prefork pool) get it ready instead of importing at the first task
+    """
+
+    import psycopg2  # noqa: F401 - preloaded for the forked children, used by weather_process
+    import src.weather_process  # noqa: F401 - preloaded for the forked children, imported by tasks
+
+### metrics of tasks in processes of celery workers ########################################
+
+tasks_started = {}
+
+@signals.task_prerun.connect
+def task_started(task_id = None, task = None, **kwargs):
+    
+    tasks_started[task_id] = time()
+
+
+@signals.task_postrun.connect
+def task_finished(task_id = None, task = None, state = None, **kwargs):
+    """
+    Duration and outcome (success, failure, retry) of finished task
+    """
+    
+    started = tasks_started.pop(task_id, None)
+    if started is not None:
+        BACKEND_TASK_SECONDS.labels(task.name).observe(time() - started)
+    BACKEND_TASKS.labels(task.name, str(state).lower()).inc()
+
 ####### app routes #########################################################################
 
+@app.before_request
+def start_request():
+    
+    g.endpoint = endpoint_label(request.url_rule.rule if request.url_rule else '', {'/tasks', '/tasks/<task_id>', '/metrics'})
+    g.started = time()
+    BACKEND_REQUESTS_IN_FLIGHT.labels(g.endpoint).inc()
+
+
+@app.after_request
+def finish_request(response):
+    """
+    Latency of requests by endpoints for metrics
+    """
+    
+    BACKEND_REQUEST_SECONDS.labels(g.endpoint, request.method, str(response.status_code)).observe(time() - g.started)
+    
+    return response
+
+
+@app.teardown_request
+def teardown_request(error = None):
+    
+    if 'endpoint' in g:
+        BACKEND_REQUESTS_IN_FLIGHT.labels(g.endpoint).dec()
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    Metrics in format of Prometheus of gunicorn workers and celery workers 
+    (they share PROMETHEUS_MULTIPROC_DIR in the container)
+    """
+    
+    content, media_type = render()
+    
+    return Response(content, content_type = media_type)
+
+
 @app.route("/tasks", methods=["POST"])
 def run_task():
     """
@@ -163,12 +393,15 @@ def run_task():
                             'token': '',
                             'task_type':''
                            }
+    for task_type 'upload_history_batch' OR 'upload_forecast_batch' instead of location:
+                           'locations': [{'location': '', 'dates': [...] OR 'days': 3}, ...]
     """
 
     db_redis = DBredis(
         topic = configs['REDIS_DB_STATUS'],
         host = configs['REDIS_HOST'],
         port = configs['REDIS_PORT'],
+        password = configs['REDIS__PASSWORD'],
     )
     #---------------------------- parsing post data ---------------------------------------
     request_data = request.get_json()
@@ -233,6 +466,18 @@ def run_task():
         
         return make_response(jsonify( { 'task_id': taskss.id } ), 202)
     ######################################################################################
+    elif request_data['task_type'] in ['upload_history_batch', 'upload_forecast_batch']:
+        #---------------------- processing list of locations -----------------------------
+        if not request_data.get('locations'):
+            return make_response(jsonify({'error':'Bad request: Specify locations'}), 400)
+        #---------------------- start delay task -----------------------------------------
+        if request_data['task_type'] == 'upload_history_batch':
+            taskss = upload_history_batch_post.delay(request_data['querystring'], request_data['locations'],)
+        else:
+            taskss = upload_forecast_batch_post.delay(request_data['querystring'], request_data['locations'],)
+        
+        return make_response(jsonify( { 'task_id': taskss.id } ), 202)
+    ######################################################################################
     else:
         return make_response(jsonify( { 'error': 'not allowed method' } ), 405)
     
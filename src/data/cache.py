@@ -0,0 +1,317 @@
+import sys
+import json
+from time import monotonic
+from collections import OrderedDict
+from datetime import date, datetime
+from src.utils.lazy import lazy_import
+from src.utils.logs import log
+
+### REDIS is needed only if the shared cache is enabled
+redis = lazy_import('redis')
+
+
+#-------------------------------------------------------------------------------------------------
+############################## In-process cache of responses -------------------------------------
+#-------------------------------------------------------------------------------------------------
+
+def sizeof_rows(rows: list = []) -> int:
+    """
+    Approximate size in bytes of the list of dicts (payload of response)
+    """
+
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row)
+        for k, v in row.items():
+            size += sys.getsizeof(k) + sys.getsizeof(v)
+
+    return size
+
+
+class LRUCache:
+    """
+    Bounded by size in bytes LRU cache with optional TTL for entries
+    :max_bytes - the limit of approximate size of all values, 0 - disabled cache
+    :ttl - time to live of the entry in seconds, 0 - without expiration
+    """
+
+    def __init__(self, max_bytes: int = 0, ttl: float = 0, sizeof: object = sizeof_rows):
+
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.data = OrderedDict()
+
+
+    @property
+    def enabled(self) -> bool:
+
+        return self.max_bytes > 0
+
+
+    @staticmethod
+    def key_geo(geo_name: str = '', geo_country: str = None) -> tuple:
+        """
+        Normalized key of location
+        """
+
+        return geo_name.strip().lower(), (geo_country or '').strip().lower()
+
+
+    def get(self, key: object = None) -> object:
+
+        entry = self.data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, size, expire = entry
+        if expire and expire < monotonic():
+            self.pop(key)
+            self.misses += 1
+            return None
+        self.data.move_to_end(key)
+        self.hits += 1
+
+        return value
+
+
+    def set(self, key: object = None, value: object = None) -> bool:
+
+        if not self.enabled:
+            return False
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return False
+        self.pop(key)
+        self.data[key] = (value, size, monotonic() + self.ttl if self.ttl > 0 else 0)
+        self.size += size
+        ### evicting the least recently used entries -----------------------------
+        while self.size > self.max_bytes:
+            _, (_, size_, _) = self.data.popitem(last = False)
+            self.size -= size_
+
+        return True
+
+
+    def pop(self, key: object = None) -> object:
+
+        entry = self.data.pop(key, None)
+        if entry is None:
+            return None
+        self.size -= entry[1]
+
+        return entry[0]
+
+
+    def clear(self) -> None:
+
+        self.data.clear()
+        self.size = 0
+
+
+    def snapshot(self) -> list:
+        """
+        Entries [(key, value), ...] from the least to the most recently used, without expired ones
+        """
+
+        now = monotonic()
+
+        return [(key, value) for key, (value, _, expire) in self.data.items() if not expire or expire >= now]
+
+
+    def restore(self, items: list = []) -> int:
+        """
+        Adding entries of snapshot in their order (the most recently used are the last), TTL starts again
+        """
+
+        for key, value in items:
+            self.set(key, value)
+
+        return len(self.data)
+
+
+    def __len__(self) -> int:
+
+        return len(self.data)
+
+
+    def __contains__(self, key: object) -> bool:
+
+        return key in self.data
+
+
+#-------------------------------------------------------------------------------------------------
+############################## Shared between workers cache in REDIS ----------------------------
+#-------------------------------------------------------------------------------------------------
+
+def _json_default(obj: object) -> object:
+    """
+    Serializing of datetime and numpy values from DB rows
+    """
+
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    elif hasattr(obj, 'tolist'):
+        return obj.tolist()
+
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class RedisJSONCache:
+    """
+    Read-through cache of JSON payloads in REDIS shared by all workers of API.
+    Every payload is registered in the index set of its location, so the backend
+    can drop all cached payloads of location after writing new data for it.
+    :prefix - namespace of keys, like 'weather:forecast'
+    :timeout - socket timeout in seconds, the cache is optional, so errors are just logged
+    :index_ttl - time to live of index set, it must outlive the payloads registered in it
+    """
+
+    def __init__(self, 
+                host: str = 'localhost', 
+                port: int = 6379, 
+                db: int = 0, 
+                password: str = None, 
+                prefix: str = 'weather', 
+                enabled: bool = True, 
+                timeout: float = 0.5,
+                index_ttl: int = 86400,
+                logger: object = None):
+
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.prefix = prefix
+        self.enabled = enabled
+        self.timeout = timeout
+        self.index_ttl = index_ttl
+        self.logger = logger
+        self.conn = None
+
+
+    def log(self, tag: str = 'redis-cache', message: str = '', data: dict = {}) -> None:
+
+        log(self.logger, tag, 'error', message, data)
+
+
+    def connect(self) -> object:
+        """
+        Client with own pool of connections, it is kept open for the lifetime of process
+        """
+
+        if self.conn is None:
+            self.conn = redis.Redis(
+                host = self.host,
+                port = self.port,
+                db = self.db,
+                password = self.password or None,
+                socket_timeout = self.timeout,
+                socket_connect_timeout = self.timeout,
+            )
+
+        return self.conn
+
+
+    def key(self, *parts) -> str:
+
+        return ':'.join([self.prefix] + [str(x).strip().lower() for x in parts])
+
+
+    def key_index(self, geo_location: str = '') -> str:
+        """
+        Key of set with all cached payloads of location, geo_location - "City, Country"
+        """
+
+        return self.key('index', geo_location)
+
+
+    def get(self, key: str = '') -> object:
+
+        if not self.enabled:
+            return None
+        try:
+            value = self.connect().get(key)
+        except Exception as error:
+            self.log('reading from cache', f"{key}: {error}")
+            return None
+
+        return json.loads(value) if value is not None else None
+
+
+    def get_many(self, keys: list = []) -> list:
+        """
+        Reading several payloads by one request, None for absent ones
+        """
+
+        if not self.enabled or not keys:
+            return [None] * len(keys)
+        try:
+            values = self.connect().mget(keys)
+        except Exception as error:
+            self.log('reading from cache', f"{len(keys)} keys: {error}")
+            return [None] * len(keys)
+
+        return [json.loads(x) if x is not None else None for x in values]
+
+
+    def set(self, key: str = '', value: object = None, ttl: int = 60, geo_location: str = '') -> bool:
+
+        if not self.enabled or ttl <= 0:
+            return False
+        try:
+            pipe = self.connect().pipeline()
+            pipe.set(key, json.dumps(value, default = _json_default), ex = int(ttl))
+            if geo_location:
+                pipe.sadd(self.key_index(geo_location), key)
+                pipe.expire(self.key_index(geo_location), max(int(ttl), self.index_ttl))
+            pipe.execute()
+        except Exception as error:
+            self.log('writing to cache', f"{key}: {error}")
+            return False
+
+        return True
+
+
+    def invalidate(self, geo_location: str = '') -> int:
+        """
+        Dropping all cached payloads of location
+        """
+
+        if not self.enabled:
+            return 0
+        try:
+            conn = self.connect()
+            keys = conn.smembers(self.key_index(geo_location))
+            return conn.delete(self.key_index(geo_location), *keys)
+        except Exception as error:
+            self.log('invalidation of cache', f"{geo_location}: {error}")
+            return 0
+
+
+    def claim(self, key: str = '', ttl: int = 60) -> bool:
+        """
+        Lock of work shared by workers (like refresh of location), only one worker gets True 
+        until release or expiration of lock. Without REDIS every worker gets it
+        """
+
+        if not self.enabled:
+            return True
+        try:
+            return bool(self.connect().set(key, 1, nx = True, ex = max(int(ttl), 1)))
+        except Exception as error:
+            self.log('lock in cache', f"{key}: {error}")
+            return True
+
+
+    def release(self, key: str = '') -> None:
+
+        if not self.enabled:
+            return
+        try:
+            self.connect().delete(key)
+        except Exception as error:
+            self.log('lock in cache', f"{key}: {error}")
@@ -0,0 +1,273 @@
+import json
+import asyncio
+from bisect import bisect_left, insort
+from src.utils.helpers import normalize_geo
+from src.utils.logs import log
+from src.queries import QUERY_DIMENSIONS_GEO, QUERY_DIMENSIONS_ALIAS, QUERY_DIMENSIONS_CONDITION
+
+
+#-------------------------------------------------------------------------------------------------
+############################## In-memory dictionaries of DB (locations and conditions) -----------
+#-------------------------------------------------------------------------------------------------
+
+class DimensionIndex:
+    """
+    Copy of small and rarely changed tables regional.geoid, regional.geoalias and regional.conditionid 
+    in memory of worker.
+    The tables are loaded at startup, then the index is kept fresh by notifications of triggers
+    on these tables (LISTEN on the dedicated connection), so requests resolve geo_id
+    and text of condition without queries to DB.
+    :channel - the channel of notifications (it's set in the triggers of DB)
+    :reconnect_interval - seconds between attempts of restoring the listening connection
+    """
+
+    def __init__(self, channel: str = 'weather_dimensions', reconnect_interval: float = 5, logger: object = None):
+
+        self.channel = channel
+        self.reconnect_interval = reconnect_interval
+        self.logger = logger
+        ### id -> (geo_name, geo_country)
+        self.geo = {}
+        ### sorted entries (normalized name, normalized country, geo_name, geo_country, id) for searching by name
+        self.names = []
+        ### id -> entry of names
+        self.entries = {}
+        ### normalized alternate spelling -> id
+        self.aliases = {}
+        ### id -> condition_str
+        self.conditions = {}
+        self.connect = None
+        self.conn = None
+        self.reconnecting = None
+        self.closing = False
+        self.notifications = 0
+
+
+    def log(self, tag: str = 'dimensions', log_level: str = 'info', message: str = '', data: dict = {}) -> None:
+
+        log(self.logger, tag, log_level, message, data)
+
+
+    @property
+    def ready(self) -> bool:
+        """
+        The index is fresh only while the listening connection is alive
+        """
+
+        return self.conn is not None
+
+
+    @property
+    def stats(self) -> dict:
+
+        return {
+            'locations': len(self.geo),
+            'aliases': len(self.aliases),
+            'conditions': len(self.conditions),
+            'ready': self.ready,
+            'notifications': self.notifications,
+        }
+
+    ### content of index ---------------------------------------------------------------------------
+
+    @staticmethod
+    def _entry(id_: int = 0, geo_name: str = None, geo_country: str = None, 
+               geo_name_norm: str = None, geo_country_norm: str = None) -> tuple:
+        """
+        Normalized names are taken from DB (filled by trigger), if they are absent - normalized here
+        """
+
+        return (
+            geo_name_norm if geo_name_norm is not None else normalize_geo(geo_name),
+            geo_country_norm if geo_country_norm is not None else normalize_geo(geo_country),
+            geo_name or '', 
+            geo_country or '', 
+            id_,
+        )
+
+
+    def set_geo(self, rows: list = []) -> None:
+
+        self.geo = {x['id']: (x['geo_name'], x['geo_country']) for x in rows}
+        self.entries = {
+            x['id']: self._entry(x['id'], x['geo_name'], x['geo_country'], x.get('geo_name_norm'), x.get('geo_country_norm')) \
+                for x in rows
+        }
+        self.names = sorted(self.entries.values())
+
+
+    def set_aliases(self, rows: list = []) -> None:
+
+        self.aliases = {x['alias_norm']: x['geo_id'] for x in rows}
+
+
+    def set_conditions(self, rows: list = []) -> None:
+
+        self.conditions = {x['id']: x['condition_str'] for x in rows}
+
+
+    def upsert_geo(self, id_: int = 0, geo_name: str = None, geo_country: str = None,
+                   geo_name_norm: str = None, geo_country_norm: str = None) -> None:
+
+        self.delete_geo(id_)
+        self.geo[id_] = (geo_name, geo_country)
+        self.entries[id_] = self._entry(id_, geo_name, geo_country, geo_name_norm, geo_country_norm)
+        insort(self.names, self.entries[id_])
+
+
+    def delete_geo(self, id_: int = 0) -> None:
+
+        self.geo.pop(id_, None)
+        entry = self.entries.pop(id_, None)
+        if entry is None:
+            return
+        pos = bisect_left(self.names, entry)
+        if pos < len(self.names) and self.names[pos] == entry:
+            self.names.pop(pos)
+
+
+    def geo_location(self, id_: int = 0) -> str:
+        """
+        The name of location in format - "City, Country" (like in the queries of DB)
+        """
+
+        geo_name, geo_country = self.geo.get(id_, (None, None))
+        if geo_name is None or geo_country is None:
+            return None
+
+        return f"{geo_name}, {geo_country}"
+
+
+    def resolve_geo(self, geo_name: str = '', geo_country: str = None, prefix: bool = False) -> int:
+        """
+        The id of location like in the queries of DB: normalized name and country (if it's set) are compared 
+        exactly or by the beginning (prefix). The same name goes first, then the alternate spelling, 
+        then the beginning of name, the first one by name and country is taken.
+        Returns None if there is no such location in the index (similar names are searched only in DB)
+        """
+
+        name = normalize_geo(geo_name)
+        country = normalize_geo(geo_country) if geo_country else None
+        if not name:
+            return None
+        match_country = lambda entry: country is None or (entry[1].startswith(country) if prefix else entry[1] == country)
+        candidates = []
+        for pos in range(bisect_left(self.names, (name,)), len(self.names)):
+            entry = self.names[pos]
+            if not (entry[0].startswith(name) if prefix else entry[0] == name):
+                break
+            if match_country(entry):
+                candidates.append((0 if entry[0] == name else 2, *entry[2:]))
+        alias = self.entries.get(self.aliases.get(name))
+        if alias is not None and match_country(alias):
+            candidates.append((1, *alias[2:]))
+
+        return min(candidates)[-1] if candidates else None
+
+    ### loading and listening of changes -----------------------------------------------------------
+
+    async def load(self, conn: object = None) -> None:
+
+        self.set_geo(await conn.fetch(QUERY_DIMENSIONS_GEO))
+        self.set_aliases(await conn.fetch(QUERY_DIMENSIONS_ALIAS))
+        self.set_conditions(await conn.fetch(QUERY_DIMENSIONS_CONDITION))
+        self.log('loading of dimensions', 'info', 'Index is loaded', 
+            {'locations': len(self.geo), 'aliases': len(self.aliases), 'conditions': len(self.conditions)})
+
+
+    async def start(self, connect: object = None) -> None:
+        """
+        :connect - coroutine function which opens new connection to DB for listening
+        """
+
+        self.connect = connect
+        self.closing = False
+        try:
+            await self._listen()
+        except Exception as error:
+            self.log('listening of dimensions', 'error', f"Index is not loaded: {error}")
+            self._schedule_reconnect()
+
+
+    async def _listen(self) -> None:
+
+        conn = await self.connect()
+        try:
+            ### subscribing before loading, so changes between them are not lost
+            await conn.add_listener(self.channel, self.on_notify)
+            await self.load(conn)
+        except Exception:
+            await conn.close()
+            raise
+        conn.add_termination_listener(self._on_terminate)
+        self.conn = conn
+
+
+    def on_notify(self, conn: object = None, pid: int = 0, channel: str = '', payload: str = '') -> None:
+        """
+        Payload of trigger: {"table": "geoid", "geoalias" or "conditionid", "op": TG_OP, "row": {...}}
+        """
+
+        self.notifications += 1
+        try:
+            message = json.loads(payload)
+            table, op, row = message['table'], message['op'], message.get('row') or {}
+            if op == 'TRUNCATE':
+                asyncio.ensure_future(self._reload())
+            elif table == 'geoid' and op == 'DELETE':
+                self.delete_geo(row['id'])
+            elif table == 'geoid':
+                self.upsert_geo(row['id'], row['geo_name'], row['geo_country'], row.get('geo_name_norm'), row.get('geo_country_norm'))
+            elif table == 'geoalias' and op == 'DELETE':
+                if self.aliases.get(row['alias_norm']) == row['geo_id']:
+                    self.aliases.pop(row['alias_norm'])
+            elif table == 'geoalias':
+                self.aliases[row['alias_norm']] = row['geo_id']
+            elif table == 'conditionid' and op == 'DELETE':
+                self.conditions.pop(row['id'], None)
+            elif table == 'conditionid':
+                self.conditions[row['id']] = row['condition_str']
+        except Exception as error:
+            self.log('notification of dimensions', 'error', f"{payload}: {error}")
+
+
+    async def _reload(self) -> None:
+
+        try:
+            await self.load(self.conn)
+        except Exception as error:
+            self.log('loading of dimensions', 'error', str(error))
+
+
+    def _on_terminate(self, conn: object = None) -> None:
+
+        self.conn = None
+        if not self.closing:
+            self.log('listening of dimensions', 'error', 'Connection is lost, the index can be stale')
+            self._schedule_reconnect()
+
+
+    def _schedule_reconnect(self) -> None:
+
+        if self.reconnecting is None or self.reconnecting.done():
+            self.reconnecting = asyncio.ensure_future(self._reconnect())
+
+
+    async def _reconnect(self) -> None:
+
+        while self.conn is None and not self.closing:
+            await asyncio.sleep(self.reconnect_interval)
+            try:
+                await self._listen()
+            except Exception as error:
+                self.log('listening of dimensions', 'error', f"Reconnecting: {error}")
+
+
+    async def close(self) -> None:
+
+        self.closing = True
+        if self.reconnecting is not None:
+            self.reconnecting.cancel()
+        if self.conn is not None:
+            conn, self.conn = self.conn, None
+            await conn.close()
@@ -1,10 +1,34 @@
+import pytz
+import httpx
+import asyncio
 import asyncpg
-from src.utils import *
+from time import time
+from datetime import datetime, date, timedelta
+from dateutil.parser import parse
+from src.utils.logs import log
+from src.utils.helpers import normalize_geo
 from src.logger import logger
 from src.settings import configs, url_int_post
+from src.data.cache import LRUCache, RedisJSONCache
+from src.data.single_flight import SingleFlight
+from src.data.popularity import PopularityTracker
+from src.data.warmup import WarmUp
+from src.data.dimensions import DimensionIndex
+from src.metrics import API_STAGE_SECONDS, API_BACKEND_TASKS
 from src.queries import (
+                        COLUMNS_WEATHER,
+                        COLUMNS_DAILY,
+                        CHANNEL_DIMENSIONS,
+                        QUERY_DIMENSIONS_CONDITION,
+                        QUERY_GEO_LOOKUP,
+                        QUERY_GEO_LOOKUP_PREFIX,
                         QUERY_HISTORY_DATES, 
+                        QUERY_HISTORY_DAILY,
+                        QUERY_FINALIZED_DAYS,
+                        QUERY_FINALIZED_DAYS_DAILY,
                         QUERY_FORECAST_DATES,
+                        QUERY_HISTORY_BATCH,
+                        QUERY_FORECAST_BATCH,
                         )
 
 
@@ -12,85 +36,461 @@ from src.queries import (
 ############################## Request to backend DB for retrieving cached data ------------------
 #-------------------------------------------------------------------------------------------------
 
+### finalized days of history (all 24 hours) don't change, so they are kept in memory of worker
+### key - (geo_id, date) by key_location, value - list of rows of the day
+history_cache = LRUCache(
+    max_bytes = configs['CACHE__HISTORY_MAX_BYTES'], 
+    ttl = configs['CACHE__HISTORY_TTL'],
+)
+### forecast payloads shared by all workers, key - (geo_id, days) by key_location
+forecast_cache = RedisJSONCache(
+    host = configs['CACHE__REDIS_HOST'],
+    port = configs['CACHE__REDIS_PORT'],
+    db = configs['REDIS_DB_CACHE'],
+    password = configs['REDIS__PASSWORD'],
+    prefix = 'weather:forecast',
+    enabled = configs['CACHE__FORECAST_ENABLED'],
+    logger = logger,
+)
+### requests of forecast by locations (geo_id), prefetching of backend refreshes the most popular ones
+popularity = PopularityTracker(
+    host = configs['CACHE__REDIS_HOST'],
+    port = configs['CACHE__REDIS_PORT'],
+    db = configs['REDIS_DB_CACHE'],
+    password = configs['REDIS__PASSWORD'],
+    key = 'weather:popularity:forecast',
+    enabled = configs['PREFETCH__ENABLED'],
+    flush_interval = configs['PREFETCH__FLUSH_INTERVAL'],
+    logger = logger,
+)
+### filling of caches at start of worker, the worker is ready when it's over
+warmup = WarmUp(
+    enabled = configs['CACHE__WARMUP_ENABLED'],
+    timeout = configs['CACHE__WARMUP_TIMEOUT'],
+    logger = logger,
+)
+### coalescing of concurrent cache misses for the same location and dates (or days of forecast)
+single_flight = SingleFlight()
+### locations and conditions of DB in memory of worker, kept fresh by LISTEN/NOTIFY
+dimensions = DimensionIndex(
+    channel = CHANNEL_DIMENSIONS,
+    reconnect_interval = configs['PG__LISTEN_RECONNECT_INTERVAL'],
+    logger = logger,
+)
+
 class WeatherDataFromDB:
+    """
+    Reading cached data from DB through the process-wide asyncpg pool
+    (created at startup of the app and shared by all requests of the worker)
+    """
     
-    
+    pool = None
+
+    @classmethod
+    async def create_pool(cls) -> None:
+        """
+        Creating pool of connections, timezone and statement timeout are passed 
+        as server settings, so they survive the reset of connection on release
+        """
+        
+        if cls.pool is not None:
+            return
+        pool = await asyncpg.create_pool(
+              host=configs['PG__HOST'],
+              port=configs['PG__PORT'],
+              user=configs['PG__USER_BOT'],
+              password=configs['PG__PASSW_BOT'],
+              database=configs['PG__DBNAME'],
+              min_size=configs['PG__POOL_MIN_SIZE'],
+              max_size=configs['PG__POOL_MAX_SIZE'],
+              max_queries=configs['PG__POOL_MAX_QUERIES'],
+              max_inactive_connection_lifetime=configs['PG__POOL_MAX_INACTIVE_LIFETIME'],
+              statement_cache_size=configs['PG__STATEMENT_CACHE_SIZE'],
+              server_settings={
+                  'timezone': configs['TZ'],
+                  'statement_timeout': str(configs['PG__STATEMENT_TIMEOUT']),
+                  'pg_trgm.similarity_threshold': str(configs['PG__GEO_SIMILARITY']),
+                  'application_name': 'weather_restapi',
+              },
+            )
+        ### another coroutine could create the pool while this one was connecting
+        if cls.pool is not None:
+            await pool.close()
+            return
+        cls.pool = pool
+        log(logger, "pool of DB connections", 'info', \
+            f"Created with size {configs['PG__POOL_MIN_SIZE']}-{configs['PG__POOL_MAX_SIZE']}")
+
+
+    @classmethod
+    async def close_pool(cls) -> None:
+        
+        if cls.pool is not None:
+            await cls.pool.close()
+            cls.pool = None
+            log(logger, "pool of DB connections", 'info', "Closed")
+
+
+    @classmethod
+    async def start_dimensions(cls) -> None:
+        """
+        Loading locations and conditions to memory, their changes are received 
+        by LISTEN on the dedicated connection (out of pool, it's kept open for the lifetime of worker)
+        """
+        
+        await dimensions.start(cls._connect_listener)
+
+
     @staticmethod
-    async def _fetch_as_df(query: str, *args) -> pd.DataFrame:
+    async def _connect_listener() -> object:
         
-        log(logger, "data from DB", 'info', "Got query : "+query.replace('\n', ' ').strip())
-        exc = None
-        conn = await asyncpg.connect(
+        return await asyncpg.connect(
               host=configs['PG__HOST'],
               port=configs['PG__PORT'],
               user=configs['PG__USER_BOT'],
               password=configs['PG__PASSW_BOT'],
               database=configs['PG__DBNAME'],
+              server_settings={
+                  'timezone': configs['TZ'],
+                  'application_name': 'weather_restapi_listener',
+              },
             )
 
-        try:
-            stmt = await conn.prepare(query)
-            columns = [a.name for a in stmt.get_attributes()]
-            data = await stmt.fetch(*args)
-            return pd.DataFrame(data, columns=columns)
-        except Exception as e:
-            exc = e
-        finally:
-            await conn.close()
-            if exc:
-                raise exc
-
-    async def get_history_by_dates_and_locations(self, **pars_) -> object:
-        geo_info = await self._fetch_as_df(
-            query=QUERY_HISTORY_DATES.format(**pars_)
+
+    @classmethod
+    async def close_dimensions(cls) -> None:
+        
+        await dimensions.close()
+
+    
+    @classmethod
+    async def _fetch(cls, query: str, *args) -> list:
+        """
+        Executing parameterized query, the statement is prepared once per connection 
+        and taken from the statement cache of connection for repeated queries.
+        Returns records as they are (without conversion to DF)
+        """
+        
+        log(logger, "data from DB", 'debug', "Got query", {'query': query, 'args': args})
+        if cls.pool is None:
+            await cls.create_pool()
+        
+        started = time()
+        async with cls.pool.acquire(timeout=configs['PG__POOL_ACQUIRE_TIMEOUT']) as conn:
+            API_STAGE_SECONDS.labels('db_acquire').observe(time() - started)
+            with API_STAGE_SECONDS.labels('db_query').time():
+                data = await conn.fetch(query, *args)
+            
+        return data
+
+
+    @staticmethod
+    def _geo_args(**pars_) -> tuple:
+        """
+        Binding parameters of location: $1 - normalized name of geo, $2 - normalized country or None
+        """
+        
+        country = pars_.get('geo_country')
+        return normalize_geo(pars_['geo_name']), normalize_geo(country) if country else None
+
+
+    @staticmethod
+    def _dates_args(date_range: list = []) -> tuple:
+        """
+        Binding parameters of dates: list of dates, then the range of dates (start, end).
+        Sorted consecutive dates are bound as the range, so the size of parameters doesn't grow
+        """
+        
+        dates = [parse(x).date() for x in (date_range[0], date_range[-1])] if date_range else []
+        if dates and (dates[1] - dates[0]).days + 1 == len(date_range):
+            return [], dates[0], dates[1]
+        
+        return [parse(x).date() for x in date_range], None, None
+
+
+    async def _resolve_geo(self, prefix: bool = False, **pars_) -> int:
+        """
+        The id of location from the index in memory, if it's absent there (like just added by backend 
+        and the notification isn't received yet) - from DB, the found location is added to the index.
+        :prefix - searching by the beginning of name, in DB similar names are searched too
+        """
+        
+        geo_id = dimensions.resolve_geo(pars_['geo_name'], pars_.get('geo_country'), prefix)
+        if geo_id is not None:
+            return geo_id
+        geo_info = await self._fetch(
+            QUERY_GEO_LOOKUP_PREFIX if prefix else QUERY_GEO_LOOKUP,
+            *self._geo_args(**pars_),
+        )
+        if not geo_info:
+            return None
+        dimensions.upsert_geo(
+            geo_info[0]['id'], geo_info[0]['geo_name'], geo_info[0]['geo_country'], 
+            geo_info[0]['geo_name_norm'], geo_info[0]['geo_country_norm'],
         )
         
-        return geo_info
+        return geo_info[0]['id']
+
+
+    async def _to_rows(self, records: list = [], geo_locations: dict = {}, column: str = 'datetime') -> list:
+        """
+        Rows of response from records: text of condition and location are taken from the index in memory
+        :geo_locations - {number of item (None for single location): "City, Country"}
+        :column - the column which is NULL in rows of missing days
+        """
+        
+        if any(x['condition_weather'] not in dimensions.conditions for x in records if x[column] is not None):
+            ### the condition is just added by backend and the notification isn't received yet
+            dimensions.set_conditions(await self._fetch(QUERY_DIMENSIONS_CONDITION))
+        conditions = dimensions.conditions
+        rows = []
+        with API_STAGE_SECONDS.labels('rows').time():
+            for record in records:
+                row = dict(record)
+                if row[column] is not None:
+                    row['condition_weather'] = conditions.get(row['condition_weather'])
+                    row['geo_location'] = geo_locations.get(row.get('item'))
+                rows.append(row)
+        
+        return rows
+
+
+    @staticmethod
+    def _missing_rows(date_range: list = [], columns: list = COLUMNS_WEATHER) -> list:
+        """
+        Rows of missing days like in the query of history (for location which is absent in DB)
+        """
+        
+        return [{**dict.fromkeys(columns), 'check_date': parse(x).date()} for x in date_range]
+
+
+    async def get_history_by_dates_and_locations(self, prefix: bool = False, **pars_) -> list:
+        """
+        Rows of complete days and one row with NULL values (except check_date) for every missing day
+        :prefix - searching location by the beginning of name (after parsing from API)
+        """
+        
+        geo_id = await self._resolve_geo(prefix, **pars_)
+        if geo_id is None:
+            return self._missing_rows(pars_['date_range'])
+        geo_info = await self._fetch(QUERY_HISTORY_DATES, geo_id, *self._dates_args(pars_['date_range']))
+        
+        return await self._to_rows(geo_info, {None: dimensions.geo_location(geo_id)})
     
     
-    async def get_forecast_by_locations(self, **pars_) -> object:
-        geo_info = await self._fetch_as_df(
-            query=QUERY_FORECAST_DATES.format(**pars_)
+    async def get_history_daily_by_dates_and_locations(self, prefix: bool = False, **pars_) -> list:
+        """
+        Daily aggregates of complete days and one row with NULL values (except check_date) for every missing day
+        :prefix - searching location by the beginning of name (after parsing from API)
+        """
+        
+        geo_id = await self._resolve_geo(prefix, **pars_)
+        if geo_id is None:
+            return self._missing_rows(pars_['date_range'], COLUMNS_DAILY)
+        geo_info = await self._fetch(QUERY_HISTORY_DAILY, geo_id, *self._dates_args(pars_['date_range']))
+        
+        return await self._to_rows(geo_info, {None: dimensions.geo_location(geo_id)}, 'date')
+    
+    
+    async def count_finalized_days(self, daily: bool = False, **pars_) -> int:
+        """
+        The number of finalized days among requested ones (by primary key, without reading of rows)
+        :daily - days with daily aggregates
+        """
+        
+        geo_id = await self._resolve_geo(False, **pars_)
+        if geo_id is None:
+            return 0
+        geo_info = await self._fetch(
+            QUERY_FINALIZED_DAYS_DAILY if daily else QUERY_FINALIZED_DAYS, 
+            geo_id, [parse(x).date() for x in pars_['date_range']],
         )
         
-        return geo_info
+        return geo_info[0]['count']
+    
+    
+    async def get_forecast_by_locations(self, prefix: bool = False, **pars_) -> list:
+        """
+        :prefix - searching location by the beginning of name (after parsing from API)
+        """
+        
+        geo_id = await self._resolve_geo(prefix, **pars_)
+        if geo_id is None:
+            return []
+        geo_info = await self._fetch(QUERY_FORECAST_DATES, geo_id)
+        
+        return await self._to_rows(geo_info, {None: dimensions.geo_location(geo_id)})
+
+    async def iterate_history_by_dates_and_locations(self, prefix: bool = False, **pars_) -> list:
+        """
+        Streaming of history by server-side cursor: yields chunks of rows,
+        the connection is borrowed from pool until the end of iteration
+        """
+        
+        geo_id = await self._resolve_geo(prefix, **pars_)
+        if geo_id is None:
+            yield self._missing_rows(pars_['date_range'])
+            return
+        geo_locations = {None: dimensions.geo_location(geo_id)}
+        args = (geo_id, *self._dates_args(pars_['date_range']))
+        log(logger, "data from DB", 'debug', "Got cursor for query", {'query': QUERY_HISTORY_DATES, 'args': args})
+        if self.pool is None:
+            await self.create_pool()
+        
+        started = time()
+        async with self.pool.acquire(timeout=configs['PG__POOL_ACQUIRE_TIMEOUT']) as conn:
+            API_STAGE_SECONDS.labels('db_acquire').observe(time() - started)
+            async with conn.transaction(readonly = True):
+                chunk = []
+                async for record in conn.cursor(QUERY_HISTORY_DATES, *args, prefetch = configs['API__STREAM_CHUNK_SIZE']):
+                    chunk.append(record)
+                    if len(chunk) >= configs['API__STREAM_CHUNK_SIZE']:
+                        yield await self._to_rows(chunk, geo_locations)
+                        chunk = []
+                if chunk:
+                    yield await self._to_rows(chunk, geo_locations)
+    
+    
+    async def _resolve_items(self, items: list = [], prefix: bool = False) -> dict:
+        """
+        Locations of items of batch which exist in DB: {number of item: geo_id}
+        """
+        
+        geo_ids = {}
+        for idx, pars_ in items:
+            geo_id = await self._resolve_geo(prefix, **pars_)
+            if geo_id is not None:
+                geo_ids[idx] = geo_id
+        
+        return geo_ids
+    
+    
+    async def get_history_batch(self, items: list = [], prefix: bool = False) -> list:
+        """
+        Retrieving history of several locations by one query
+        :items - list of tuples (number of item, params of item like in get_history_by_dates_and_locations)
+        """
+        
+        geo_ids = await self._resolve_items(items, prefix)
+        rows = [(idx, geo_ids[idx], parse(x).date()) for idx, pars_ in items if idx in geo_ids for x in pars_['date_range']]
+        if not rows:
+            return []
+        geo_info = await self._fetch(QUERY_HISTORY_BATCH, *map(list, zip(*rows)))
+        
+        return await self._to_rows(geo_info, {k: dimensions.geo_location(v) for k, v in geo_ids.items()})
+    
+    
+    async def get_forecast_batch(self, items: list = [], prefix: bool = False) -> list:
+        """
+        Retrieving forecast of several locations by one query
+        :items - list of tuples (number of item, params of item like in get_forecast_by_locations)
+        """
+        
+        geo_ids = await self._resolve_items(items, prefix)
+        if not geo_ids:
+            return []
+        geo_info = await self._fetch(QUERY_FORECAST_BATCH, list(geo_ids), list(geo_ids.values()))
+        
+        return await self._to_rows(geo_info, {k: dimensions.geo_location(v) for k, v in geo_ids.items()})
 
 #-------------------------------------------------------------------------------------------------
 ############################## Request to backend API for caching necessary data to DB -----------
 #-------------------------------------------------------------------------------------------------
 
 class WeatherDataFromAPI:
+    """
+    Triggering tasks of backend through the process-wide async HTTP client 
+    (keep-alive connections are shared by all requests of the worker)
+    """
+    
+    client = None
+
+    @classmethod
+    async def create_client(cls) -> None:
+        
+        if cls.client is not None:
+            return
+        cls.client = httpx.AsyncClient(
+            timeout = httpx.Timeout(
+                configs['API__BACKEND_TIMEOUT'], 
+                connect = configs['API__BACKEND_CONNECT_TIMEOUT'],
+            ),
+            limits = httpx.Limits(
+                max_connections = configs['API__BACKEND_MAX_CONNECTIONS'],
+                max_keepalive_connections = configs['API__BACKEND_MAX_CONNECTIONS'],
+            ),
+        )
+
+
+    @classmethod
+    async def close_client(cls) -> None:
+        
+        if cls.client is not None:
+            await cls.client.aclose()
+            cls.client = None
+    
+    
+    async def _run_backend_task(self, json_body: str, url: str) -> (bool, str):
+        """
+        Starting task of backend and waiting for its execution, 
+        the time of waiting and the outcome of task are saved to metrics
+        """
+        
+        with API_STAGE_SECONDS.labels('backend_wait').time():
+            success, task_id, outcome = await self._wait_backend_task(json_body, url)
+        API_BACKEND_TASKS.labels(json_body['task_type'], outcome).inc()
+        
+        return success, task_id
     
     
-    def _run_backend_task(self, json_body: str, url: str) -> (bool, str):
+    async def _wait_backend_task(self, json_body: str, url: str) -> (bool, str, str):
+        
+        log(logger, "data from API", 'info', 'Got body for request', {'body': json_body, 'url': url})
+        if self.client is None:
+            await self.create_client()
         
-        log(logger, "data from API", 'info', f"Got body for request : {json_body}, for URL: {url}")
-        response = requests.post(url, json = json_body)
+        try:
+            response = await self.client.post(url, json = json_body)
+        except httpx.HTTPError as error:
+            log(logger, 'fail with internal worker', 'error', f"Problem with request to {url} : {error!r}")
+            return False, None, 'error'
         
         if response.status_code == 202:
             task_id = response.json()['task_id']
-            log(logger, 'started internal worker', 'info', f"at task_id {task_id}")
+            log(logger, 'started internal worker', 'info', 'Task is started', {'task_id': task_id})
                     
-            ### defining timeout for parsing API task = 6 sec -------------------------------------
-            for _ in range(3):
+            ### waiting for execution of task with growing interval between checks ------------------
+            delay = configs['API__BACKEND_POLL_INTERVAL']
+            outcome = 'timeout'
+            for attempt in range(configs['API__BACKEND_POLL_ATTEMPTS']):
                 ### request worker for checking status of task execution
-                response = requests.get(f"{url}/{task_id}")
+                try:
+                    response = await self.client.get(f"{url}/{task_id}")
+                except httpx.HTTPError as error:
+                    log(logger, 'checking status internal worker', 'error', f"for task_id {task_id} : {error!r}")
+                    outcome = 'error'
+                    break
                 if response.status_code == 200:
-                    if response.json()['current_task_status']['task_status'] == 'SUCCESS': 
+                    status = response.json()['current_task_status']['task_status']
+                    if status in ('SUCCESS', 'FAILURE'):
+                        outcome = status.lower()
                         break
                 else:
                     log(logger, 'checking status internal worker', 'error', \
                         f"for task_id {task_id} : {response.text}")
+                    outcome = 'error'
                     break
-                sleep(2)
-            return True, task_id
+                if attempt < configs['API__BACKEND_POLL_ATTEMPTS'] - 1:
+                    await asyncio.sleep(delay)
+                    delay *= configs['API__BACKEND_POLL_BACKOFF']
+            return True, task_id, outcome
         else:
             log(logger, 'fail with internal worker', 'error',\
                 f"Problem with initialization task : {response.text}")
-            return False, None
+            return False, None, 'rejected'
         
 
-    def trigger_backend_history_by_dates_and_locations(self, **pars_) -> bool:
+    async def trigger_backend_history_by_dates_and_locations(self, **pars_) -> bool:
         
         json_body = {
             'querystring':{
@@ -102,12 +502,12 @@ class WeatherDataFromAPI:
             'token': configs['API__TOKEN'],
             'task_type':'upload_history',
         }
-        success, task_id = self._run_backend_task(json_body, url_int_post)
+        success, task_id = await self._run_backend_task(json_body, url_int_post)
         
         return success, task_id
     
     
-    def trigger_backend_forecast_by_days_and_locations(self, **pars_) -> bool:
+    async def trigger_backend_forecast_by_days_and_locations(self, **pars_) -> bool:
         
         json_body = {
             'querystring':{
@@ -118,6 +518,209 @@ class WeatherDataFromAPI:
             'token': configs['API__TOKEN'],
             'task_type':'upload_forecast',
         }
-        success, task_id = self._run_backend_task(json_body, url_int_post)
+        success, task_id = await self._run_backend_task(json_body, url_int_post)
+        
+        return success, task_id
+    
+    
+    async def trigger_backend_history_batch(self, items: list = []) -> bool:
+        """
+        One backend task for all locations
+        :items - list of params like in trigger_backend_history_by_dates_and_locations
+        """
+        
+        json_body = {
+            'querystring':{
+                "dt": "",
+                "lang":"en",
+            },
+            'locations':[{'location': pars_['geo_name'], 'dates': pars_['date_range']} for pars_ in items],
+            'token': configs['API__TOKEN'],
+            'task_type':'upload_history_batch',
+        }
+        success, task_id = await self._run_backend_task(json_body, url_int_post)
+        
+        return success, task_id
+    
+    
+    async def trigger_backend_forecast_batch(self, items: list = []) -> bool:
+        """
+        One backend task for all locations
+        :items - list of params like in trigger_backend_forecast_by_days_and_locations
+        """
+        
+        json_body = {
+            'querystring':{
+                "lang":"en",
+            },
+            'locations':[{'location': pars_['geo_name'], 'days': pars_['days']} for pars_ in items],
+            'token': configs['API__TOKEN'],
+            'task_type':'upload_forecast_batch',
+        }
+        success, task_id = await self._run_backend_task(json_body, url_int_post)
         
-        return success, task_id
\ No newline at end of file
+        return success, task_id
+
+
+#-------------------------------------------------------------------------------------------------
+############################## Caches of API: rows by days and payloads of forecast --------------
+#-------------------------------------------------------------------------------------------------
+
+### service columns of records which are not passed to response
+HISTORY_SERVICE_COLUMNS = ('item', 'check_date')
+FORECAST_SERVICE_COLUMNS = ('item', 'check_date', 'datetime_update')
+
+
+def to_row(record: object = None, service_columns: tuple = HISTORY_SERVICE_COLUMNS) -> dict:
+    """
+    Row of response directly from record of DB
+    """
+    
+    return {k: v for k, v in record.items() if k not in service_columns}
+
+
+def group_by(records: list = [], column: str = '') -> dict:
+    """
+    Records grouped by value of column in order of appearance
+    """
+    
+    groups = {}
+    for record in records:
+        groups.setdefault(record[column], []).append(record)
+    
+    return groups
+
+
+def key_location(geo_name: str = '', geo_country: str = None) -> tuple:
+    """
+    Key of location in caches of API: the id of location resolved by the index of locations, so
+    requests without country, by alias or other spelling of name share the same entries (and the entries
+    of warm-up). Normalized name and country are used if the location isn't in the index (yet)
+    """
+    
+    geo_id = dimensions.resolve_geo(geo_name, geo_country)
+    
+    return (geo_id,) if geo_id is not None else history_cache.key_geo(geo_name, geo_country)
+
+
+def key_day(key_geo: tuple = (), date_: str = '', daily: bool = False) -> tuple:
+    """
+    Key of day in memory of worker, daily aggregates are kept next to hourly rows
+    """
+    
+    return (*key_geo, date_, 'daily') if daily else (*key_geo, date_)
+
+
+def get_cached_days(key_geo: tuple = (), dates: list = [], daily: bool = False) -> dict:
+    """
+    Days of history which are available in memory of worker: {'%Y-%m-%d': [rows]}
+    """
+    
+    data = {}
+    if not history_cache.enabled:
+        return data
+    for date_ in dates:
+        rows = history_cache.get(key_day(key_geo, date_, daily))
+        if rows is not None:
+            data[date_] = rows
+    
+    return data
+
+
+def put_cached_days(key_geo: tuple = (), records: list = [], daily: bool = False) -> dict:
+    """
+    Splitting rows from DB by days (the query returns only days with all 24 hours) and caching them
+    """
+    
+    data = {}
+    column = 'date' if daily else 'datetime'
+    for check_date, records_day in group_by(records, 'check_date').items():
+        if records_day[0][column] is None:
+            continue
+        date_ = check_date.isoformat()
+        data[date_] = [to_row(x) for x in records_day]
+        history_cache.set(key_day(key_geo, date_, daily), data[date_])
+    
+    return data
+
+
+def keys_forecast(pars: dict = {}, key_geo: tuple = None) -> (str, str):
+    """
+    Keys of forecast payload and its validator (the latest update) in shared cache of workers
+    :key_geo - key of location, by default it's resolved from name and country of params
+    """
+    
+    parts = (*(key_geo or key_location(pars['geo_name'], pars.get('geo_country'))), pars['days'])
+    
+    return forecast_cache.key(*parts), forecast_cache.key(*parts, 'validator')
+
+
+def cache_forecast(key_cache: str = '', key_validator: str = '', data: list = [], 
+                   updated: datetime = None, geo_location: str = '') -> None:
+    
+    ttl = forecast_ttl(updated)
+    forecast_cache.set(key_cache, data, ttl, geo_location)
+    forecast_cache.set(key_validator, {'updated': updated}, ttl, geo_location)
+
+
+def forecast_ttl(updated: datetime = None) -> int:
+    """
+    Time to live of cached forecast: the forecast is fresh during CACHE__FORECAST_MAX_AGE
+    after its update
+    """
+    
+    age = forecast_age(updated)
+    
+    return int(min(
+        configs['CACHE__FORECAST_MAX_AGE'], 
+        max(configs['CACHE__FORECAST_MIN_TTL'], configs['CACHE__FORECAST_MAX_AGE'] - age)
+    ))
+
+
+def forecast_age(updated: datetime = None) -> float:
+    """
+    Seconds since the update of forecast (datetime_update is compared in the TZ of service 
+    like the forecast query does)
+    """
+    
+    return (
+        datetime.now().astimezone(pytz.timezone(configs['TZ'])).replace(tzinfo = None) - updated
+    ).total_seconds()
+
+
+async def warm_up_locations(geo_ids: list = [], days: int = 7, forecast_days: int = 3, 
+                            concurrency: int = 2) -> int:
+    """
+    Loading the last days of history (to memory of worker) and forecast (to shared cache, if it's absent)
+    of popular locations from DB under the keys of their ids, so requests by any name of location use them.
+    Absent data isn't requested from backend. Returns the number of warmed up locations
+    """
+    
+    semaphore = asyncio.Semaphore(concurrency)
+    dates = [(date.today() - timedelta(days = x)).isoformat() for x in range(days, 0, -1)]
+    loop = asyncio.get_running_loop()
+    
+    async def warm_up(geo_id: int = 0) -> bool:
+        async with semaphore:
+            geo_name, geo_country = dimensions.geo[geo_id]
+            pars = {'geo_name': geo_name, 'geo_country': geo_country}
+            key_geo = (geo_id,)
+            wdb = WeatherDataFromDB()
+            missing_dates = [x for x in dates if x not in get_cached_days(key_geo, dates)]
+            if missing_dates and history_cache.enabled:
+                put_cached_days(key_geo, await wdb.get_history_by_dates_and_locations(
+                    **{**pars, 'date_range': missing_dates}))
+            if forecast_cache.enabled:
+                pars['days'] = forecast_days
+                key_cache, key_validator = keys_forecast(pars, key_geo)
+                if await loop.run_in_executor(None, forecast_cache.get, key_validator) is None:
+                    records = await wdb.get_forecast_by_locations(**pars)
+                    if records and len({x['check_date'] for x in records}) >= pars['days']:
+                        await loop.run_in_executor(None, cache_forecast, key_cache, key_validator, 
+                            [to_row(x, FORECAST_SERVICE_COLUMNS) for x in records], 
+                            max(x['datetime_update'] for x in records), records[0]['geo_location'])
+            return True
+    
+    results = await asyncio.gather(*[warm_up(x) for x in geo_ids if x in dimensions.geo])
+    
+    return sum(results)
@@ -1,12 +1,59 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, validator, root_validator
+from dateutil.parser import parse
+from datetime import date, timedelta
 from typing import Optional, List
 
 
+### the limit of items in one batch request
+BATCH_MAX_ITEMS = 500
+### the limit of days in one request of history (range or list of dates)
+HISTORY_MAX_DAYS = 366
+### the limit of days of all items in one batch of history (rows of locations by days in one query)
+BATCH_MAX_DAYS = 3660
+
+
 class WeatherRequestHistory(BaseModel):
+    """
+    Dates of history are set by the list (dates) or by the range (start - end, both included)
+    """
 
     city: str
-    dates: str
+    dates: Optional[str] = None
+    start: Optional[date] = None
+    end: Optional[date] = None
     country: Optional[str] = None
+
+    @root_validator(skip_on_failure = True)
+    def check_dates(cls, values):
+
+        if values.get('dates') is not None:
+            if values.get('start') is not None or values.get('end') is not None:
+                raise ValueError('dates can not be combined with start and end')
+            days = {parse(x).date() for x in values['dates'].split(',') if x.strip()}
+        elif values.get('start') is not None:
+            end = values.get('end') or values['start']
+            if end < values['start']:
+                raise ValueError('end must not be earlier than start')
+            days = range((end - values['start']).days + 1)
+        else:
+            raise ValueError('dates or start (and end) must be specified')
+        if not 0 < len(days) <= HISTORY_MAX_DAYS:
+            raise ValueError(f'number of days must be from 1 to {HISTORY_MAX_DAYS}')
+        return values
+
+    @property
+    def date_range(self) -> list:
+        """
+        Sorted unique dates in format %Y-%m-%d
+        """
+
+        if self.dates is not None:
+            return sorted({parse(x).strftime('%Y-%m-%d') for x in self.dates.split(',') if x.strip()})
+        
+        return [
+            (self.start + timedelta(days = x)).isoformat() \
+                for x in range(((self.end or self.start) - self.start).days + 1)
+        ]
     
     @property
     def get_dict(self) -> dict:
@@ -14,8 +61,7 @@ class WeatherRequestHistory(BaseModel):
         return {
             'geo_name':self.city,
             'geo_country': self.country,
-            'date_range':self.dates.split(','),
-            'dates': "','".join(self.dates.split(',')),
+            'date_range':self.date_range,
         }
 
 
@@ -35,9 +81,71 @@ class WeatherRequestForecast(BaseModel):
         }
 
 
+class WeatherRequestHistoryBatch(BaseModel):
+
+    items: List[WeatherRequestHistory]
+
+    @validator('items')
+    def check_items(cls, items):
+
+        if not 0 < len(items) <= BATCH_MAX_ITEMS:
+            raise ValueError(f'number of items must be from 1 to {BATCH_MAX_ITEMS}')
+        if sum(len(item.date_range) for item in items) > BATCH_MAX_DAYS:
+            raise ValueError(f'number of days of all items must not be more than {BATCH_MAX_DAYS}')
+        return items
+
+    @property
+    def get_list(self) -> list:
+
+        return [item.get_dict for item in self.items]
+
+
+class WeatherRequestForecastBatch(BaseModel):
+
+    items: List[WeatherRequestForecast]
+
+    @validator('items')
+    def check_items(cls, items):
+
+        if not 0 < len(items) <= BATCH_MAX_ITEMS:
+            raise ValueError(f'number of items must be from 1 to {BATCH_MAX_ITEMS}')
+        return items
+
+    @property
+    def get_list(self) -> list:
+
+        return [item.get_dict for item in self.items]
+
+
 class WeatherResponse(BaseModel):
     
     current_time: str
     metainfo: dict
     data: list
-    
+
+
+class WeatherBatchItem(BaseModel):
+
+    item: int
+    city: str
+    country: Optional[str] = None
+    data: list
+
+
+class WeatherHistoryBatchItem(WeatherBatchItem):
+
+    missing_dates: List[str]
+
+
+class WeatherResponseHistoryBatch(BaseModel):
+
+    current_time: str
+    metainfo: dict
+    data: List[WeatherHistoryBatchItem]
+
+
+class WeatherResponseForecastBatch(BaseModel):
+
+    current_time: str
+    metainfo: dict
+    data: List[WeatherBatchItem]
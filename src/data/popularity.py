@@ -0,0 +1,178 @@
+import asyncio
+from src.utils.lazy import lazy_import
+from src.utils.logs import log
+
+redis = lazy_import('redis')
+
+
+#-------------------------------------------------------------------------------------------------
+############################## Popularity of locations -------------------------------------------
+#-------------------------------------------------------------------------------------------------
+
+class PopularityTracker:
+    """
+    Frequency of requests by locations (geo_id) in sorted set of REDIS shared by API and backend.
+    Workers of API count requests in memory and add them to the set by one pipeline every
+    flush_interval seconds, so requests don't wait for REDIS. Backend decays scores before reading
+    the top of locations, so the set reflects recent popularity (scores halve every half-life).
+    :key - the sorted set, like 'weather:popularity:forecast'
+    :timeout - socket timeout in seconds, the tracking is optional, so errors are just logged
+    """
+
+    def __init__(self,
+                host: str = 'localhost',
+                port: int = 6379,
+                db: int = 0,
+                password: str = None,
+                key: str = 'weather:popularity',
+                enabled: bool = True,
+                flush_interval: float = 5,
+                timeout: float = 0.5,
+                logger: object = None):
+
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.key = key
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self.logger = logger
+        self.conn = None
+        ### member -> requests since the last flush
+        self.pending = {}
+        self.flushing = None
+
+
+    def log(self, tag: str = 'popularity', message: str = '', data: dict = {}) -> None:
+
+        log(self.logger, tag, 'error', message, data)
+
+
+    def connect(self) -> object:
+
+        if self.conn is None:
+            self.conn = redis.Redis(
+                host = self.host,
+                port = self.port,
+                db = self.db,
+                password = self.password or None,
+                socket_timeout = self.timeout,
+                socket_connect_timeout = self.timeout,
+            )
+
+        return self.conn
+
+    ### API: counting of requests ------------------------------------------------------------------
+
+    def hit(self, member: object = None, weight: float = 1) -> None:
+
+        if self.enabled and member is not None:
+            self.pending[member] = self.pending.get(member, 0) + weight
+
+
+    def flush(self) -> int:
+        """
+        Adding counted requests to the set, they are dropped if REDIS isn't available
+        (popularity is approximate, memory of worker is bounded)
+        """
+
+        pending, self.pending = self.pending, {}
+        if not pending:
+            return 0
+        try:
+            pipe = self.connect().pipeline(transaction = False)
+            for member, weight in pending.items():
+                pipe.zincrby(self.key, weight, member)
+            pipe.execute()
+        except Exception as error:
+            self.log('flush of popularity', f"{len(pending)} locations: {error}")
+            return 0
+
+        return len(pending)
+
+
+    async def start(self) -> None:
+
+        if self.enabled and self.flushing is None:
+            self.flushing = asyncio.ensure_future(self._flush_periodically())
+
+
+    async def _flush_periodically(self) -> None:
+
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await loop.run_in_executor(None, self.flush)
+
+
+    async def close(self) -> None:
+
+        if self.flushing is not None:
+            self.flushing.cancel()
+            self.flushing = None
+        if self.enabled:
+            await asyncio.get_running_loop().run_in_executor(None, self.flush)
+
+    ### backend: ranking of locations --------------------------------------------------------------
+
+    def decay(self, factor: float = 0.5, min_score: float = 0.1, max_size: int = 10000) -> bool:
+        """
+        Multiplying all scores by factor, dropping locations with score below min_score
+        and the least popular ones over max_size
+        """
+
+        if not self.enabled:
+            return False
+        try:
+            pipe = self.connect().pipeline()
+            pipe.zunionstore(self.key, {self.key: factor})
+            pipe.zremrangebyscore(self.key, '-inf', f"({min_score}")
+            pipe.zremrangebyrank(self.key, 0, -max_size - 1)
+            pipe.execute()
+        except Exception as error:
+            self.log('decay of popularity', f"{self.key}: {error}")
+            return False
+
+        return True
+
+
+    def top(self, size: int = 10) -> list:
+        """
+        The most popular locations [(member, score), ...] in descending order of score
+        """
+
+        if not self.enabled or size <= 0:
+            return []
+        try:
+            ranking = self.connect().zrevrange(self.key, 0, size - 1, withscores = True)
+        except Exception as error:
+            self.log('reading of popularity', f"{self.key}: {error}")
+            return []
+
+        return [(x.decode() if isinstance(x, bytes) else x, score) for x, score in ranking]
+
+
+def plan_prefetch(ranking: list = [], forecasts: dict = {}, stale_after: float = 0, 
+                  days: int = 3, budget: int = 10) -> list:
+    """
+    Popular locations which forecast is absent, shorter than days or older than stale_after (seconds),
+    in order of popularity and not more than budget (calls of Weather API): [(geo_id, geo_name), ...]
+    :ranking - [(geo_id, score), ...] from PopularityTracker.top
+    :forecasts - {geo_id: (geo_name, age of forecast in seconds or None, days of forecast)},
+                 locations absent in DB are skipped
+    """
+
+    plan = []
+    for member, _ in ranking:
+        if len(plan) >= budget:
+            break
+        geo_id = int(member)
+        if geo_id not in forecasts:
+            continue
+        geo_name, age, days_available = forecasts[geo_id]
+        if age is None or days_available < days or age >= stale_after:
+            plan.append((geo_id, geo_name))
+
+    return plan
@@ -0,0 +1,81 @@
+import asyncio
+
+
+#-------------------------------------------------------------------------------------------------
+############################## Coalescing of concurrent identical requests -----------------------
+#-------------------------------------------------------------------------------------------------
+
+class SingleFlight:
+    """
+    Only the first request (leader) with the definite key runs the work,
+    concurrent requests with the same key (followers) await the result of leader.
+    The work is running as separate task, so cancelling of any request
+    (like disconnect of client) doesn't cancel it for the others.
+    """
+
+    def __init__(self):
+
+        self.calls = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+
+    @property
+    def in_flight(self) -> int:
+
+        return len(self.calls)
+
+
+    @property
+    def stats(self) -> dict:
+
+        return {
+            'leaders': self.leaders,
+            'coalesced': self.coalesced,
+            'in_flight': self.in_flight,
+        }
+
+
+    async def do(self, key: object = None, func: object = None, *args, **kwargs) -> (object, bool):
+        """
+        Returns result of func(*args, **kwargs) and flag - was the request coalesced with the other one
+        """
+
+        task = self.calls.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task), True
+
+        task = asyncio.ensure_future(func(*args, **kwargs))
+        self.calls[key] = task
+        self.leaders += 1
+        task.add_done_callback(lambda t: self._done(key, t))
+
+        return await asyncio.shield(task), False
+
+
+    def spawn(self, key: object = None, func: object = None, *args, **kwargs) -> bool:
+        """
+        Running func(*args, **kwargs) in background without waiting for it (like refresh of stale data),
+        returns False if the work with the same key is already in flight
+        """
+
+        if key in self.calls:
+            self.coalesced += 1
+            return False
+
+        task = asyncio.ensure_future(func(*args, **kwargs))
+        self.calls[key] = task
+        self.leaders += 1
+        task.add_done_callback(lambda t: self._done(key, t))
+
+        return True
+
+
+    def _done(self, key: object = None, task: asyncio.Future = None) -> None:
+
+        if self.calls.get(key) is task:
+            self.calls.pop(key)
+        ### marking exception as retrieved, if all requests were cancelled
+        if not task.cancelled():
+            task.exception()
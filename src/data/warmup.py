@@ -0,0 +1,170 @@
+import os
+import orjson
+import asyncio
+from time import time
+from decimal import Decimal
+from datetime import datetime, date
+from src.utils.logs import log
+
+### columns of rows which are kept in snapshot as isoformat
+SNAPSHOT_TYPES = {
+    'datetime': datetime.fromisoformat,
+    'datetime_update': datetime.fromisoformat,
+    'date': date.fromisoformat,
+}
+
+
+#-------------------------------------------------------------------------------------------------
+############################## Warm-up of worker -------------------------------------------------
+#-------------------------------------------------------------------------------------------------
+
+class WarmUp:
+    """
+    Filling caches of worker after its start (snapshot of the previous run, popular locations)
+    in background, the worker reports readiness (/healthcheck) when warm-up is over.
+    Warm-up isn't critical: errors are logged and after timeout the worker is ready anyway
+    :timeout - seconds of the whole warm-up
+    """
+
+    def __init__(self, enabled: bool = True, timeout: float = 60, logger: object = None):
+
+        self.enabled = enabled
+        self.timeout = timeout
+        self.logger = logger
+        self.task = None
+        self.finished = not enabled
+        self.started = None
+        self.elapsed = None
+        ### results of stages like {'snapshot': 1200, 'locations': 50}
+        self.results = {}
+
+
+    def log(self, tag: str = 'warm-up', log_level: str = 'info', message: str = '', data: dict = {}) -> None:
+
+        log(self.logger, tag, log_level, message, data)
+
+
+    @property
+    def ready(self) -> bool:
+
+        return self.finished
+
+
+    @property
+    def stats(self) -> dict:
+
+        elapsed = self.elapsed
+        if elapsed is None:
+            elapsed = time() - self.started if self.started else 0
+
+        return {
+            'ready': self.ready,
+            'elapsed': round(elapsed, 3),
+            **self.results,
+        }
+
+
+    def start(self, *stages) -> None:
+        """
+        stages - pairs (name, coroutine function), they are run one by one,
+        the result of stage (like the number of loaded entries) is kept in stats
+        """
+
+        if self.enabled and self.task is None:
+            self.started = time()
+            self.task = asyncio.ensure_future(self._run(stages))
+
+
+    async def _run(self, stages: tuple = ()) -> None:
+
+        try:
+            await asyncio.wait_for(self._run_stages(stages), self.timeout)
+        except asyncio.TimeoutError:
+            self.log('warm-up', 'error', f"isn't finished in {self.timeout} seconds: {self.results}")
+        finally:
+            self.elapsed = time() - self.started
+            self.finished = True
+        self.log('warm-up', 'info', 'finished', {'elapsed': round(self.elapsed, 2), **self.results})
+
+
+    async def _run_stages(self, stages: tuple = ()) -> None:
+
+        for name, stage in stages:
+            try:
+                self.results[name] = await stage()
+            except Exception as error:
+                self.results[name] = None
+                self.log(f"warm-up: {name}", 'error', repr(error))
+
+
+    async def close(self) -> None:
+
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions = True)
+
+
+def _snapshot_default(obj: object) -> object:
+    """
+    Types of rows from DB which are not serialized by orjson natively
+    """
+
+    if isinstance(obj, Decimal):
+        return float(obj)
+
+    raise TypeError(f"Object of type {type(obj).__name__} is not serialized to snapshot")
+
+
+def _restore_row(row: dict = {}) -> dict:
+    """
+    Values of datetime and date columns from isoformat of snapshot
+    """
+
+    for column, parse in SNAPSHOT_TYPES.items():
+        if isinstance(row.get(column), str):
+            row[column] = parse(row[column])
+
+    return row
+
+
+def save_snapshot(cache: object = None, path: str = '') -> int:
+    """
+    Saving entries of LRUCache to JSON file, the file is replaced atomically
+    (workers of API save their snapshots to the same file at shutdown, the last one wins)
+    """
+
+    items = cache.snapshot()
+    if not items:
+        return 0
+    snapshot = {'created': time(), 'items': [[list(key), value] for key, value in items]}
+    tmp = f"{path}.{os.getpid()}.tmp"
+    os.makedirs(os.path.dirname(path) or '.', exist_ok = True)
+    with open(tmp, 'wb') as f:
+        f.write(orjson.dumps(snapshot, default = _snapshot_default))
+    os.replace(tmp, path)
+
+    return len(items)
+
+
+def load_snapshot(cache: object = None, path: str = '', max_age: float = 0, logger: object = None) -> int:
+    """
+    Restoring entries of LRUCache from the file of the previous run if it isn't older than max_age
+    (0 - any age). The volume of data is shared by containers, so the file is only parsed as JSON
+    and a broken one is skipped: keys are restored as tuples and values as lists of rows
+    """
+
+    if not os.path.exists(path):
+        return 0
+    try:
+        with open(path, 'rb') as f:
+            snapshot = orjson.loads(f.read())
+        if max_age and time() - float(snapshot['created']) > max_age:
+            return 0
+        items = [
+            (tuple(key), [_restore_row(row) for row in value]) for key, value in snapshot['items']
+        ]
+    except (OSError, ValueError, TypeError, KeyError, AttributeError) as error:
+        log(logger, 'snapshot of cache', 'error', 'broken snapshot is skipped', {'path': path, 'error': repr(error)})
+        return 0
+
+    return cache.restore(items)
@@ -1,7 +1,13 @@
-from src.utils import *
+from src.utils.logs import logger_init
 from src.settings import configs, main_dirs
 
 
 ## logging instance -----------------------------------------------------------------------
 
-logger = logger_init(location = 'init_rest_api', log_path = main_dirs['LOG'])
\ No newline at end of file
+logger = logger_init(
+    location = 'init_rest_api', 
+    log_path = main_dirs['LOG'],
+    log_level = configs['LOG__LEVEL'],
+    sampling = configs['LOG__SAMPLING'],
+    queue_size = configs['LOG__QUEUE_SIZE'],
+)
\ No newline at end of file
@@ -1,12 +1,17 @@
-import structlog
+import os
 import uvicorn
-from fastapi import FastAPI
-from fastapi_utils.timing import add_timing_middleware
+from time import time
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
 
 from src.api.common import router as common_router
 from src.api.v1.api import router as v1_router
-from src.settings import configs, main_dirs
+from src.data.get_data import WeatherDataFromDB, WeatherDataFromAPI, popularity, history_cache, forecast_cache, warmup, warm_up_locations
+from src.data.warmup import save_snapshot, load_snapshot
+from src.settings import configs, main_dirs, check_redis_password
+from src.metrics import API_REQUEST_SECONDS, API_REQUESTS_IN_FLIGHT, endpoint_label, clear_multiprocess_dir
 from src.logger import *
+from src.utils.logs import log
 
 
 app = FastAPI(
@@ -15,10 +20,83 @@ app = FastAPI(
 app.include_router(common_router, tags=["common"])
 app.include_router(v1_router, tags=["v1"])
 
-add_timing_middleware(app, record=logger.debug, prefix="v1", exclude="common")
+### paths of API methods are labels of metrics, other paths are counted together
+ENDPOINTS = set(app.openapi()['paths'])
+
+
+@app.middleware("http")
+async def track_requests(request: Request, call_next) -> object:
+    """
+    Latency and the number of requests in processing by endpoints for metrics
+    """
+    
+    endpoint = endpoint_label(request.url.path, ENDPOINTS)
+    status, started = 500, time()
+    API_REQUESTS_IN_FLIGHT.labels(endpoint).inc()
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        API_REQUESTS_IN_FLIGHT.labels(endpoint).dec()
+        API_REQUEST_SECONDS.labels(endpoint, request.method, str(status)).observe(time() - started)
+
+
+### history cache of worker is saved at shutdown and restored by the next run
+SNAPSHOT_PATH = os.path.join(main_dirs['DATA'], configs['FILE__HISTORY_SNAPSHOT'])
+
+
+@app.on_event("startup")
+async def startup() -> None:
+    if forecast_cache.enabled or popularity.enabled:
+        check_redis_password()
+    await WeatherDataFromDB.create_pool()
+    await WeatherDataFromDB.start_dimensions()
+    await WeatherDataFromAPI.create_client()
+    await popularity.start()
+    warmup.start(
+        ('snapshot', restore_snapshot),
+        ('locations', warm_up_popular_locations),
+    )
+
+
+@app.on_event("shutdown")
+async def shutdown() -> None:
+    await warmup.close()
+    await popularity.close()
+    await WeatherDataFromDB.close_dimensions()
+    await WeatherDataFromDB.close_pool()
+    await WeatherDataFromAPI.close_client()
+    if configs['CACHE__SNAPSHOT_ENABLED'] and history_cache.enabled:
+        try:
+            saved = save_snapshot(history_cache, SNAPSHOT_PATH)
+            log(logger, 'snapshot of cache', 'info', 'Entries are saved', {'entries': saved, 'path': SNAPSHOT_PATH})
+        except Exception as error:
+            log(logger, 'snapshot of cache', 'error', f"{SNAPSHOT_PATH}: {error!r}")
+
+
+async def restore_snapshot() -> int:
+    
+    if not configs['CACHE__SNAPSHOT_ENABLED'] or not history_cache.enabled:
+        return 0
+    
+    return await run_in_threadpool(load_snapshot, history_cache, SNAPSHOT_PATH, configs['CACHE__SNAPSHOT_MAX_AGE'], logger)
+
+
+async def warm_up_popular_locations() -> int:
+    
+    ranking = await run_in_threadpool(popularity.top, configs['CACHE__WARMUP_LOCATIONS'])
+    
+    return await warm_up_locations(
+        [int(x) for x, _ in ranking], 
+        days = configs['CACHE__WARMUP_DAYS'], 
+        forecast_days = configs['PREFETCH__DAYS'],
+        concurrency = configs['CACHE__WARMUP_CONCURRENCY'],
+    )
 
 
 if __name__ == '__main__':
     log(logger, 'initialization', 'info', \
         f"Start API at entrypoint : {configs['APP__HOST']}:80, with {configs['APP__WORKERS']} workers")
+    clear_multiprocess_dir()
     uvicorn.run("__main__:app", host=configs['APP__HOST'], port=80, workers=configs['APP__WORKERS'])
\ No newline at end of file
@@ -0,0 +1,115 @@
+import os
+import glob
+from prometheus_client import (
+                            CONTENT_TYPE_LATEST,
+                            REGISTRY,
+                            CollectorRegistry,
+                            Counter,
+                            Gauge,
+                            Histogram,
+                            generate_latest,
+                            multiprocess,
+                            )
+
+
+### latencies from fractions of ms (acquiring of connection) to minutes (waiting for backend task)
+BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 120)
+
+#-------------------------------------------------------------------------------------------------
+############################## REST API ----------------------------------------------------------
+#-------------------------------------------------------------------------------------------------
+
+API_REQUEST_SECONDS = Histogram(
+    'weather_api_request_seconds', 'Latency of requests to REST API',
+    ['endpoint', 'method', 'status'], buckets = BUCKETS,
+)
+API_REQUESTS_IN_FLIGHT = Gauge(
+    'weather_api_requests_in_flight', 'Requests to REST API in processing',
+    ['endpoint'], multiprocess_mode = 'livesum',
+)
+### db_acquire, db_query, rows (records to rows of response), serialization, backend_wait
+API_STAGE_SECONDS = Histogram(
+    'weather_api_stage_seconds', 'Latency of stages of processing requests to REST API',
+    ['stage'], buckets = BUCKETS,
+)
+### complete - all data from caches of workers, miss - data from DB and/or backend, not_modified - 304
+API_CACHE_RESPONSES = Counter(
+    'weather_api_cache_responses_total', 'Responses of REST API by availability of data in caches',
+    ['endpoint', 'result'],
+)
+### success, failure (task failed in backend), timeout (polling is over), rejected, error (of connection)
+API_BACKEND_TASKS = Counter(
+    'weather_api_backend_tasks_total', 'Tasks triggered by REST API in backend by their outcome',
+    ['task_type', 'outcome'],
+)
+
+#-------------------------------------------------------------------------------------------------
+############################## backend (Flask app and celery workers) ----------------------------
+#-------------------------------------------------------------------------------------------------
+
+BACKEND_REQUEST_SECONDS = Histogram(
+    'weather_backend_request_seconds', 'Latency of requests to backend',
+    ['endpoint', 'method', 'status'], buckets = BUCKETS,
+)
+BACKEND_REQUESTS_IN_FLIGHT = Gauge(
+    'weather_backend_requests_in_flight', 'Requests to backend in processing',
+    ['endpoint'], multiprocess_mode = 'livesum',
+)
+### origin_request (request to Weather API), processing (transformation and uploading to DB)
+BACKEND_STAGE_SECONDS = Histogram(
+    'weather_backend_stage_seconds', 'Latency of stages of tasks of backend',
+    ['stage'], buckets = BUCKETS,
+)
+BACKEND_TASK_SECONDS = Histogram(
+    'weather_backend_task_seconds', 'Duration of celery tasks',
+    ['task'], buckets = BUCKETS,
+)
+### success, failure, retry
+BACKEND_TASKS = Counter(
+    'weather_backend_tasks_total', 'Finished celery tasks by their outcome',
+    ['task', 'outcome'],
+)
+
+#-------------------------------------------------------------------------------------------------
+
+def multiprocess_dir() -> str:
+    """
+    Directory of metrics shared by processes (workers of uvicorn/gunicorn, celery),
+    it's set by environment before start of processes
+    """
+
+    return os.environ.get('PROMETHEUS_MULTIPROC_DIR') or os.environ.get('prometheus_multiproc_dir')
+
+
+def clear_multiprocess_dir() -> None:
+    """
+    Dropping metrics of previous run, it's called once before start of workers
+    """
+
+    path = multiprocess_dir()
+    if path:
+        os.makedirs(path, exist_ok = True)
+        for file_ in glob.glob(os.path.join(path, '*.db')):
+            os.remove(file_)
+
+
+def render() -> (bytes, str):
+    """
+    Metrics in text format of Prometheus: of all processes if the multiprocess directory is set,
+    otherwise of the current process
+    """
+
+    registry = REGISTRY
+    if multiprocess_dir():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def endpoint_label(path: str = '', known: set = set()) -> str:
+    """
+    Label of endpoint is the path of route, unknown paths are counted together (bounded cardinality)
+    """
+
+    return path if path in known else 'other'
@@ -1,76 +1,312 @@
+### conditions for searching location, parameters: $1 - normalized name of geo, $2 - normalized country 
+### (NULL if not specified), normalization is the same as regional.normalize_geo in DB (normalize_geo in utils).
+### The texts of queries are constant, so prepared statements are reused
+CONDITION_GEO_EXACT = \
+    """(g.geo_name_norm = $1
+                OR g.id IN (SELECT a.geo_id FROM regional.geoalias a WHERE a.alias_norm = $1))
+            AND ($2::varchar IS NULL OR g.geo_country_norm = $2)"""
+
+### by the beginning of name (SP-GiST index) or similar name (trigram index, pg_trgm.similarity_threshold)
+CONDITION_GEO_PREFIX = \
+    """(g.geo_name_norm ^@ $1 OR g.geo_name_norm % $1
+                OR g.id IN (SELECT a.geo_id FROM regional.geoalias a WHERE a.alias_norm = $1))
+            AND ($2::varchar IS NULL OR g.geo_country_norm ^@ $2)"""
+
+### the columns of records returned by queries
+COLUMNS_WEATHER = [
+    'datetime', 'temperature', 'temperature_feels_like', 'condition_weather', 'uv_index',
+    'humidity', 'pressure_mb', 'day_or_night', 'geo_location', 'check_date',
+]
+COLUMNS_FORECAST = COLUMNS_WEATHER + ['datetime_update']
+COLUMNS_DAILY = [
+    'date', 'temperature_min', 'temperature_max', 'temperature_mean', 'humidity_min', 'humidity_max',
+    'humidity_mean', 'condition_weather', 'geo_location', 'check_date',
+]
+#--------------------------------------------------------------------------
+
+### dictionaries of DB which are kept in memory of API (src/data/dimensions.py),
+### the triggers on these tables send changes to the channel (init_db/init_conf.sh)
+CHANNEL_DIMENSIONS = 'weather_dimensions'
+
+QUERY_DIMENSIONS_GEO = \
+    """SELECT id
+            , geo_name
+            , geo_country
+            , geo_name_norm
+            , geo_country_norm
+        FROM regional.geoid;"""
+
+QUERY_DIMENSIONS_ALIAS = \
+    """SELECT alias_norm
+            , geo_id
+        FROM regional.geoalias;"""
+
+QUERY_DIMENSIONS_CONDITION = \
+    """SELECT id
+            , condition_str
+        FROM regional.conditionid;"""
+
+### searching location in DB if it's absent in memory (like just added by backend):
+### the same name goes first, then the alternate spelling, the beginning of name and similar name
+QUERY_GEO_LOOKUP_TEMPLATE = \
+    """SELECT g.id
+            , g.geo_name
+            , g.geo_country
+            , g.geo_name_norm
+            , g.geo_country_norm
+        FROM regional.geoid g
+        WHERE {condition_geo}
+        ORDER BY g.geo_name_norm = $1 DESC
+               , g.id IN (SELECT a.geo_id FROM regional.geoalias a WHERE a.alias_norm = $1) DESC
+               , starts_with(g.geo_name_norm, $1) DESC
+               , similarity(g.geo_name_norm, $1) DESC
+               , g.geo_name
+               , g.geo_country
+        LIMIT 1;"""
+
+QUERY_GEO_LOOKUP = QUERY_GEO_LOOKUP_TEMPLATE.format(condition_geo = CONDITION_GEO_EXACT)
+QUERY_GEO_LOOKUP_PREFIX = QUERY_GEO_LOOKUP_TEMPLATE.format(condition_geo = CONDITION_GEO_PREFIX)
+#--------------------------------------------------------------------------
+
+### the location is resolved by API before query, so only local_temperature is read by primary key range
+### (the table is partitioned by month, partitions of other months are pruned by the range of datetime).
+### condition_weather is returned as condition_id and geo_location as NULL - both are filled by API
+### from dictionaries in memory, the placeholders keep the order of columns in response.
+### $1 - geo_id, dates of history: $2 - list of dates, $3 and $4 - the range of dates (start, end - both included),
+### the range is used for consecutive dates (the list is empty) and NULLs for the list.
+### Days which aren't finalized in regional.day_completeness are returned as one row with NULL values 
+### and the date in check_date
 QUERY_HISTORY_DATES = \
-    """WITH geo as (
-            SELECT id
-                 , geo_name
-                 , geo_country
-            FROM regional.geoid
-            WHERE {condition_geo}
-            ORDER BY geo_name, geo_country
-            LIMIT 1),
+    """WITH req as (
+            SELECT unnest($2::date[]) as date_
+            UNION
+            SELECT generate_series($3::date, $4::date, interval '1 day')::date),
         meta as (
-            SELECT geo.id
-                 , geo.geo_name
-                 , geo.geo_country
-                 , lt.datetime::date as date_ 
-                 , count(*)
-            FROM regional.local_temperature lt, geo 
-            WHERE lt.geo_id = geo.id 
-            AND datetime_update > lt.datetime  
-            GROUP BY 1,2,3,4
-            HAVING count(*) = 24)
+            SELECT req.date_
+            FROM req
+            JOIN regional.day_completeness dc ON dc.geo_id = $1
+                AND dc.day = req.date_
+            WHERE dc.finalized)
         SELECT lt.datetime
              , lt.temp_c as temperature
              , lt.temp_c_feelslike as temperature_feels_like
-             , cd.condition_str as condition_weather
+             , lt.condition_id as condition_weather
              , lt.uv_index
              , lt.humidity
              , lt.pressure_mb
-             , case when lt.is_day is true then 'day' 
+             , case when lt.is_day is true then 'day'
                  else 'night' end as day_or_night
-             , meta.geo_name || ', ' || meta.geo_country as geo_location
+             , NULL::varchar as geo_location
+             , meta.date_ as check_date
+        FROM meta
+        JOIN regional.local_temperature lt ON lt.geo_id = $1
+            AND lt.datetime >= meta.date_
+            AND lt.datetime < meta.date_ + 1
+        UNION ALL
+        SELECT NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL
+             , req.date_
+        FROM req
+        WHERE NOT EXISTS (SELECT 1 FROM meta WHERE meta.date_ = req.date_)
+        ORDER BY 10, 1;"""
+#--------------------------------------------------------------------------
+
+### daily aggregates, parameters like in QUERY_HISTORY_DATES.
+### Days without aggregates of all 24 hours are returned with NULL values and the date in check_date
+QUERY_HISTORY_DAILY = \
+    """WITH req as (
+            SELECT unnest($2::date[]) as date_
+            UNION
+            SELECT generate_series($3::date, $4::date, interval '1 day')::date)
+        SELECT dw.day as date
+             , dw.temp_c_min as temperature_min
+             , dw.temp_c_max as temperature_max
+             , dw.temp_c_mean as temperature_mean
+             , dw.humidity_min
+             , dw.humidity_max
+             , dw.humidity_mean
+             , dw.condition_id as condition_weather
+             , NULL::varchar as geo_location
+             , req.date_ as check_date
+        FROM req
+        LEFT JOIN regional.daily_weather dw ON dw.geo_id = $1
+            AND dw.day = req.date_
+            AND dw.hours = 24
+        ORDER BY 10;"""
+#--------------------------------------------------------------------------
+
+### checks of conditional requests without reading of rows: the number of finalized days
+### among requested ones, $1 - geo_id, $2 - list of dates
+QUERY_FINALIZED_DAYS = \
+    """SELECT count(*)
+        FROM regional.day_completeness dc
+        WHERE dc.geo_id = $1
+        AND dc.day = ANY($2::date[])
+        AND dc.finalized;"""
+
+QUERY_FINALIZED_DAYS_DAILY = \
+    """SELECT count(*)
+        FROM regional.daily_weather dw
+        WHERE dw.geo_id = $1
+        AND dw.day = ANY($2::date[])
+        AND dw.hours = 24;"""
+#--------------------------------------------------------------------------
+
+### $1 - geo_id
+QUERY_FORECAST_DATES = \
+    """SELECT lt.datetime
+             , lt.temp_c as temperature
+             , lt.temp_c_feelslike as temperature_feels_like
+             , lt.condition_id as condition_weather
+             , lt.uv_index
+             , lt.humidity
+             , lt.pressure_mb
+             , case when lt.is_day is true then 'day'
+                 else 'night' end as day_or_night
+             , NULL::varchar as geo_location
              , lt.datetime::date as check_date
+             , lt.datetime_update
         FROM regional.local_temperature lt
-           , regional.conditionid cd
-           , meta
-        WHERE meta.id = lt.geo_id
-        AND cd.id = lt.condition_id
-        AND meta.date_ = lt.datetime::date
-        AND meta.date_ in ('{dates}')
+        WHERE lt.geo_id = $1
+        AND lt.datetime > LOCALTIMESTAMP
         ORDER BY 1;"""
 #--------------------------------------------------------------------------
 
-QUERY_FORECAST_DATES = \
-    """WITH geo as (
-            SELECT id
-                 , geo_name
-                 , geo_country
-            FROM regional.geoid
-            WHERE {condition_geo}
-            ORDER BY geo_name, geo_country
-            LIMIT 1),
+### batch queries: one row of request per (item, date), parameters are parallel arrays:
+### $1 - number of item, $2 - geo_id, $3 - date (history)
+QUERY_HISTORY_BATCH = \
+    """WITH req as (
+            SELECT *
+            FROM unnest($1::int[], $2::int[], $3::date[]) AS r(item, geo_id, date_)),
         meta as (
-            SELECT geo.id
-                 , geo.geo_name
-                 , geo.geo_country
-                 , lt.datetime as date_ 
-            FROM regional.local_temperature lt, geo 
-            WHERE lt.geo_id = geo.id 
-            AND lt.datetime::timestamp > CURRENT_TIMESTAMP)
-        SELECT lt.datetime
+            SELECT req.item
+                 , req.geo_id
+                 , req.date_
+            FROM req
+            JOIN regional.day_completeness dc ON dc.geo_id = req.geo_id
+                AND dc.day = req.date_
+            WHERE dc.finalized)
+        SELECT meta.item
+             , lt.datetime
+             , lt.temp_c as temperature
+             , lt.temp_c_feelslike as temperature_feels_like
+             , lt.condition_id as condition_weather
+             , lt.uv_index
+             , lt.humidity
+             , lt.pressure_mb
+             , case when lt.is_day is true then 'day'
+                 else 'night' end as day_or_night
+             , NULL::varchar as geo_location
+             , meta.date_ as check_date
+        FROM meta
+        JOIN regional.local_temperature lt ON lt.geo_id = meta.geo_id
+            AND lt.datetime >= meta.date_
+            AND lt.datetime < meta.date_ + 1
+        ORDER BY 1, 2;"""
+#--------------------------------------------------------------------------
+
+### $1 - number of item, $2 - geo_id
+QUERY_FORECAST_BATCH = \
+    """WITH req as (
+            SELECT *
+            FROM unnest($1::int[], $2::int[]) AS r(item, geo_id))
+        SELECT req.item
+             , lt.datetime
              , lt.temp_c as temperature
              , lt.temp_c_feelslike as temperature_feels_like
-             , cd.condition_str as condition_weather
+             , lt.condition_id as condition_weather
              , lt.uv_index
              , lt.humidity
              , lt.pressure_mb
-             , case when lt.is_day is true then 'day' 
+             , case when lt.is_day is true then 'day'
                  else 'night' end as day_or_night
-             , meta.geo_name || ', ' || meta.geo_country as geo_location
+             , NULL::varchar as geo_location
              , lt.datetime::date as check_date
-        FROM regional.local_temperature lt
-           , regional.conditionid cd
-           , meta
-        WHERE meta.id = lt.geo_id
-        AND cd.id = lt.condition_id
-        AND meta.date_ = lt.datetime
-        ORDER BY 1;"""
\ No newline at end of file
+             , lt.datetime_update
+        FROM req
+        JOIN regional.local_temperature lt ON lt.geo_id = req.geo_id
+            AND lt.datetime > LOCALTIMESTAMP
+        ORDER BY 1, 2;"""
+#--------------------------------------------------------------------------
+
+### completeness of days is maintained by backend (src/weather_process.py) in the same transaction
+### with uploading of hours, so API checks only the requested days by primary key.
+### Only observed hours are counted (updated after the hour itself, not forecast),
+### the day is finalized when all 24 of them are present.
+### {geo_id} - id of location, {days} - list of uploaded days like '2023-08-15','2023-08-16'
+QUERY_DAY_COMPLETENESS_TEMPLATE = \
+    """INSERT INTO regional.day_completeness (geo_id, day, hours_present, finalized, datetime_update)
+        SELECT {geo_id}
+             , d.day
+             , count(lt.datetime)
+             , count(lt.datetime) = 24
+             , LOCALTIMESTAMP
+        FROM unnest(ARRAY[{days}]::date[]) AS d(day)
+        LEFT JOIN regional.local_temperature lt ON lt.geo_id = {geo_id}
+            AND lt.datetime >= d.day
+            AND lt.datetime < d.day + 1
+            AND lt.datetime_update > lt.datetime
+        GROUP BY d.day
+        ON CONFLICT (geo_id, day) DO UPDATE
+        SET hours_present = excluded.hours_present
+          , finalized = excluded.finalized
+          , datetime_update = excluded.datetime_update;"""
+#--------------------------------------------------------------------------
+
+### monthly partitions of regional.local_temperature (functions of DB in init_db/init_conf.sh):
+### partitions for months from {date_from} to {date_to}, they are created by backend ahead of time 
+### and before uploading of history
+QUERY_CREATE_PARTITIONS_TEMPLATE = \
+    """SELECT regional.create_partitions('{date_from}'::date, '{date_to}'::date);"""
+
+### retention: partitions of months before {keep_from} are detached and dropped ({drop} - true) or archived
+QUERY_RETIRE_PARTITIONS_TEMPLATE = \
+    """SELECT regional.retire_partitions('{keep_from}'::date, {drop});"""
+#--------------------------------------------------------------------------
+
+### daily aggregates of observed hours are maintained by backend like completeness of days 
+### (in the same transaction with uploading), the dominant condition is the most frequent one.
+### {geo_id} - id of location, {days} - list of uploaded days like '2023-08-15','2023-08-16'
+QUERY_DAILY_WEATHER_TEMPLATE = \
+    """INSERT INTO regional.daily_weather (geo_id, day, hours, temp_c_min, temp_c_max, temp_c_mean,
+                humidity_min, humidity_max, humidity_mean, condition_id, datetime_update)
+        SELECT {geo_id}
+             , d.day
+             , count(*)
+             , min(lt.temp_c)
+             , max(lt.temp_c)
+             , round(avg(lt.temp_c)::numeric, 1)
+             , min(lt.humidity)
+             , max(lt.humidity)
+             , round(avg(lt.humidity), 1)
+             , mode() WITHIN GROUP (ORDER BY lt.condition_id)
+             , LOCALTIMESTAMP
+        FROM unnest(ARRAY[{days}]::date[]) AS d(day)
+        JOIN regional.local_temperature lt ON lt.geo_id = {geo_id}
+            AND lt.datetime >= d.day
+            AND lt.datetime < d.day + 1
+            AND lt.datetime_update > lt.datetime
+        GROUP BY d.day
+        ON CONFLICT (geo_id, day) DO UPDATE
+        SET hours = excluded.hours
+          , temp_c_min = excluded.temp_c_min
+          , temp_c_max = excluded.temp_c_max
+          , temp_c_mean = excluded.temp_c_mean
+          , humidity_min = excluded.humidity_min
+          , humidity_max = excluded.humidity_max
+          , humidity_mean = excluded.humidity_mean
+          , condition_id = excluded.condition_id
+          , datetime_update = excluded.datetime_update;"""
+#--------------------------------------------------------------------------
+
+### locations of prefetching of forecast ({geo_ids} - ids of popular locations): age of their forecast
+### in seconds since the latest update (NULL if the forecast is absent) and the number of its days
+QUERY_FORECAST_AGE_TEMPLATE = \
+    """SELECT g.id
+             , g.geo_name
+             , extract(epoch FROM LOCALTIMESTAMP - max(lt.datetime_update))::int as age
+             , count(DISTINCT lt.datetime::date) as days
+        FROM regional.geoid g
+        LEFT JOIN regional.local_temperature lt ON lt.geo_id = g.id
+            AND lt.datetime > LOCALTIMESTAMP
+        WHERE g.id = ANY(ARRAY[{geo_ids}]::int[])
+        GROUP BY g.id, g.geo_name;"""
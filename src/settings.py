@@ -1,5 +1,6 @@
 import os
 from dotenv import load_dotenv
+from urllib.parse import quote
 
 load_dotenv()
 
@@ -20,29 +21,101 @@ configs = {
     'PG__PASSW_BOT': os.environ['PG__PASSW_BOT'],
     'PG__DBNAME': os.environ['PG__DBNAME'],
     'PG__SCHEMA': os.environ['PG__SCHEMA'],
+    'PG__POOL_MIN_SIZE': int(os.environ.get('PG__POOL_MIN_SIZE', 2)),
+    'PG__POOL_MAX_SIZE': int(os.environ.get('PG__POOL_MAX_SIZE', 10)),
+    'PG__POOL_ACQUIRE_TIMEOUT': float(os.environ.get('PG__POOL_ACQUIRE_TIMEOUT', 5)),
+    'PG__POOL_MAX_INACTIVE_LIFETIME': float(os.environ.get('PG__POOL_MAX_INACTIVE_LIFETIME', 300)),
+    'PG__POOL_MAX_QUERIES': int(os.environ.get('PG__POOL_MAX_QUERIES', 50000)),
+    'PG__STATEMENT_CACHE_SIZE': int(os.environ.get('PG__STATEMENT_CACHE_SIZE', 100)),
+    'PG__STATEMENT_TIMEOUT': int(os.environ.get('PG__STATEMENT_TIMEOUT', 10000)),
+    'PG__LISTEN_RECONNECT_INTERVAL': float(os.environ.get('PG__LISTEN_RECONNECT_INTERVAL', 5)),
+    'PG__GEO_SIMILARITY': float(os.environ.get('PG__GEO_SIMILARITY', 0.6)),
+    'PG__PARTITIONS_AHEAD': int(os.environ.get('PG__PARTITIONS_AHEAD', 2)),
+    'PG__RETENTION_MONTHS': int(os.environ.get('PG__RETENTION_MONTHS', 0)),
+    'PG__RETENTION_DROP': os.environ.get('PG__RETENTION_DROP', '0') in ['1', 'true', 'True'],
+    'PG__PARTITIONS_INTERVAL': float(os.environ.get('PG__PARTITIONS_INTERVAL', 6 * 3600)),
+    'LOG__LEVEL': os.environ.get('LOG__LEVEL', 'info'),
+    'LOG__QUEUE_SIZE': int(os.environ.get('LOG__QUEUE_SIZE', 10000)),
+    'LOG__SAMPLING': {
+        tag.strip(): float(rate) for tag, rate in \
+        (x.rsplit(':', 1) for x in os.environ.get('LOG__SAMPLING', '').strip('"\'').split(',') if x.strip())
+    },
     'API__KEY':os.environ['API__KEY'],
     'API__EXT_PORT':os.environ['API__EXT_PORT'],
     'API__TOKEN':os.environ['API__TOKEN'],
+    'API__STREAM_CHUNK_SIZE': int(os.environ.get('API__STREAM_CHUNK_SIZE', 1000)),
+    'API__COMPRESS_MIN_SIZE': int(os.environ.get('API__COMPRESS_MIN_SIZE', 1024)),
+    'API__GZIP_LEVEL': int(os.environ.get('API__GZIP_LEVEL', 5)),
+    'API__BROTLI_QUALITY': int(os.environ.get('API__BROTLI_QUALITY', 4)),
+    'API__BACKEND_TIMEOUT': float(os.environ.get('API__BACKEND_TIMEOUT', 5)),
+    'API__BACKEND_CONNECT_TIMEOUT': float(os.environ.get('API__BACKEND_CONNECT_TIMEOUT', 2)),
+    'API__BACKEND_MAX_CONNECTIONS': int(os.environ.get('API__BACKEND_MAX_CONNECTIONS', 20)),
+    'API__BACKEND_POLL_INTERVAL': float(os.environ.get('API__BACKEND_POLL_INTERVAL', 1)),
+    'API__BACKEND_POLL_BACKOFF': float(os.environ.get('API__BACKEND_POLL_BACKOFF', 1.5)),
+    'API__BACKEND_POLL_ATTEMPTS': int(os.environ.get('API__BACKEND_POLL_ATTEMPTS', 4)),
     'DB__TABLE_WEATHER':'local_temperature',
     'DB__TABLE_MAP_GEO':'geoid',
+    'DB__TABLE_MAP_ALIAS':'geoalias',
     'DB__TABLE_MAP_CONDITION':'conditionid',
     'FILE__STATS':'agg_stats_{id}.csv',
+    'FILE__HISTORY_SNAPSHOT':'restapi_history_cache.json',
     'WEATHER_API__HISTORY':os.environ['WEATHER_API__HISTORY'],
     'WEATHER_API__CURRENT':os.environ['WEATHER_API__CURRENT'],
     'WEATHER_API__FORECAST':os.environ['WEATHER_API__FORECAST'],
     'WEATHER_API__TOKEN':os.environ['WEATHER_API__TOKEN'],
     'API__INT_POST':os.environ['API__INT_POST'],
+    'CACHE__HISTORY_MAX_BYTES': int(os.environ.get('CACHE__HISTORY_MAX_BYTES', 64 * 1024 * 1024)),
+    'CACHE__HISTORY_TTL': float(os.environ.get('CACHE__HISTORY_TTL', 0)),
+    'CACHE__FORECAST_ENABLED': os.environ.get('CACHE__FORECAST_ENABLED', '0') in ['1', 'true', 'True'],
+    'CACHE__FORECAST_MAX_AGE': int(os.environ.get('CACHE__FORECAST_MAX_AGE', 3600)),
+    'CACHE__FORECAST_MIN_TTL': int(os.environ.get('CACHE__FORECAST_MIN_TTL', 60)),
+    'CACHE__FORECAST_SWR': os.environ.get('CACHE__FORECAST_SWR', '1') in ['1', 'true', 'True'],
+    'CACHE__FORECAST_MAX_STALE': int(os.environ.get('CACHE__FORECAST_MAX_STALE', 6 * 3600)),
+    'CACHE__FORECAST_REFRESH_LOCK': int(os.environ.get('CACHE__FORECAST_REFRESH_LOCK', 120)),
+    'CACHE__HTTP_HISTORY_MAX_AGE': int(os.environ.get('CACHE__HTTP_HISTORY_MAX_AGE', 7 * 86400)),
+    'CACHE__HTTP_FORECAST_MAX_AGE': int(os.environ.get('CACHE__HTTP_FORECAST_MAX_AGE', 300)),
+    'CACHE__REDIS_HOST': os.environ.get('CACHE__REDIS_HOST', '127.0.0.1'),
+    'CACHE__REDIS_PORT': int(os.environ.get('CACHE__REDIS_PORT', 6379)),
+    'CACHE__SNAPSHOT_ENABLED': os.environ.get('CACHE__SNAPSHOT_ENABLED', '1') in ['1', 'true', 'True'],
+    'CACHE__SNAPSHOT_MAX_AGE': int(os.environ.get('CACHE__SNAPSHOT_MAX_AGE', 7 * 86400)),
+    'CACHE__WARMUP_ENABLED': os.environ.get('CACHE__WARMUP_ENABLED', '1') in ['1', 'true', 'True'],
+    'CACHE__WARMUP_LOCATIONS': int(os.environ.get('CACHE__WARMUP_LOCATIONS', 50)),
+    'CACHE__WARMUP_DAYS': int(os.environ.get('CACHE__WARMUP_DAYS', 7)),
+    'CACHE__WARMUP_CONCURRENCY': int(os.environ.get('CACHE__WARMUP_CONCURRENCY', 2)),
+    'CACHE__WARMUP_TIMEOUT': float(os.environ.get('CACHE__WARMUP_TIMEOUT', 60)),
+    'PREFETCH__ENABLED': os.environ.get('PREFETCH__ENABLED', '0') in ['1', 'true', 'True'],
+    'PREFETCH__FLUSH_INTERVAL': float(os.environ.get('PREFETCH__FLUSH_INTERVAL', 5)),
+    'PREFETCH__INTERVAL': int(os.environ.get('PREFETCH__INTERVAL', 900)),
+    'PREFETCH__HALF_LIFE': int(os.environ.get('PREFETCH__HALF_LIFE', 86400)),
+    'PREFETCH__TOP': int(os.environ.get('PREFETCH__TOP', 100)),
+    'PREFETCH__BUDGET': int(os.environ.get('PREFETCH__BUDGET', 20)),
+    'PREFETCH__DAYS': int(os.environ.get('PREFETCH__DAYS', 3)),
     'REDIS_HOST':'127.0.0.1',
     'REDIS_PORT':6379,
     'REDIS_DB':0,
     'REDIS_DB_STATUS':2,
+    'REDIS_DB_CACHE':3,
+    'REDIS__PASSWORD': os.environ.get('REDIS__PASSWORD', ''),
 }
 
 ### REDIS Settings------------------------------------------------------------------------------------------
 REDIS_HOST = configs['REDIS_HOST']
 REDIS_PORT = configs['REDIS_PORT']
 REDIS_DB = configs['REDIS_DB']
-BROKER_URL = os.environ.get('REDIS_URL', f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}")
+REDIS_AUTH = f":{quote(configs['REDIS__PASSWORD'], safe = '')}@" if configs['REDIS__PASSWORD'] else ''
+BROKER_URL = os.environ.get('REDIS_URL', f"redis://{REDIS_AUTH}{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}")
+### REDIS of backend is bound to all interfaces, so it doesn't run without password,
+### the placeholder of .env.example isn't accepted either
+REDIS_PASSWORD_PLACEHOLDER = 'change-me'
+
+
+def check_redis_password() -> None:
+    """
+    Failing at start of process which uses REDIS of backend if its password isn't set
+    """
+
+    if configs['REDIS__PASSWORD'] in ('', REDIS_PASSWORD_PLACEHOLDER):
+        raise RuntimeError('REDIS__PASSWORD is not set, REDIS of backend requires password (see .env.example)')
 
 ### CELERY settings ----------------------------------------------------------------------------------------
 CELERY_BROKER_URL = BROKER_URL
@@ -51,12 +124,26 @@ CELERY_TIMEZONE = configs['TZ']
 CELERY_ACCEPT_CONTENT = ['json', 'msgpack', 'yaml']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
+CELERY_QUEUE_HIST = 'history'
+CELERY_QUEUE_FORE = 'forecast'
 CELERY_TASK_ROUTES = {
     'celery.upload_main_stat':{'queue':'main'},
 }
-CELERYBEAT_SCHEDULE = {}
-CELERY_QUEUE_HIST = 'history'
-CELERY_QUEUE_FORE = 'forecast'
+CELERYBEAT_SCHEDULE = {
+    ### partitions of local_temperature ahead of time and retention of old ones
+    'maintain_partitions': {
+        'task': 'celery.maintain_partitions',
+        'schedule': configs['PG__PARTITIONS_INTERVAL'],
+        'options': {'queue': CELERY_QUEUE_HIST},
+    },
+}
+if configs['PREFETCH__ENABLED']:
+    ### forecasts of popular locations are refreshed before they become stale
+    CELERYBEAT_SCHEDULE['prefetch_forecast'] = {
+        'task': 'celery.prefetch_forecast',
+        'schedule': configs['PREFETCH__INTERVAL'],
+        'options': {'queue': CELERY_QUEUE_FORE},
+    }
 
 ################################### API settings ###########################################
 
@@ -0,0 +1,37 @@
+##### This is the module of processing streaming data. #####################################################
+# Author:        Anton Salyaev                                                                             #
+# Email:         asalyaev@corp.finam.ru                                                                    #
+# Description:   Logging, connectors of PostgreSQL and REDIS, encoders and helpers of services            #
+############################################################################################################# 
+import importlib
+
+### public names and their modules, they are imported at the first access 
+### (from src.utils import log doesn't import the connectors and their libraries)
+_EXPORTS = {
+    'log': 'logs',
+    'log_levels': 'logs',
+    'logger_init': 'logs',
+    'JsonFormatter': 'logs',
+    'NonBlockingQueueHandler': 'logs',
+    'NpEncoder': 'encoders',
+    'orjson_default': 'encoders',
+    'flatten_list': 'helpers',
+    'normalize_geo': 'helpers',
+    'lazy_import': 'lazy',
+    'DBpostgreSQL': 'postgres',
+    'DBredis': 'redis_broker',
+}
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str) -> object:
+
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    return getattr(importlib.import_module(f"{__name__}.{_EXPORTS[name]}"), name)
+
+
+def __dir__() -> list:
+
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,50 @@
+import sys
+import json
+from datetime import datetime
+
+
+class NpEncoder(json.JSONEncoder):
+    """ Custom encoder for numpy data types """
+    
+    def default(self, obj):
+        if isinstance(obj, datetime):
+            return obj.isoformat()
+
+        ### numpy values can be only if numpy is already imported by someone
+        np = sys.modules.get('numpy')
+        if np is None:
+            pass
+        
+        elif isinstance(obj, (np.int_, np.intc, np.intp, np.int8,
+                            np.int16, np.int32, np.int64, np.uint8,
+                            np.uint16, np.uint32, np.uint64)):
+
+            return int(obj)
+
+        elif isinstance(obj, (np.float_, np.float16, np.float32, np.float64)):
+            return float(obj)
+
+        elif isinstance(obj, (np.complex_, np.complex64, np.complex128)):
+            return {'real': obj.real, 'imag': obj.imag}
+
+        elif isinstance(obj, (np.ndarray,)):
+            return obj.tolist()
+
+        elif isinstance(obj, (np.bool_)):
+            return bool(obj)
+
+        elif isinstance(obj, (np.void)): 
+            return None
+        
+        return json.JSONEncoder.default(self, obj)
+
+
+def orjson_default(obj: object) -> object:
+    """
+    Types which are not serialized by orjson natively (Decimal, numpy scalars etc.)
+    """
+
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+
+    return str(obj)
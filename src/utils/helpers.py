@@ -0,0 +1,56 @@
+import re
+import unicodedata
+
+
+def flatten_list(xss: list = [[]]) -> list:
+    """
+    convert list of lists to flatten list
+    """
+
+    return [x for xs in xss for x in xs]
+
+
+### common abbreviations in names of locations, they are expanded by normalization
+GEO_ABBREVIATIONS = {'st': 'saint', 'ste': 'sainte', 'mt': 'mount', 'ft': 'fort'}
+### letters which are not decomposed to latin ones by unicode normalization
+GEO_TRANSLITERATION = str.maketrans({'ß': 'ss', 'ø': 'o', 'ł': 'l', 'đ': 'd', 'æ': 'ae', 'œ': 'oe', 'ı': 'i'})
+
+
+def normalize_geo(value: str = '') -> str:
+    """
+    normalized name of location like regional.normalize_geo in DB: lower case without diacritics 
+    and punctuation, common abbreviations are expanded ('St. Petersburg' -> 'saint petersburg')
+    """
+
+    value = unicodedata.normalize('NFKD', (value or '').lower().translate(GEO_TRANSLITERATION))
+    words = re.sub(r'[\W_]+', ' ', ''.join(x for x in value if not unicodedata.combining(x))).split()
+
+    return ' '.join(GEO_ABBREVIATIONS.get(x, x) for x in words)
+
+
+def similarity_geo(value: str = '', other: str = '') -> float:
+    """
+    similarity of normalized names like similarity() of pg_trgm: the share of common trigrams of words
+    (every word is padded by two spaces before and one after)
+    """
+
+    trigrams = lambda x: {f"  {w} "[i:i + 3] for w in x.split() for i in range(len(w) + 1)}
+    value, other = trigrams(value), trigrams(other)
+
+    return len(value & other) / len(value | other) if value | other else 0.0
+
+
+def is_alias_geo(query: str = '', geo_name: str = '', similarity: float = 0.6) -> bool:
+    """
+    the requested name is an alternate spelling of location ('Kiev' for 'Kyiv') if DB can't find the location 
+    by it otherwise: the same name, the beginning of name and similar names (typos) are found by the search 
+    of DB, so they aren't saved as aliases (the exact match of alias goes before the search)
+    """
+
+    query, geo_name = normalize_geo(query), normalize_geo(geo_name)
+
+    return bool(query) and not geo_name.startswith(query) and similarity_geo(query, geo_name) < similarity
+
+######################################################################################################
+####### PostgreSQL connector 
+######################################################################################################
@@ -0,0 +1,23 @@
+import sys
+import importlib.util
+
+
+def lazy_import(name: str = '') -> object:
+    """
+    Module which is executed at the first access to its attribute. Heavy libraries are imported
+    this way by modules which are shared by entry points, but needed only by some of them 
+    (like pandas and psycopg2 aren't needed by REST API and celery beat)
+    """
+
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named '{name}'", name = name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+
+    return module
@@ -0,0 +1,144 @@
+import os
+import queue
+import atexit
+import random
+import socket
+import logging
+import logging.handlers
+import orjson
+from datetime import datetime, timezone
+from src.utils.encoders import orjson_default
+
+
+log_levels = ["debug", "info", "warn", "error"]
+LOGGING_LEVELS = {'debug': logging.DEBUG, 'info': logging.INFO, 'warn': logging.WARNING, 'error': logging.ERROR}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Line of JSON from record, it's called in the writer thread (out of request handlers).
+    Records of log() have dict as message, records of libraries - text
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+
+        if isinstance(record.msg, dict):
+            log_info = record.msg
+        else:
+            log_info = {
+                "level": record.levelname.lower(),
+                "tag": record.name,
+                "message": record.getMessage(),
+            }
+        log_info = {**log_info, "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat()}
+        if getattr(record, 'dropped', 0):
+            log_info['dropped_before'] = record.dropped
+        if record.exc_text:
+            log_info['traceback'] = record.exc_text
+
+        return orjson.dumps(log_info, default = orjson_default, option = orjson.OPT_SERIALIZE_NUMPY).decode()
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Handler which only puts records to the bounded queue, they are formatted and written 
+    to file by the thread of QueueListener. If the queue is full the record is dropped 
+    (the number of dropped records is written with the next one)
+    """
+
+    def __init__(self, queue_: object = None):
+
+        super().__init__(queue_)
+        self.dropped = 0
+        self.pid = os.getpid()
+        self.path = None
+        self.listener = None
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if not isinstance(record.msg, dict) and record.args:
+            record.msg, record.args = record.getMessage(), None
+
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+
+        if self.dropped:
+            record.dropped = self.dropped
+        try:
+            self.queue.put_nowait(record)
+            self.dropped = 0
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self) -> None:
+
+        if self.listener is not None and self.pid == os.getpid():
+            self.listener.stop()
+        self.listener = None
+        super().close()
+
+
+def logger_init(location: str = '', log_path: str = os.getcwd(), log_level: str = 'info', 
+                sampling: dict = {}, queue_size: int = 10000) -> object:
+    """
+    Logging to file {location}.log through the queue: the handlers of requests only put records
+    to the queue, formatting to JSON and writing to disk are done by the background thread.
+    Records of all loggers (including libraries) are written, levels below log_level are filtered
+    :sampling - {tag: rate} the share of written records of high-volume tags (errors are always written)
+    """
+
+    location = location if location != '' else socket.gethostname()
+    path = os.path.abspath(os.path.join(log_path, f'{location}.log'))
+    root = logging.getLogger()
+    root.setLevel(LOGGING_LEVELS.get(log_level, logging.DEBUG))
+    
+    ### the handler of the same file is reused in the process, otherwise it's replaced 
+    ### (in the forked process like a worker of celery the thread of previous handler doesn't exist)
+    for handler in [x for x in root.handlers if isinstance(x, NonBlockingQueueHandler)]:
+        if handler.path == path and handler.pid == os.getpid():
+            break
+        root.removeHandler(handler)
+        handler.close()
+    else:
+        handler = NonBlockingQueueHandler(queue.Queue(queue_size))
+        handler.path = path
+        file_handler = logging.FileHandler(path)
+        file_handler.setFormatter(JsonFormatter())
+        handler.listener = logging.handlers.QueueListener(handler.queue, file_handler)
+        handler.listener.start()
+        root.addHandler(handler)
+    
+    logger = logging.getLogger(__name__)
+    logger.sampling = dict(sampling)
+    
+    return logger
+
+
+@atexit.register
+def _stop_logging() -> None:
+    """
+    Writing of records which are left in the queue at exit
+    """
+
+    for handler in [x for x in logging.getLogger().handlers if isinstance(x, NonBlockingQueueHandler)]:
+        handler.close()
+
+
+def log(logger: object = None, tag: str = 'service', log_level: str = 'info', message: str = '', data: dict = {}) -> None:
+    """
+    Structured record: the level is checked before building of the record, 
+    high-volume tags are sampled by logger.sampling, JSON is built by the writer thread
+    """
+
+    level = LOGGING_LEVELS[log_level]
+    if not logger or not logger.isEnabledFor(level):
+        return
+    rate = getattr(logger, 'sampling', {}).get(tag)
+    if rate is not None and level < logging.ERROR and random.random() >= rate:
+        return
+    
+    logger.log(level, {"level": log_level, "tag": tag, "message": message, **data})
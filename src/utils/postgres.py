@@ -1,111 +1,13 @@
-##### This is the module of processing streaming data. #####################################################
-# Author:        Anton Salyaev                                                                             #
-# Email:         asalyaev@corp.finam.ru                                                                    #
-# Description:   Necessary procedures and classes of Kafka connector and main object of data processing    #
-############################################################################################################# 
-import re
-import gc
-import os
-import ast
-import sys
 import json
-import pytz
-import redis
-import socket
-import logging
-import requests
-import itertools
-import traceback
-import functools
-import numpy as np
-import pandas as pd
-import psycopg2 as pg2
-import psycopg2.extras as extras
-from importlib import reload
-from time import time, sleep
-from dateutil.parser import parse
-from datetime import datetime, timedelta, date, timezone
+from src.utils.lazy import lazy_import
+from src.utils.encoders import NpEncoder
+from src.utils.logs import log
 
+### the connector is used by backend only, the libraries are imported at the first query
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+pg2 = lazy_import('psycopg2')
 
-class NpEncoder(json.JSONEncoder):
-    """ Custom encoder for numpy data types """
-    
-    def default(self, obj):
-        if isinstance(obj, (np.int_, np.intc, np.intp, np.int8,
-                            np.int16, np.int32, np.int64, np.uint8,
-                            np.uint16, np.uint32, np.uint64)):
-
-            return int(obj)
-
-        elif isinstance(obj, (np.float_, np.float16, np.float32, np.float64)):
-            return float(obj)
-
-        elif isinstance(obj, (np.complex_, np.complex64, np.complex128)):
-            return {'real': obj.real, 'imag': obj.imag}
-
-        elif isinstance(obj, (np.ndarray,)):
-            return obj.tolist()
-
-        elif isinstance(obj, (np.bool_)):
-            return bool(obj)
-
-        elif isinstance(obj, (np.void)): 
-            return None
-        
-        elif isinstance(obj, datetime):
-            return obj.isoformat()
-        
-        return json.JSONEncoder.default(self, obj)
-
-###################################################################################################
-### Logging
-###################################################################################################
-
-log_levels = ["debug", "info", "warn", "error"]
-
-
-def logger_init(location: str = '', log_path: str = os.getcwd(), log_level: str = 'info') -> object:
-
-    reload(logging)
-    location = location if location != '' else socket.gethostname()
-
-    logging.basicConfig(
-            filename = os.path.join(log_path, f'{location}.log'),
-            level = logging.INFO if log_level == 'info' \
-                    else logging.ERROR if log_level == 'error' \
-                    else logging.WARN if log_level == 'warn' \
-                    else logging.DEBUG,
-        )
-    return logging.getLogger(__name__)
-
-
-def log(logger: object = None, tag: str = 'service', log_level: str = 'info', message: str = '', data: dict = {}) -> None:
-
-    if log_levels.index(log_level) >= log_levels.index(log_level) and logger:
-        log_info = {
-            "level": log_level,
-            "time": datetime.now(timezone.utc).isoformat(),
-            "tag": tag,
-            "message": message,
-        }
-        log_info.update(data)
-            
-        if log_level == 'info': logger.info(json.dumps(log_info, cls=NpEncoder))
-        elif log_level == 'debug':logger.debug(json.dumps(log_info, cls=NpEncoder))
-        elif log_level == 'warn': logger.warn(json.dumps(log_info, cls=NpEncoder))
-        elif log_level == 'error':logger.error(json.dumps(log_info, cls=NpEncoder))
-
-
-def flatten_list(xss: list = [[]]) -> list:
-    """
-    convert list of lists to flatten list
-    """
-
-    return [x for xs in xss for x in xs]
-
-######################################################################################################
-####### PostgreSQL connector 
-######################################################################################################
 
 class DBpostgreSQL:
     """
@@ -125,7 +27,8 @@ class DBpostgreSQL:
 
         self.db = db_name
         self.timezone = tz
-        self.df_result = pd.DataFrame()
+        ### DataFrame of the last query_to_df
+        self.df_result = None
         self.host = host
         self.timeout = timeout if timeout > 0 else 1000
         self.user = username
@@ -142,19 +45,7 @@ class DBpostgreSQL:
     def log(self, tag: str = 'postgresql-service', log_level: str = 'info', message: str = '', data: dict = {}) -> None:
 
         if self.log_levels.index(log_level) >= self.log_levels.index(self.log_level) and self.logger:
-            #---------------------------------------------------------------------------------------
-            log_info = {
-                "level": log_level,
-                "time": datetime.now(timezone.utc).isoformat(),
-                "tag": tag,
-                "message": message,
-            }
-            log_info.update(data)
-            #------------------------------------------------------------------------------------------
-            if log_level == 'info': self.logger.info(json.dumps(log_info, cls=NpEncoder))
-            elif log_level == 'debug':self.logger.debug(json.dumps(log_info, cls=NpEncoder))
-            elif log_level == 'warn': self.logger.warn(json.dumps(log_info, cls=NpEncoder))
-            elif log_level == 'error':self.logger.error(json.dumps(log_info, cls=NpEncoder))
+            log(self.logger, tag, log_level, message, data)
     
 
     def connect(self, first = True):
@@ -184,7 +75,7 @@ class DBpostgreSQL:
             self.cur = self.conn.cursor()
     
 
-    def insert_values(self, df: pd.DataFrame = None, table: str = '', batch_size: int = 5000) -> bool:
+    def insert_values(self, df: 'pd.DataFrame' = None, table: str = '', batch_size: int = 5000) -> bool:
         """
         Using psycopg2.extras.execute_values() to insert the dataframe
         """
@@ -198,6 +89,7 @@ class DBpostgreSQL:
         ## SQL query to execute #####################################################################################
         query  = self.query_insert_template % (table, cols)
 
+        from psycopg2 import extras
         self.connect()
         len_df, down_df = df.shape[0], 0
         for i in range(np.int16(np.ceil(len_df/batch_size))):
@@ -222,10 +114,12 @@ class DBpostgreSQL:
         return True
 
 
-    def update_values(self, df: pd.DataFrame = None, table: str = '', feat_pk: str = None, batch_size: int = 5000) -> bool:
+    def update_values(self, df: 'pd.DataFrame' = None, table: str = '', feat_pk: str = None, batch_size: int = 5000,
+                      query_after: str = '') -> bool:
         """
         Using psycopg2.extras.execute_values() to insert the dataframe
         feat_pk - Primary key
+        query_after - query executed in the same transaction after every batch (maintenance of dependent tables)
         """
 
         if feat_pk is None:
@@ -245,12 +139,15 @@ class DBpostgreSQL:
                      VALUES %s ON CONFLICT ({feat_pk}) 
                      DO UPDATE SET {", ".join([f"{l} = excluded.{l}" for l in cols_no_pk])};"""
         
+        from psycopg2 import extras
         self.connect()
         len_df, down_df = df.shape[0], 0
         for i in range(np.int16(np.ceil(len_df/batch_size))):
             try:
                 extras.execute_values(self.cur, query, tuples[batch_size * i : batch_size * (i + 1)])#, template =f"({', '.join(['%s' for i in full_cols])})")
                 down_df += self.cur.rowcount
+                if query_after:
+                    self.cur.execute(query_after)
                 self.conn.commit()
             except (Exception, pg2.DatabaseError) as error:
                 self.log('update table in DB', 'error', f"Updating table {self.db}.{table} after {down_df} rows: {error}")
@@ -490,156 +387,3 @@ class DBpostgreSQL:
                 None
             self.conn.close()
             self.conn = None
-
-###################################################################################################
-###### REDIS connector ############################################################################
-###################################################################################################
-
-
-class DBredis:
-    """
-    Redis message Broker class.
-    """
-
-    def __init__(self, 
-                topic: int = 0, 
-                host: str = 'localhost', 
-                tz: str = 'Europe/Moscow', 
-                username: str = '',
-                password: str = '', 
-                retention_ms: int = 172800, 
-                log_level: str = 'error',
-                port: int = 6379, 
-                headers: dict = {}):
-
-        self.topic = topic
-        self.timezone = tz
-        self.headers = headers
-        self.host = host
-        self.retention_period = retention_ms
-        self.user = username
-        self.password = password
-        self.port = port
-        self.dc_result = {}
-        self.df_result = pd.DataFrame()
-        self.pref_msg = ''
-        self.format_dt = '%Y-%m-%d %H:%M:%S'
-        self.log_level = log_level
-        self.log_levels = ["debug", "info", "warn", "error"]
-        self.logger = None
-        self.conn = None
-
-    
-    def log(self, tag: str = 'redis-service', log_level: str = 'info', message: str = '', data: dict = {}):
-        """
-        logging with custom format:
-        tag - some tag of action
-        message - message for logging
-        data - some key-value pairs for additional data of logging
-        """
-
-        if self.log_levels.index(log_level) >= self.log_levels.index(self.log_level) and self.logger:
-            log_info = {
-                "level": log_level,
-                "time": datetime.now(timezone.utc).isoformat(),
-                "tag": tag,
-                "message": message,
-            }
-            log_info.update(data)
-            
-            if log_level == 'info': self.logger.info(json.dumps(log_info, cls=NpEncoder))
-            elif log_level == 'debug':self.logger.debug(json.dumps(log_info, cls=NpEncoder))
-            elif log_level == 'warn': self.logger.warning(json.dumps(log_info, cls=NpEncoder))
-            elif log_level == 'error':self.logger.error(json.dumps(log_info, cls=NpEncoder))
-
-
-    def connect_broker(self):
-        """
-        Connect to a Kafka broker as Producer.
-        """
-                
-        if self.conn is None and not all([self.user, self.password]):
-            try:
-                self.conn = redis.StrictRedis(
-                                    host=self.host,
-                                    port=self.port,
-                                    db=self.topic,
-                                    decode_responses=True,
-                                    charset='utf-8',
-                                    password=self.password,
-                                    )
-                if self.timezone:
-                    self.conn.set('timezone', self.timezone)
-                if self.headers != {}:
-                    for k,v in self.headers.items():
-                        _ = self.conn.set(k, self.change_format_to_str(v))
-                    
-            except Exception as error:
-                self.log('connection to broker', 'error', f"{self.pref_msg}Connection to Broker {self.host}: {error}")
-        
-    
-    def change_format_to_str(self, value: object = None) -> object:
-        """
-        decoding values
-        """
-
-        if isinstance(value, bool):
-            value = 1 if value else 0
-        elif isinstance(value, bytes):
-            value = value.decode()
-        elif value is None:
-            value = '0'
-        elif isinstance(value, (list, dict)):
-            value = json.dumps(value, cls = NpEncoder)
-
-        return value
-
-
-    def publish_message(self, key, value) -> bool:
-        """
-        publishing data to Broker
-        """
-
-        load = False
-        self.connect_broker()
-        if self.conn:
-            try:
-                load = self.conn.setex(key, self.retention_period, self.change_format_to_str(value))
-            except Exception as error:
-                self.log('publishing to broker', 'error', f"Publishing message to topic {self.topic}: {error}")
-        #-------------------------------------------------------------------------------------------------------
-        self.close()
-
-        return load
-
-
-    def reading_message(self, key, temp_dc = {}) -> dict:
-        """
-        messages from que for transform to dict
-        """
-
-        self.connect_broker()
-        if temp_dc == {}:
-            self.dc_result = {key:None}
-        elif isinstance(temp_dc, dict):
-            self.dc_result = temp_dc
-            self.dc_result[key] = None
-        else:
-            self.dc_result = {key:None}
-        #------------------------------------------------------------------------------------------------------------
-        if self.conn:
-            try:
-                self.dc_result[key] = self.change_format_to_str(self.conn.get(key))
-            except Exception as error:
-                self.log('consuming from broker', 'error', f"reading message ({key}) from topic {self.topic}: {error}")
-        #-------------------------------------------------------------------------------------------------------------        
-        self.close()
-
-        return self.dc_result
-
-    
-    def close(self):
-
-        if self.conn:
-            self.conn.close()
-            self.conn = None
@@ -0,0 +1,143 @@
+import json
+from src.utils.lazy import lazy_import
+from src.utils.encoders import NpEncoder
+from src.utils.logs import log
+
+redis = lazy_import('redis')
+
+
+class DBredis:
+    """
+    Redis message Broker class.
+    """
+
+    def __init__(self, 
+                topic: int = 0, 
+                host: str = 'localhost', 
+                tz: str = 'Europe/Moscow', 
+                username: str = '',
+                password: str = '', 
+                retention_ms: int = 172800, 
+                log_level: str = 'error',
+                port: int = 6379, 
+                headers: dict = {}):
+
+        self.topic = topic
+        self.timezone = tz
+        self.headers = headers
+        self.host = host
+        self.retention_period = retention_ms
+        self.user = username
+        self.password = password
+        self.port = port
+        self.dc_result = {}
+        self.pref_msg = ''
+        self.format_dt = '%Y-%m-%d %H:%M:%S'
+        self.log_level = log_level
+        self.log_levels = ["debug", "info", "warn", "error"]
+        self.logger = None
+        self.conn = None
+
+    
+    def log(self, tag: str = 'redis-service', log_level: str = 'info', message: str = '', data: dict = {}):
+        """
+        logging with custom format:
+        tag - some tag of action
+        message - message for logging
+        data - some key-value pairs for additional data of logging
+        """
+
+        if self.log_levels.index(log_level) >= self.log_levels.index(self.log_level) and self.logger:
+            log(self.logger, tag, log_level, message, data)
+
+
+    def connect_broker(self):
+        """
+        Connect to a Kafka broker as Producer.
+        """
+                
+        if self.conn is None and not all([self.user, self.password]):
+            try:
+                self.conn = redis.StrictRedis(
+                                    host=self.host,
+                                    port=self.port,
+                                    db=self.topic,
+                                    decode_responses=True,
+                                    charset='utf-8',
+                                    password=self.password,
+                                    )
+                if self.timezone:
+                    self.conn.set('timezone', self.timezone)
+                if self.headers != {}:
+                    for k,v in self.headers.items():
+                        _ = self.conn.set(k, self.change_format_to_str(v))
+                    
+            except Exception as error:
+                self.log('connection to broker', 'error', f"{self.pref_msg}Connection to Broker {self.host}: {error}")
+        
+    
+    def change_format_to_str(self, value: object = None) -> object:
+        """
+        decoding values
+        """
+
+        if isinstance(value, bool):
+            value = 1 if value else 0
+        elif isinstance(value, bytes):
+            value = value.decode()
+        elif value is None:
+            value = '0'
+        elif isinstance(value, (list, dict)):
+            value = json.dumps(value, cls = NpEncoder)
+
+        return value
+
+
+    def publish_message(self, key, value) -> bool:
+        """
+        publishing data to Broker
+        """
+
+        load = False
+        self.connect_broker()
+        if self.conn:
+            try:
+                load = self.conn.setex(key, self.retention_period, self.change_format_to_str(value))
+            except Exception as error:
+                self.log('publishing to broker', 'error', f"Publishing message to topic {self.topic}: {error}")
+        #-------------------------------------------------------------------------------------------------------
+        self.close()
+
+        return load
+
+
+    def reading_message(self, key, temp_dc = {}) -> dict:
+        """
+        messages from que for transform to dict
+        """
+
+        self.connect_broker()
+        if temp_dc == {}:
+            self.dc_result = {key:None}
+        elif isinstance(temp_dc, dict):
+            self.dc_result = temp_dc
+            self.dc_result[key] = None
+        else:
+            self.dc_result = {key:None}
+        #------------------------------------------------------------------------------------------------------------
+        if self.conn:
+            try:
+                self.dc_result[key] = self.change_format_to_str(self.conn.get(key))
+            except Exception as error:
+                self.log('consuming from broker', 'error', f"reading message ({key}) from topic {self.topic}: {error}")
+        #-------------------------------------------------------------------------------------------------------------        
+        self.close()
+
+        return self.dc_result
+
+    
+    def close(self):
+
+        if self.conn:
+            self.conn.close()
+            self.conn = None
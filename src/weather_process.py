@@ -1,5 +1,15 @@
 """Weather API processing module."""
-from src.utils import *
+import gc
+import pandas as pd
+from datetime import date
+from src.utils.logs import log
+from src.utils.helpers import flatten_list, is_alias_geo
+from src.queries import (
+                        QUERY_DAY_COMPLETENESS_TEMPLATE,
+                        QUERY_DAILY_WEATHER_TEMPLATE,
+                        QUERY_CREATE_PARTITIONS_TEMPLATE,
+                        QUERY_RETIRE_PARTITIONS_TEMPLATE,
+                        )
 
 
 class WethearMetadata:
@@ -134,9 +144,60 @@ class WethearMetadata:
 
 #########################################################################################################
 
-def processing_data_and_uploading(logger: object = None, db: object = None, configs: dict = None, response: object = None) -> None:
+def query_day_completeness(geo_id: int = 0, datetimes: pd.Series = None) -> str:
+    """
+    Query of updating regional.day_completeness and regional.daily_weather for days of uploaded hours
+    """
+
+    days = sorted(set(pd.to_datetime(datetimes).dt.strftime('%Y-%m-%d')))
+    pars = {
+        'geo_id': int(geo_id),
+        'days': ','.join(f"'{x}'" for x in days),
+    }
+
+    return '\n'.join([QUERY_DAY_COMPLETENESS_TEMPLATE.format(**pars), QUERY_DAILY_WEATHER_TEMPLATE.format(**pars)])
+
+
+def query_create_partitions(datetimes: pd.Series = None) -> str:
+    """
+    Query of creating partitions of regional.local_temperature for months of uploaded hours
+    """
+
+    datetimes = pd.to_datetime(datetimes)
+
+    return QUERY_CREATE_PARTITIONS_TEMPLATE.format(
+        date_from = datetimes.min().strftime('%Y-%m-%d'),
+        date_to = datetimes.max().strftime('%Y-%m-%d'),
+    )
+
+
+def queries_maintain_partitions(today: date = None, months_ahead: int = 2, 
+                                retention_months: int = 0, drop: bool = False) -> list:
+    """
+    Queries of maintenance of partitions: creating them for the current month and months_ahead next ones,
+    retiring of months older than retention_months before the current one (0 - all months are kept)
+    """
+
+    month = pd.Timestamp(today or date.today()).to_period('M')
+    queries = [QUERY_CREATE_PARTITIONS_TEMPLATE.format(
+        date_from = month.start_time.strftime('%Y-%m-%d'),
+        date_to = (month + months_ahead).start_time.strftime('%Y-%m-%d'),
+    )]
+    if retention_months > 0:
+        queries.append(QUERY_RETIRE_PARTITIONS_TEMPLATE.format(
+            keep_from = (month - retention_months).start_time.strftime('%Y-%m-%d'),
+            drop = 'true' if drop else 'false',
+        ))
+
+    return queries
+
+
+def processing_data_and_uploading(logger: object = None, db: object = None, configs: dict = None, 
+                                  response: object = None, location: str = None) -> None:
     """
     functionality of processing weather data for history and forecast endpoints
+    :location - the name of location from request to API, it's saved as alternate spelling of location
+                if the search of DB doesn't find the location by it (not prefix or similar name)
     """
     
     dfw = WethearMetadata(response.json())
@@ -168,6 +229,15 @@ def processing_data_and_uploading(logger: object = None, db: object = None, conf
             query = f"SELECT id FROM {table_db}", 
             condition = dfw.data[col_].to_dict('records')[0]
         )
+    
+    if go_on and geo_id_data and location \
+        and is_alias_geo(location, dfw.data[col_]['geo_name'].iloc[0], configs['PG__GEO_SIMILARITY']):
+        log(logger, f'processing map: {col_}', 'info', 'saving alias of location', {'alias': location})
+        ### it isn't critical for uploading of data, so the result is only logged
+        db.insert_if_not_exist(
+            table = configs['PG__SCHEMA']+'.'+configs['DB__TABLE_MAP_ALIAS'],
+            values = {'alias': location.strip().lower(), 'geo_id': geo_id_data[0][0]}
+        )
                 
     ########### ---------------------------------------------------------------------
     
@@ -203,16 +273,21 @@ def processing_data_and_uploading(logger: object = None, db: object = None, conf
         log(logger, f'processing main table', 'info', str(dfw.data[dfw.feature].shape))
         ### mapping geo_id ---------------------------------------------------------
         dfw.data[dfw.feature]['geo_id'] = geo_id_data[0][0]
-        ### saving to DB main DF ---------------------------------------------------
+        ### partitions for months of data (history can be older than existing ones)
+        _, go_on = db.select_rows(query = query_create_partitions(dfw.data[dfw.feature]['datetime']))
+    else:
+        log(logger, f'processing main table', 'error', dfw.msg)
+        go_on = False
+
+    if go_on:
+        ### saving to DB main DF with completeness and aggregates of uploaded days -
         go_on = db.update_values(
             df = dfw.data[dfw.feature],
             table = f"{configs['PG__SCHEMA']}.{configs['DB__TABLE_WEATHER']}",
-            feat_pk = 'geo_id,datetime'
+            feat_pk = 'geo_id,datetime',
+            query_after = query_day_completeness(geo_id_data[0][0], dfw.data[dfw.feature]['datetime'])
         )
-    else:
-        log(logger, f'processing main table', 'error', dfw.msg)
-        go_on = False
-                
+
     if not go_on:
         log(logger, 'processing instance', 'error',  f"{date_}: uncorrect")
         
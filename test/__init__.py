@@ -1,2 +1,15 @@
 """Weather API tests"""
-from .test_weather_process import *
\ No newline at end of file
+from .test_weather_process import *
+from .test_cache import *
+from .test_single_flight import *
+from .test_responses import *
+from .test_models import *
+from .test_dimensions import *
+from .test_bench import *
+from .test_metrics import *
+from .test_logging import *
+from .test_load import *
+from .test_importtime import *
+from .test_popularity import *
+from .test_warmup import *
+from .test_forecast import *
@@ -0,0 +1,51 @@
+import pytest
+from datetime import date
+from bench.queries import summarize_plan, compare, cases
+from src.queries import QUERY_HISTORY_DATES, QUERY_HISTORY_BATCH
+
+
+
+@pytest.fixture
+def explain_history():
+    return [{'Plan': {'Node Type': 'Sort', 'Actual Rows': 168, 'Shared Hit Blocks': 40, 'Shared Read Blocks': 2,
+                'Plans': [{'Node Type': 'Nested Loop', 'Plans': [
+                    {'Node Type': 'Function Scan'},
+                    {'Node Type': 'Append', 'Plans': [
+                        {'Node Type': 'Index Scan', 'Relation Name': 'local_temperature_y2023m07', 'Actual Loops': 0},
+                        {'Node Type': 'Index Scan', 'Relation Name': 'local_temperature_y2023m08', 'Actual Loops': 1},
+                    ]},
+                    {'Node Type': 'Seq Scan', 'Relation Name': 'geoid'},
+                ]}]},
+             'Planning Time': 0.3, 'Execution Time': 1.2}]
+#------------------------------------------------------------------------------------------------------------------
+
+def test__summarize_plan(explain_history):
+
+    summary = summarize_plan(explain_history)
+
+    assert summary['execution_ms'] == 1.2
+    assert summary['rows'] == 168
+    assert summary['shared_hit'] + summary['shared_read'] == 42
+    assert summary['seq_scans'] == ['geoid']
+    assert summary['partitions'] == 1
+
+
+def test__compare_with_baseline(explain_history):
+
+    base = summarize_plan(explain_history)
+    slow = {**base, 'execution_ms': 30.0, 'seq_scans': ['geoid', 'local_temperature_y2023m08'], 'partitions': 12}
+
+    assert compare({'history_week': base}, {'history_week': base}) == []
+    assert compare({'history_week': {**base, 'execution_ms': 1.9}}, {'history_week': base}) == []
+    assert len(compare({'history_week': slow}, {'history_week': base})) == 3
+    assert compare({'forecast': slow}, {'history_week': base}) == []
+
+
+def test__cases():
+
+    queries = cases([1, 2, 3], date(2023, 8, 16))
+
+    assert queries['history_week'][:2] == (QUERY_HISTORY_DATES, 2)
+    assert queries['history_week'][3:] == (date(2023, 8, 9), date(2023, 8, 15))
+    assert queries['history_batch'][0] == QUERY_HISTORY_BATCH
+    assert len(queries['history_batch'][1]) == len(queries['history_batch'][2]) == len(queries['history_batch'][3]) == 21
@@ -0,0 +1,78 @@
+import pytest
+from time import sleep
+from src.data.cache import LRUCache, RedisJSONCache, sizeof_rows
+
+
+@pytest.fixture
+def rows_day():
+    return [{'datetime': f'2023-08-15 {h:02d}:00', 'temperature': 17.8, 'geo_location': 'London, United Kingdom'} \
+            for h in range(24)]
+#------------------------------------------------------------------------------------------------------------------
+
+def test__lru_eviction_by_size(rows_day):
+    
+    size = sizeof_rows(rows_day)
+    cache = LRUCache(max_bytes = size * 2)
+    cache.set(('london', '', '2023-08-15'), rows_day)
+    cache.set(('london', '', '2023-08-16'), rows_day)
+    assert cache.get(('london', '', '2023-08-15')) == rows_day
+    cache.set(('london', '', '2023-08-17'), rows_day)
+
+    assert len(cache) == 2
+    assert cache.size <= cache.max_bytes
+    assert ('london', '', '2023-08-16') not in cache
+    assert ('london', '', '2023-08-15') in cache
+
+
+def test__ttl_expiration(rows_day):
+
+    cache = LRUCache(max_bytes = 10 ** 6, ttl = 0.01)
+    cache.set('key', rows_day)
+    sleep(0.02)
+
+    assert cache.get('key') is None
+    assert cache.size == 0
+    assert cache.misses == 1
+
+
+def test__disabled_cache(rows_day):
+
+    cache = LRUCache(max_bytes = 0)
+
+    assert cache.set('key', rows_day) is False
+    assert cache.get('key') is None
+
+
+def test__key_geo_normalization():
+
+    assert LRUCache.key_geo(' London ', None) == LRUCache.key_geo('london', '') == ('london', '')
+
+
+def test__redis_cache_keys():
+
+    cache = RedisJSONCache(prefix = 'weather:forecast')
+
+    assert cache.key('London ', 'United Kingdom', 3) == 'weather:forecast:london:united kingdom:3'
+    assert cache.key_index('London, United Kingdom') == 'weather:forecast:index:london, united kingdom'
+
+
+def test__redis_cache_disabled(rows_day):
+
+    cache = RedisJSONCache(enabled = False)
+
+    assert cache.get('key') is None
+    assert cache.set('key', rows_day, ttl = 60, geo_location = 'London, United Kingdom') is False
+    assert cache.invalidate('London, United Kingdom') == 0
+    assert cache.claim('lock', ttl = 60) is True
+    cache.release('lock')
+    assert cache.conn is None
+
+
+def test__redis_clients_authenticate():
+
+    pytest.importorskip('redis')
+    from src.data.popularity import PopularityTracker
+
+    for client in (RedisJSONCache(password = 'secret'), PopularityTracker(password = 'secret')):
+        assert client.connect().connection_pool.connection_kwargs['password'] == 'secret'
+    assert RedisJSONCache(password = '').connect().connection_pool.connection_kwargs['password'] is None
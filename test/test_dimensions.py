@@ -0,0 +1,77 @@
+import json
+import pytest
+from src.utils.helpers import normalize_geo, similarity_geo, is_alias_geo
+from src.data.dimensions import DimensionIndex
+
+
+@pytest.fixture
+def index():
+    index = DimensionIndex()
+    index.set_geo([
+        {'id': 1, 'geo_name': 'London', 'geo_country': 'United Kingdom'},
+        {'id': 2, 'geo_name': 'London', 'geo_country': 'Canada'},
+        {'id': 3, 'geo_name': 'Londrina', 'geo_country': 'Brazil'},
+        {'id': 4, 'geo_name': 'Paris', 'geo_country': 'France'},
+        {'id': 5, 'geo_name': 'Kyiv', 'geo_country': 'Ukraine'},
+        {'id': 6, 'geo_name': 'Saint Petersburg', 'geo_country': 'Russia'},
+        {'id': 7, 'geo_name': 'São Paulo', 'geo_country': 'Brazil'},
+    ])
+    index.set_aliases([{'alias_norm': 'kiev', 'geo_id': 5}])
+    index.set_conditions([{'id': 1000, 'condition_str': 'Sunny'}])
+    return index
+#------------------------------------------------------------------------------------------------------------------
+
+def test__resolving_of_geo(index):
+
+    assert index.resolve_geo('london') == 2
+    assert index.resolve_geo(' London ', 'united kingdom') == 1
+    assert index.resolve_geo('lond') is None
+    assert index.resolve_geo('lond', prefix = True) == 2
+    assert index.resolve_geo('lond', 'bra', prefix = True) == 3
+    assert index.resolve_geo('berlin') is None
+    assert index.geo_location(1) == 'London, United Kingdom'
+    assert index.resolve_geo('...', prefix = True) is None
+
+
+def test__normalized_names_and_aliases(index):
+
+    assert normalize_geo(' St. Petersburg ') == 'saint petersburg'
+    assert normalize_geo('Łódź') == 'lodz'
+    assert index.resolve_geo('St Petersburg') == 6
+    assert index.resolve_geo('sao-paulo', 'BRAZIL') == 7
+    assert index.resolve_geo('Kiev') == 5
+    assert index.resolve_geo('Kiev', 'ukr', prefix = True) == 5
+    assert index.resolve_geo('Kiev', 'France') is None
+
+
+def test__changes_by_notifications(index):
+
+    notify = lambda table, op, row: index.on_notify(None, 0, index.channel, json.dumps({'table': table, 'op': op, 'row': row}))
+    notify('geoid', 'INSERT', {'id': 8, 'geo_name': 'Berlin', 'geo_country': 'Germany', 
+                               'geo_name_norm': 'berlin', 'geo_country_norm': 'germany'})
+    notify('geoalias', 'INSERT', {'alias': 'berlin-mitte', 'alias_norm': 'berlin mitte', 'geo_id': 8})
+    notify('geoalias', 'DELETE', {'alias': 'kiev', 'alias_norm': 'kiev', 'geo_id': 5})
+    notify('geoid', 'UPDATE', {'id': 4, 'geo_name': 'Paris', 'geo_country': 'France, Europe'})
+    notify('geoid', 'DELETE', {'id': 2, 'geo_name': 'London', 'geo_country': 'Canada'})
+    notify('conditionid', 'INSERT', {'id': 1003, 'condition_str': 'Partly cloudy'})
+    index.on_notify(None, 0, index.channel, 'not a json')
+
+    assert index.resolve_geo('berlin') == 8
+    assert index.resolve_geo('Berlin Mitte') == 8
+    assert index.resolve_geo('kiev') is None
+    assert index.geo_location(4) == 'Paris, France, Europe'
+    assert index.resolve_geo('london') == 1
+    assert len(index.names) == len(index.geo) == 7
+    assert index.conditions[1003] == 'Partly cloudy'
+    assert index.notifications == 7
+
+
+def test__aliases_of_requested_names():
+
+    assert is_alias_geo('Kiev', 'Kyiv')
+    assert not is_alias_geo(' kyiv ', 'Kyiv')
+    ### the search of DB finds them by the beginning of name or by similarity
+    assert not is_alias_geo('Lond', 'London')
+    assert not is_alias_geo('St Petersburgh', 'Saint Petersburg')
+    assert similarity_geo('londn', 'london') == pytest.approx(4 / 9)
+    assert not is_alias_geo('londn', 'London', similarity = 0.3)
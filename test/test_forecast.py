@@ -0,0 +1,138 @@
+import os
+import pytz
+import asyncio
+import pytest
+from datetime import datetime, date, timedelta
+from dotenv import dotenv_values
+
+### settings of service are required by the routes, the example of docker-compose is taken for absent ones
+for k, v in dotenv_values(os.path.join(os.path.dirname(__file__), '..', '.env.example')).items():
+    os.environ.setdefault(k, v or '')
+
+from src.settings import configs
+from src.data import get_data
+from src.data.dimensions import DimensionIndex
+from src.data.get_data import (
+    WeatherDataFromDB, WeatherDataFromAPI, forecast_age, 
+    history_cache, key_location, get_cached_days, warm_up_locations
+)
+from src.api.v1.routes import geo
+
+
+class FakeResponse:
+
+    def __init__(self, status_code: int = 200, body: dict = {}):
+        self.status_code = status_code
+        self.body = body
+        self.text = str(body)
+
+    def json(self) -> dict:
+        return self.body
+
+
+class FakeClient:
+    """
+    Backend which starts the task and reports its status
+    """
+
+    def __init__(self, status: str = 'SUCCESS'):
+        self.status = status
+
+    async def post(self, url, json = None):
+        return FakeResponse(202, {'task_id': 'tid'})
+
+    async def get(self, url):
+        return FakeResponse(200, {'current_task_status': {'task_status': self.status}})
+
+
+def now() -> datetime:
+    ### datetime_update is saved in the TZ of service without time zone
+    return datetime.now().astimezone(pytz.timezone(configs['TZ'])).replace(tzinfo = None, microsecond = 0)
+
+
+def records(updated: datetime = None, days: int = 3) -> list:
+    return [{
+        'datetime': datetime.combine(date.today() + timedelta(days = x), datetime.min.time()),
+        'temperature': 17.8,
+        'geo_location': 'London, United Kingdom',
+        'check_date': date.today() + timedelta(days = x),
+        'datetime_update': updated,
+    } for x in range(days)]
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    """
+    Expired forecast in DB, the shared cache records what is saved to it
+    """
+
+    expired = now() - timedelta(seconds = configs['CACHE__FORECAST_MAX_AGE'] \
+        + configs['CACHE__FORECAST_MAX_STALE'] + 3600)
+    cached = []
+
+    async def get_forecast(self, prefix = False, **pars):
+        return records(expired)
+
+    monkeypatch.setattr(WeatherDataFromDB, 'get_forecast_by_locations', get_forecast)
+    monkeypatch.setattr(geo, 'cache_forecast', lambda *args: cached.append(args))
+    monkeypatch.setattr(geo.forecast_cache, 'enabled', True)
+    monkeypatch.setitem(configs, 'CACHE__FORECAST_SWR', True)
+    monkeypatch.setitem(configs, 'API__BACKEND_POLL_INTERVAL', 0)
+    monkeypatch.setitem(configs, 'API__BACKEND_POLL_ATTEMPTS', 2)
+
+    return cached
+#------------------------------------------------------------------------------------------------------------------
+
+@pytest.mark.parametrize('status', ['FAILURE', 'PENDING'])
+def test__expired_forecast_is_not_cached_after_failed_refresh(monkeypatch, backend, status):
+
+    monkeypatch.setattr(WeatherDataFromAPI, 'client', FakeClient(status))
+    pars = {'geo_name': 'London', 'days': 3}
+    data, metainfo, updated = asyncio.run(geo._load_forecast(pars, 'key', 'validator'))
+
+    assert len(data) == 3 and metainfo['backend_task'] == 'tid'
+    assert updated is None
+    assert backend == []
+
+
+def test__expired_forecast_is_cached_after_refresh(monkeypatch, backend):
+
+    refreshed = now()
+
+    async def get_forecast(self, prefix = False, **pars):
+        return records(refreshed if prefix else refreshed - timedelta(days = 1))
+
+    monkeypatch.setattr(WeatherDataFromDB, 'get_forecast_by_locations', get_forecast)
+    monkeypatch.setattr(WeatherDataFromAPI, 'client', FakeClient('SUCCESS'))
+    data, metainfo, updated = asyncio.run(geo._load_forecast({'geo_name': 'London', 'days': 3}, 'key', 'validator'))
+
+    assert updated == refreshed and forecast_age(updated) < 60
+    assert [x[:2] for x in backend] == [('key', 'validator')]
+
+
+def test__warmed_up_location_is_shared_by_its_names(monkeypatch):
+
+    index = DimensionIndex()
+    index.set_geo([
+        {'id': 1, 'geo_name': 'Kyiv', 'geo_country': 'Ukraine'},
+        {'id': 2, 'geo_name': 'London', 'geo_country': 'United Kingdom'},
+    ])
+    index.set_aliases([{'alias_norm': 'kiev', 'geo_id': 1}])
+    yesterday = date.today() - timedelta(days = 1)
+
+    async def get_history(self, prefix = False, **pars):
+        return [{'datetime': datetime.combine(yesterday, datetime.min.time()), 'temperature': 17.8,
+                 'geo_location': 'Kyiv, Ukraine', 'check_date': yesterday}]
+
+    monkeypatch.setattr(get_data, 'dimensions', index)
+    monkeypatch.setattr(history_cache, 'max_bytes', 10 ** 6)
+    monkeypatch.setattr(get_data.forecast_cache, 'enabled', False)
+    monkeypatch.setattr(WeatherDataFromDB, 'get_history_by_dates_and_locations', get_history)
+    history_cache.clear()
+
+    assert asyncio.run(warm_up_locations([1, 3], days = 1)) == 1
+    for name, country in (('Kyiv', 'Ukraine'), ('kyiv', None), ('Kiev', None)):
+        assert key_location(name, country) == (1,)
+        assert list(get_cached_days(key_location(name, country), [yesterday.isoformat()])) == [yesterday.isoformat()]
+    assert key_location('Berlin', 'Germany') == ('berlin', 'germany')
+    history_cache.clear()
@@ -0,0 +1,38 @@
+import sys
+import subprocess
+from bench.importtime import parse_importtime, check
+
+
+STDERR = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:      2500 |     510000 |   pandas
+import time:      1500 |      80000 | src.utils.postgres
+some warning
+"""
+
+
+def test__parse_and_check():
+
+    modules = parse_importtime(STDERR)
+
+    assert modules == {'_io': 0.12, 'pandas': 510.0, 'src.utils.postgres': 80.0}
+    assert check('backend', 80.0, modules, 100, ['psycopg2']) == []
+    assert check('backend', 180.0, modules, 100, ['pandas', 'psycopg2']) == [
+        'backend: 180 ms > budget 100 ms',
+        'backend: imports pandas (510 ms)',
+    ]
+
+
+def test__lazy_utils():
+
+    ### submodules are imported only when the packages are executed, not by lazy_import
+    code = (
+        "import sys\n"
+        "from src.utils import log, DBpostgreSQL, DBredis\n"
+        "assert DBpostgreSQL(db_name = 'weather').df_result is None\n"
+        "print(','.join(m for m in ('pandas.core', 'numpy.core', 'psycopg2._psycopg', 'redis.client') if m in sys.modules))\n"
+    )
+    result = subprocess.run([sys.executable, '-c', code], capture_output = True, text = True)
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ''
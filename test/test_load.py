@@ -0,0 +1,53 @@
+import random
+import pytest
+from datetime import date, timedelta
+from fastapi.testclient import TestClient
+from bench.load import build_workload, parse_mix, percentile, summarize, compare, stub_app, BURST_SIZE
+
+
+
+def test__build_workload():
+
+    today = date(2023, 8, 16)
+    workload = build_workload(50, 3, 500, today = today, rng = random.Random(1))
+    scenarios = [x[0] for x in workload]
+    oldest = today - timedelta(days = 365 * 3 - 7)
+
+    assert len(workload) == 500
+    assert workload == build_workload(50, 3, 500, today = today, rng = random.Random(1))
+    assert {'history_hot', 'history_cold', 'forecast_burst', 'history_batch'} <= set(scenarios)
+    assert scenarios[scenarios.index('forecast_burst'):][:BURST_SIZE] == ['forecast_burst'] * BURST_SIZE
+    for scenario, path, body in workload:
+        if scenario == 'history_cold':
+            assert date.fromisoformat(body['start']) >= oldest - timedelta(days = 6)
+        elif scenario == 'history_missing':
+            assert date.fromisoformat(body['end']) < oldest
+    assert {x[0] for x in build_workload(50, 3, 50, parse_mix('history_hot:1'), today)} == {'history_hot'}
+    with pytest.raises(ValueError):
+        parse_mix('history_hot:1,unknown:1')
+
+
+def test__summarize_and_compare():
+
+    samples = [('history_hot', 200, x / 1000) for x in range(1, 101)] + [('forecast_burst', 500, 0.2)]
+    summary = summarize(samples, elapsed = 2.0)
+    slower = {**summary['history_hot'], 'p95_ms': 150.0}
+
+    assert percentile([], 0.5) == 0.0
+    assert summary['history_hot']['p50_ms'] == 50.0 and summary['history_hot']['p99_ms'] == 99.0
+    assert summary['all']['requests'] == 101 and summary['all']['errors'] == 1
+    assert summary['all']['rps'] == 50.5
+    assert compare({'8': summary}, {'8': summary}) == []
+    assert compare({'8': {'history_hot': slower}}, {'8': summary}) == ['8/history_hot: p95 95.0 -> 150.0 ms']
+    assert len(compare({'8': {'all': {**summary['all'], 'rps': 10.0, 'errors': 3}}}, {'8': summary})) == 2
+
+
+def test__stub_of_backend(monkeypatch):
+
+    monkeypatch.setenv('BENCH_TASK_SECONDS', '0')
+    client = TestClient(stub_app)
+    response = client.post('/tasks', json = {'task_type': 'upload_history'})
+    status = client.get(f"/tasks/{response.json()['task_id']}").json()['current_task_status']
+
+    assert response.status_code == 202
+    assert status['task_status'] == 'SUCCESS'
@@ -0,0 +1,84 @@
+import json
+import queue
+import logging
+import pytest
+import numpy as np
+from datetime import date
+from src.utils.logs import logger_init, log, NonBlockingQueueHandler, JsonFormatter
+
+
+def _close_handlers():
+    
+    root = logging.getLogger()
+    for handler in [x for x in root.handlers if isinstance(x, NonBlockingQueueHandler)]:
+        root.removeHandler(handler)
+        handler.close()
+
+
+@pytest.fixture
+def read_log(tmp_path):
+    """
+    Records of file after writing of all records from queue
+    """
+    
+    level = logging.getLogger().level
+    def read(location = 'test'):
+        _close_handlers()
+        return [json.loads(x) for x in (tmp_path / f'{location}.log').read_text().splitlines()]
+    
+    yield read
+    _close_handlers()
+    logging.getLogger().setLevel(level)
+#------------------------------------------------------------------------------------------------------------------
+
+def test__log_through_queue(tmp_path, read_log):
+
+    logger = logger_init('test', str(tmp_path), 'info')
+    assert logger_init('test', str(tmp_path), 'info') is logger
+    log(logger, 'data from DB', 'debug', 'Got query', {'query': 'SELECT 1'})
+    log(logger, 'data from DB', 'info', 'rows', {'args': (7, date(2023, 8, 15)), 'count': np.int64(24)})
+    logging.getLogger('asyncpg').warning('connection %s lost', 'pool-1')
+    records = read_log()
+
+    assert [x['tag'] for x in records] == ['data from DB', 'asyncpg']
+    assert records[0]['args'] == [7, '2023-08-15'] and records[0]['count'] == 24
+    assert records[1]['message'] == 'connection pool-1 lost' and records[1]['level'] == 'warning'
+    assert all('time' in x for x in records)
+
+
+def test__sampling_of_tags(tmp_path, read_log):
+
+    logger = logger_init('test', str(tmp_path), 'info', sampling = {'parsing params': 0})
+    for _ in range(10):
+        log(logger, 'parsing params', 'info', 'Got next input params')
+    log(logger, 'parsing params', 'error', 'Bad params')
+    log(logger, 'data from API', 'info', 'Got body')
+
+    assert [x['message'] for x in read_log()] == ['Bad params', 'Got body']
+
+
+def test__full_queue_drops_records():
+
+    handler = NonBlockingQueueHandler(queue.Queue(1))
+    record = lambda x: logging.LogRecord('test', logging.INFO, '', 0, {'level': 'info', 'tag': 't', 'message': x}, None, None)
+    for x in ['first', 'second', 'third']:
+        handler.handle(record(x))
+    handler.queue.get_nowait()
+    handler.handle(record('fourth'))
+    line = json.loads(JsonFormatter().format(handler.queue.get_nowait()))
+
+    assert line['message'] == 'fourth' and line['dropped_before'] == 2
+
+
+def test__records_of_data_layer(tmp_path, read_log):
+
+    from src.data.cache import RedisJSONCache
+    from src.data.warmup import WarmUp
+
+    logger = logger_init('test', str(tmp_path), 'error')
+    RedisJSONCache(logger = logger).log('reading from cache', 'key: timeout')
+    WarmUp(logger = logger).log('warm-up', 'info', 'finished', {'snapshot': 3})
+    records = read_log()
+
+    assert len(records) == 1
+    assert records[0]['tag'] == 'reading from cache' and records[0]['message'] == 'key: timeout'
@@ -0,0 +1,37 @@
+import pytest
+from src.metrics import (
+    API_STAGE_SECONDS, API_CACHE_RESPONSES, 
+    render, endpoint_label, clear_multiprocess_dir
+)
+
+
+
+def test__render_metrics(monkeypatch):
+
+    monkeypatch.delenv('PROMETHEUS_MULTIPROC_DIR', raising = False)
+    API_STAGE_SECONDS.labels('db_query').observe(0.003)
+    API_CACHE_RESPONSES.labels('history', 'complete').inc()
+    content, media_type = render()
+    lines = content.decode().splitlines()
+
+    assert media_type.startswith('text/plain')
+    assert 'weather_api_stage_seconds_bucket{le="0.005",stage="db_query"} 1.0' in lines
+    assert any(x.startswith('weather_api_cache_responses_total{endpoint="history",result="complete"}') for x in lines)
+
+
+def test__endpoint_label():
+
+    known = {'/weather/history', '/metrics'}
+
+    assert endpoint_label('/weather/history', known) == '/weather/history'
+    assert endpoint_label('/wp-login.php', known) == 'other'
+
+
+def test__clear_multiprocess_dir(tmp_path, monkeypatch):
+
+    (tmp_path / 'counter_1.db').write_bytes(b'')
+    (tmp_path / 'notes.txt').write_text('kept')
+    monkeypatch.setenv('PROMETHEUS_MULTIPROC_DIR', str(tmp_path))
+    clear_multiprocess_dir()
+
+    assert [x.name for x in tmp_path.iterdir()] == ['notes.txt']
@@ -0,0 +1,54 @@
+import pytest
+from pydantic import ValidationError
+from src.data.models import (
+    WeatherRequestHistory, WeatherRequestHistoryBatch, WeatherResponseHistoryBatch, 
+    HISTORY_MAX_DAYS, BATCH_MAX_DAYS
+)
+
+
+def test__history_dates_by_list_and_range():
+
+    by_list = WeatherRequestHistory(city = 'London', dates = '2023-01-03,2023-01-01,2023-01-03')
+    by_range = WeatherRequestHistory(city = 'London', start = '2023-01-01', end = '2023-01-03')
+    
+    assert by_list.get_dict['date_range'] == ['2023-01-01', '2023-01-03']
+    assert by_range.get_dict['date_range'] == ['2023-01-01', '2023-01-02', '2023-01-03']
+    assert WeatherRequestHistory(city = 'London', start = '2023-01-01').get_dict['date_range'] == ['2023-01-01']
+    assert len(WeatherRequestHistory(city = 'London', start = '2024-01-01', end = '2024-12-31').date_range) == HISTORY_MAX_DAYS
+
+
+@pytest.mark.parametrize('dates', [
+    {},
+    {'start': '2023-01-03', 'end': '2023-01-01'},
+    {'start': '2023-01-01', 'end': '2025-01-01'},
+    {'dates': '2023-01-01', 'start': '2023-01-01'},
+    {'dates': 'not a date'},
+])
+def test__history_dates_validation(dates):
+
+    with pytest.raises(ValidationError):
+        WeatherRequestHistory(city = 'London', **dates)
+
+
+
+def test__total_days_of_history_batch():
+
+    year = {'start': '2023-01-01', 'end': '2023-12-31'}
+    items = [{'city': f"City {x}", **year} for x in range(BATCH_MAX_DAYS // 365)]
+
+    assert len(WeatherRequestHistoryBatch(items = items).get_list) == BATCH_MAX_DAYS // 365
+    with pytest.raises(ValidationError):
+        WeatherRequestHistoryBatch(items = items + [{'city': 'London', **year}])
+
+
+def test__response_of_history_batch():
+
+    response = WeatherResponseHistoryBatch(
+        current_time = '2023-08-15T12:00:00+01:00',
+        metainfo = {'message': 'All data available from cache', 'backend_task': None},
+        data = [{'item': 0, 'city': 'London', 'country': None, 'missing_dates': ['2023-08-14'], 'data': []}],
+    )
+
+    assert response.data[0].missing_dates == ['2023-08-14']
+    with pytest.raises(ValidationError):
+        WeatherResponseHistoryBatch(current_time = '', metainfo = {}, data = [{'item': 0, 'data': []}])
@@ -0,0 +1,37 @@
+from src.data.popularity import PopularityTracker, plan_prefetch
+
+
+def test__counting_of_requests():
+
+    tracker = PopularityTracker()
+    assert tracker.flush() == 0
+    for geo_id in [1, 2, 1, None, 1]:
+        tracker.hit(geo_id)
+
+    assert tracker.pending == {1: 3, 2: 1}
+    assert tracker.conn is None
+
+    disabled = PopularityTracker(enabled = False)
+    disabled.hit(1)
+    assert disabled.pending == {}
+    assert disabled.top(10) == [] and disabled.decay() is False
+    assert disabled.conn is None
+
+
+def test__plan_prefetch():
+
+    ranking = [('5', 90.0), ('3', 50.0), ('7', 20.0), ('1', 10.0), ('2', 5.0), ('4', 1.0)]
+    forecasts = {
+        5: ('London', 100, 3),      # fresh
+        3: ('Paris', 3500, 3),      # becomes stale before the next run
+        7: ('Berlin', None, 0),     # absent forecast
+        1: ('Rome', 60, 2),         # shorter than requested days
+        2: ('Madrid', 4000, 3),
+        ### 4 is absent in DB
+    }
+
+    assert plan_prefetch(ranking, forecasts, stale_after = 2700, days = 3, budget = 10) == [
+        (3, 'Paris'), (7, 'Berlin'), (1, 'Rome'), (2, 'Madrid'),
+    ]
+    assert plan_prefetch(ranking, forecasts, stale_after = 2700, days = 3, budget = 2) == [(3, 'Paris'), (7, 'Berlin')]
+    assert plan_prefetch([], forecasts, budget = 10) == []
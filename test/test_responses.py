@@ -0,0 +1,120 @@
+import gzip
+import orjson
+import pytest
+from datetime import datetime, timezone, timedelta
+from fastapi import HTTPException
+from src.api import responses
+from src.api.responses import (
+    MEDIA_JSON, MEDIA_COLUMNAR, MEDIA_MSGPACK, MEDIA_ARROW, 
+    negotiate_format, to_columnar, encode, compress,
+    make_etag, http_date, is_not_modified, not_modified_response
+)
+
+
+@pytest.fixture
+def content():
+    return {
+        'current_time': '2023-08-15T12:00:00+01:00',
+        'metainfo': {'message': 'All data available from cache'},
+        'data': [{'datetime': datetime(2023, 8, 15, h), 'temperature': 17.8, 'geo_location': 'London, United Kingdom'} \
+                for h in range(24)],
+    }
+#------------------------------------------------------------------------------------------------------------------
+
+def test__negotiation_of_format():
+
+    assert negotiate_format(None) == MEDIA_JSON
+    assert negotiate_format('*/*') == MEDIA_JSON
+    assert negotiate_format('text/html') == MEDIA_JSON
+    assert negotiate_format(f'{MEDIA_JSON};q=0.5, {MEDIA_COLUMNAR}') == MEDIA_COLUMNAR
+
+
+def test__not_acceptable_without_library(monkeypatch):
+
+    monkeypatch.setattr(responses, 'msgpack', None)
+    with pytest.raises(HTTPException) as error:
+        negotiate_format(MEDIA_MSGPACK)
+
+    assert error.value.status_code == 406
+    assert negotiate_format(f'{MEDIA_MSGPACK}, {MEDIA_COLUMNAR};q=0.1') == MEDIA_COLUMNAR
+
+
+def test__columnar_layout(content):
+
+    body = orjson.loads(encode(content, MEDIA_COLUMNAR))
+
+    assert body['metainfo'] == content['metainfo']
+    assert body['data']['geo_location'] == 'London, United Kingdom'
+    assert body['data']['rows'] == 24
+    assert set(body['data']['columns']) == {'datetime', 'temperature'}
+    assert body['data']['columns']['datetime'][0] == '2023-08-15T00:00:00'
+    assert to_columnar([]) == {'geo_location': None, 'rows': 0, 'columns': {}}
+
+
+def test__compression_by_threshold(content):
+
+    body = encode(content)
+    assert compress(body, 'gzip', min_size = len(body) + 1) == (body, None)
+    assert compress(body, 'identity', min_size = 0) == (body, None)
+    compressed, encoding = compress(body, 'br;q=0, gzip', min_size = 0)
+
+    assert encoding == 'gzip'
+    assert gzip.decompress(compressed) == body
+
+
+def test__msgpack_format(content):
+
+    msgpack = pytest.importorskip('msgpack')
+    body = msgpack.unpackb(encode(content, MEDIA_MSGPACK))
+
+    assert negotiate_format(MEDIA_MSGPACK) == MEDIA_MSGPACK
+    assert body['metainfo'] == content['metainfo']
+    assert body['data']['geo_location'] == 'London, United Kingdom'
+    assert body['data']['columns']['datetime'][0] == '2023-08-15T00:00:00'
+    assert body['data']['columns']['temperature'] == [17.8] * 24
+
+
+def test__arrow_format(content):
+
+    pa = pytest.importorskip('pyarrow')
+    table = pa.ipc.open_stream(encode(content, MEDIA_ARROW)).read_all()
+    metadata = table.schema.metadata
+
+    assert negotiate_format(MEDIA_ARROW) == MEDIA_ARROW
+    assert table.num_rows == 24 and table.column_names == ['datetime', 'temperature']
+    assert table.column('datetime')[0].as_py() == datetime(2023, 8, 15, 0)
+    assert metadata[b'geo_location'] == b'London, United Kingdom'
+    assert orjson.loads(metadata[b'metainfo']) == content['metainfo']
+
+
+def test__brotli_compression(content):
+
+    brotli = pytest.importorskip('brotli')
+    body = encode(content)
+    compressed, encoding = compress(body, 'gzip;q=0.5, br', min_size = 0)
+
+    assert encoding == 'br'
+    assert brotli.decompress(compressed) == body
+    assert compress(body, 'br;q=0, gzip', min_size = 0)[1] == 'gzip'
+
+
+def test__conditional_requests():
+
+    etag = make_etag('history', 'london', 'united kingdom', '2023-08-15', MEDIA_JSON)
+    updated = datetime(2023, 8, 15, 12, 30, 15, 500, tzinfo = timezone(timedelta(hours = 1)))
+
+    assert etag == make_etag('history', 'london', 'united kingdom', '2023-08-15', MEDIA_JSON)
+    assert etag != make_etag('history', 'london', 'united kingdom', '2023-08-15', MEDIA_COLUMNAR)
+    assert http_date(updated) == 'Tue, 15 Aug 2023 11:30:15 GMT'
+    assert is_not_modified(etag, None, f'"abc", {etag}')
+    assert is_not_modified(etag, None, etag[2:])
+    assert is_not_modified(etag, None, '*')
+    assert not is_not_modified(etag, None, '"abc"')
+    assert is_not_modified(etag, updated, None, http_date(updated))
+    assert not is_not_modified(etag, updated + timedelta(seconds = 1), None, http_date(updated))
+    assert not is_not_modified(etag, updated, '"abc"', http_date(updated))
+    assert not is_not_modified(etag, updated, None, 'yesterday')
+
+    response = not_modified_response({'ETag': etag})
+    assert response.status_code == 304
+    assert response.headers['etag'] == etag and not response.body
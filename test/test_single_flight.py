@@ -0,0 +1,83 @@
+import pytest
+import asyncio
+from src.data.single_flight import SingleFlight
+
+
+def test__coalescing_of_concurrent_calls():
+
+    sf = SingleFlight()
+    runs = []
+
+    async def work(key):
+        runs.append(key)
+        await asyncio.sleep(0.01)
+        return key.upper()
+
+    async def main():
+        return await asyncio.gather(*[sf.do(('history', 'london'), work, 'london') for _ in range(5)])
+
+    results = asyncio.run(main())
+
+    assert runs == ['london']
+    assert [x[0] for x in results] == ['LONDON'] * 5
+    assert [x[1] for x in results].count(True) == 4
+    assert sf.stats == {'leaders': 1, 'coalesced': 4, 'in_flight': 0}
+
+
+def test__exception_is_shared_and_key_released():
+
+    sf = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError('backend is down')
+
+    async def main():
+        return await asyncio.gather(*[sf.do('key', work) for _ in range(3)], return_exceptions = True)
+
+    results = asyncio.run(main())
+
+    assert all(isinstance(x, ValueError) for x in results)
+    assert sf.in_flight == 0
+
+
+def test__cancelled_leader_does_not_cancel_followers():
+
+    sf = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.02)
+        return 'done'
+
+    async def main():
+        leader = asyncio.ensure_future(sf.do('key', work))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(sf.do('key', work))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(main()) == ('done', True)
+
+
+def test__spawn_runs_once_in_background():
+
+    sf = SingleFlight()
+    runs = []
+
+    async def refresh(city):
+        await asyncio.sleep(0.01)
+        runs.append(city)
+
+    async def main():
+        started = [sf.spawn('london', refresh, 'london') for _ in range(3)]
+        in_flight = sf.in_flight
+        await asyncio.sleep(0.05)
+        return started, in_flight
+
+    started, in_flight = asyncio.run(main())
+
+    assert started == [True, False, False]
+    assert in_flight == 1
+    assert runs == ['london']
+    assert sf.stats == {'leaders': 1, 'coalesced': 2, 'in_flight': 0}
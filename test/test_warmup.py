@@ -0,0 +1,91 @@
+import json
+import asyncio
+from datetime import datetime, date
+from src.data.cache import LRUCache, sizeof_rows
+from src.data.warmup import WarmUp, save_snapshot, load_snapshot
+
+
+def rows(day):
+    return [{'datetime': datetime(2023, 8, day, h), 'temperature': 17.8, 'geo_location': 'London, United Kingdom'} \
+            for h in range(24)]
+#------------------------------------------------------------------------------------------------------------------
+
+def test__snapshot_of_cache(tmp_path):
+
+    path = str(tmp_path / 'data' / 'history.json')
+    cache = LRUCache(max_bytes = sizeof_rows(rows(15)) * 10)
+    for day in (15, 16, 17):
+        cache.set(('london', '', f"2023-08-{day}"), rows(day))
+    cache.get(('london', '', '2023-08-15'))
+
+    assert save_snapshot(cache, path) == 3
+    restored = LRUCache(max_bytes = sizeof_rows(rows(15)) * 2)
+    assert load_snapshot(restored, path) == 2
+    ### the least recently used day is evicted, types of values are kept
+    assert ('london', '', '2023-08-16') not in restored
+    assert restored.get(('london', '', '2023-08-15')) == rows(15)
+
+    with open(path) as f:
+        snapshot = json.load(f)
+    snapshot['created'] -= 3600
+    with open(path, 'w') as f:
+        json.dump(snapshot, f)
+    assert load_snapshot(LRUCache(max_bytes = 10 ** 6), path, max_age = 600) == 0
+    assert load_snapshot(LRUCache(max_bytes = 10 ** 6), str(tmp_path / 'absent.json')) == 0
+    assert save_snapshot(LRUCache(max_bytes = 10 ** 6), str(tmp_path / 'empty.json')) == 0
+
+
+def test__snapshot_of_daily_rows(tmp_path):
+
+    path = str(tmp_path / 'history.json')
+    daily = [{'date': date(2023, 8, 15), 'temperature_mean': 17.8, 'geo_location': 'London, United Kingdom'}]
+    cache = LRUCache(max_bytes = 10 ** 6)
+    cache.set(('london', '', '2023-08-15', 'daily'), daily)
+
+    assert save_snapshot(cache, path) == 1
+    restored = LRUCache(max_bytes = 10 ** 6)
+    assert load_snapshot(restored, path) == 1
+    assert restored.get(('london', '', '2023-08-15', 'daily')) == daily
+
+
+def test__broken_snapshot_is_skipped(tmp_path):
+
+    broken = {
+        'pickle.json': b'\x80\x04\x95\x00\x00\x00',
+        'truncated.json': b'{"created": 1692000000, "items": [[["london", "", "2023-08-15"], [{"datet',
+        'unexpected.json': b'{"created": "yesterday", "items": 42}',
+        'rows.json': b'{"created": 1692000000, "items": [[["london", "", "2023-08-15"], [1, 2]]]}',
+    }
+    for name, content in broken.items():
+        (tmp_path / name).write_bytes(content)
+        cache = LRUCache(max_bytes = 10 ** 6)
+        assert load_snapshot(cache, str(tmp_path / name)) == 0
+        assert len(cache.data) == 0
+
+
+def test__warm_up_stages():
+
+    async def restore():
+        await asyncio.sleep(0.01)
+        return 3
+
+    async def broken():
+        raise ConnectionError('redis is down')
+
+    async def slow():
+        await asyncio.sleep(10)
+
+    async def main(*stages, timeout = 1):
+        warmup = WarmUp(timeout = timeout)
+        warmup.start(*stages)
+        before = warmup.ready
+        await warmup.task
+        return before, warmup
+
+    before, warmup = asyncio.run(main(('snapshot', restore), ('locations', broken)))
+    assert before is False
+    assert warmup.ready and warmup.results == {'snapshot': 3, 'locations': None}
+
+    _, warmup = asyncio.run(main(('snapshot', restore), ('locations', slow), timeout = 0.05))
+    assert warmup.ready and warmup.results == {'snapshot': 3}
+    assert WarmUp(enabled = False).ready
@@ -3,7 +3,7 @@ import re
 import pandas as pd
 import numpy as np
 import datetime
-from src.weather_process import WethearMetadata
+from src.weather_process import WethearMetadata, query_day_completeness, query_create_partitions, queries_maintain_partitions
 
 
 
@@ -114,4 +114,37 @@ def test__apply_weather_preprocessing(main_instance_history):
     assert load is True
     assert not wm.data[wm.feature].empty
     assert wm.data[wm.feature].shape[0] == 2
-    assert set(wm.rename_columns['weather'].values()) & set(list(wm.data[wm.feature])) == set(list(wm.data[wm.feature]))
\ No newline at end of file
+    assert set(wm.rename_columns['weather'].values()) & set(list(wm.data[wm.feature])) == set(list(wm.data[wm.feature]))
+
+def test__query_day_completeness(main_instance_history):
+    
+    wm = WethearMetadata(main_instance_history)
+    wm._apply_weather_preprocessing()
+    query = query_day_completeness(np.int64(7), wm.data[wm.feature]['datetime'])
+    
+    assert "ARRAY['2023-08-15']::date[]" in query
+    assert re.search(r'lt\.geo_id = 7\b', query)
+    assert 'ON CONFLICT (geo_id, day)' in query
+    assert 'INSERT INTO regional.day_completeness' in query
+    assert 'INSERT INTO regional.daily_weather' in query
+
+
+def test__query_create_partitions(main_instance_history):
+    
+    wm = WethearMetadata(main_instance_history)
+    wm._apply_weather_preprocessing()
+    
+    assert "create_partitions('2023-08-15'::date, '2023-08-15'::date)" in query_create_partitions(wm.data[wm.feature]['datetime'])
+
+
+def test__queries_maintain_partitions():
+    
+    queries = queries_maintain_partitions(datetime.date(2023, 11, 20), months_ahead = 2)
+    
+    assert len(queries) == 1
+    assert "create_partitions('2023-11-01'::date, '2024-01-01'::date)" in queries[0]
+    
+    queries = queries_maintain_partitions(datetime.date(2023, 11, 20), months_ahead = 2, retention_months = 12, drop = True)
+    
+    assert len(queries) == 2
+    assert "retire_partitions('2022-11-01'::date, true)" in queries[1]